@@ -0,0 +1,35 @@
+"""geocode_cache prefix index
+
+Revision ID: c4d2e8f1a9b3
+Revises: 8519e970070e
+Create Date: 2026-10-18 09:12:41.204513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d2e8f1a9b3'
+down_revision: Union[str, Sequence[str], None] = '8519e970070e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # LIKE 'prefixo%' só usa um btree com text_pattern_ops (fora do locale C)
+    op.create_index(
+        'ix_geocode_cache_query_key_prefix',
+        'geocode_cache',
+        ['query_key'],
+        unique=False,
+        postgresql_ops={'query_key': 'text_pattern_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_geocode_cache_query_key_prefix', table_name='geocode_cache')
@@ -0,0 +1,49 @@
+"""create drivers
+
+Revision ID: e7b1f3a2c6d4
+Revises: c4d2e8f1a9b3
+Create Date: 2026-10-18 14:03:27.518902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b1f3a2c6d4'
+down_revision: Union[str, Sequence[str], None] = 'c4d2e8f1a9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'drivers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('slug', sa.String(length=64), nullable=False),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('whatsapp_number', sa.String(length=32), nullable=False),
+        sa.Column('photo', sa.Text(), nullable=True),
+        sa.Column('currency', sa.String(length=8), nullable=False),
+        sa.Column('base_fare', sa.Float(), nullable=False),
+        sa.Column('price_per_km', sa.Float(), nullable=False),
+        sa.Column('minimum_fare', sa.Float(), nullable=False),
+        sa.Column('price_per_minute', sa.Float(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=False),
+        sa.Column(
+            'updated_at',
+            sa.DateTime(timezone=True),
+            server_default=sa.text('now()'),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('slug'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('drivers')
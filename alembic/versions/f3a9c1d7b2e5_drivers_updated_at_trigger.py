@@ -0,0 +1,47 @@
+"""drivers updated_at trigger
+
+Revision ID: f3a9c1d7b2e5
+Revises: e7b1f3a2c6d4
+Create Date: 2026-10-18 17:41:09.362114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c1d7b2e5'
+down_revision: Union[str, Sequence[str], None] = 'e7b1f3a2c6d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Qualquer UPDATE (psql, admin, outro serviço) renova updated_at, não só o ORM:
+    # é o que o DriverRegistry observa para recarregar os motoristas
+    op.execute(
+        """
+        CREATE FUNCTION drivers_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at = clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER drivers_touch_updated_at
+        BEFORE UPDATE ON drivers
+        FOR EACH ROW EXECUTE FUNCTION drivers_touch_updated_at()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER drivers_touch_updated_at ON drivers")
+    op.execute("DROP FUNCTION drivers_touch_updated_at()")
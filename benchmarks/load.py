@@ -0,0 +1,253 @@
+"""
+Teste de carga do /quote de ponta a ponta, sem rede: arranca o stub do OSRM + Nominatim
+(tvde_qr.stubs.upstream, com latência e falhas injetáveis) e a app com uvicorn, ambos
+em subprocessos, e envia pedidos a um ritmo fixo (--rps) durante --duration segundos.
+
+    poetry run python -m benchmarks.load --rps 50 --duration 30 --upstream-latency-ms 80
+    poetry run python -m benchmarks.load --save-baseline benchmarks/results/load.json
+    poetry run python -m benchmarks.load --baseline benchmarks/results/load.json
+
+Os caches usam o Postgres de --database-url (o local do docker-compose por omissão; com
+as migrações aplicadas). Cada execução usa endereços novos (--run-tag), por isso começa
+sempre com os caches frios.
+
+Carga em ciclo aberto: o pedido i sai em t0 + i/rps, responda a app a tempo ou não, e a
+latência conta a partir dessa hora marcada (a fila do lado do cliente também é latência).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import Iterator
+
+import httpx
+
+from benchmarks.report import (
+    HIGHER,
+    LOWER,
+    compare,
+    load_baseline,
+    percentile,
+    print_table,
+    save_results,
+)
+from tvde_qr.settings import settings
+
+DIRECTIONS = {
+    "throughput_rps": HIGHER,
+    "p50_ms": LOWER,
+    "p95_ms": LOWER,
+    "p99_ms": LOWER,
+    "error_rate": LOWER,
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def _process(args: list[str], env: dict[str, str], ready_url: str) -> Iterator[None]:
+    proc = subprocess.Popen([sys.executable, *args], env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{args[1]} terminou ao arrancar (código {proc.returncode})")
+            try:
+                if httpx.get(ready_url, timeout=1).status_code < 500:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{ready_url} não respondeu em 30 s")
+            time.sleep(0.2)
+        yield
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+@contextmanager
+def run_servers(args: argparse.Namespace) -> Iterator[str]:
+    """Stub + app a correr; devolve o URL base da app."""
+    stub_port, app_port = _free_port(), _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=args.database_url,
+        OSRM_URLS=stub_url,
+        NOMINATIM_URLS=stub_url,
+        NOMINATIM_RATE_PER_S="0",  # o stub não tem a política de uso do Nominatim público
+        GOOGLE_MAPS_API_KEY="",
+        HUBS_WARM_ENABLED="false",
+    )
+    with ExitStack() as stack:
+        stack.enter_context(
+            _process(
+                [
+                    "-m",
+                    "tvde_qr.stubs.upstream",
+                    "--port",
+                    str(stub_port),
+                    "--latency-ms",
+                    str(args.upstream_latency_ms),
+                    "--failure-rate",
+                    str(args.upstream_failure_rate),
+                ],
+                env,
+                f"{stub_url}/status",
+            )
+        )
+        stack.enter_context(
+            _process(
+                [
+                    "-m",
+                    "uvicorn",
+                    "tvde_qr.main:app",
+                    "--port",
+                    str(app_port),
+                    "--log-level",
+                    "warning",
+                    "--workers",
+                    str(args.workers),
+                ],
+                env,
+                f"{app_url}/cache/stats",
+            )
+        )
+        yield app_url
+
+
+async def drive(
+    app_url: str,
+    *,
+    rps: float,
+    duration: float,
+    warmup: float,
+    addresses: list[str],
+    seed: int,
+    connections: int,
+) -> dict[str, float]:
+    rng = random.Random(seed)
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=30.0) as client:
+
+        async def one(scheduled: float, origin: str, destination: str, measured: bool) -> None:
+            nonlocal errors
+            ok = False
+            try:
+                r = await client.post("/quote", data={"origin": origin, "destination": destination})
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                pass
+            if measured:
+                latencies.append(time.perf_counter() - scheduled)
+                errors += not ok
+
+        tasks = []
+        total = int((warmup + duration) * rps)
+        started = time.perf_counter()
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            origin, destination = rng.sample(addresses, 2)
+            measured = i >= warmup * rps
+            tasks.append(asyncio.create_task(one(scheduled, origin, destination, measured)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - (started + warmup)
+
+        hit_ratios = [
+            line
+            for line in (await client.get("/metrics")).text.splitlines()
+            if line.startswith("tvde_cache_hit_ratio")
+        ]
+
+    for line in hit_ratios:
+        print(line)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "error_rate": errors / count if count else 0.0,
+        "throughput_rps": (count - errors) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do /quote com upstreams falsos")
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos medidos")
+    parser.add_argument("--warmup", type=float, default=3.0, help="segundos antes de medir")
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upstream-failure-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--addresses",
+        type=int,
+        default=30,
+        help="endereços distintos (menos = mais hits de cache; N endereços dão N*(N-1) rotas)",
+    )
+    parser.add_argument("--run-tag", default="", help="prefixo dos endereços (por omissão, novo)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--database-url", default=settings.database_url)
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--save-baseline", help="grava os resultados neste JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    tag = args.run_tag or uuid.uuid4().hex[:8]
+    addresses = [f"Rua Benchmark {tag} {i}, Lisboa" for i in range(args.addresses)]
+
+    with run_servers(args) as app_url:
+        results = asyncio.run(
+            drive(
+                app_url,
+                rps=args.rps,
+                duration=args.duration,
+                warmup=args.warmup,
+                addresses=addresses,
+                seed=args.seed,
+                connections=args.connections,
+            )
+        )
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        save_results(args.save_baseline, results)
+    if baseline is not None:
+        regressions = compare(results, baseline, DIRECTIONS, tolerance=args.tolerance)
+        for line in regressions:
+            print(f"REGRESSÃO {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+"""
+Micro-benchmarks do caminho quente do /quote (sem rede nem Postgres).
+
+    poetry run python -m benchmarks.micro
+    poetry run python -m benchmarks.micro --save-baseline benchmarks/results/micro.json
+    poetry run python -m benchmarks.micro --baseline benchmarks/results/micro.json
+
+Resultado em ns por operação (o melhor de --repeat medições, o menos afetado por ruído).
+Com --baseline, sai com código 1 se algum piorar mais do que --tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+from typing import Callable
+
+from benchmarks.report import LOWER, compare, load_baseline, print_table, save_results
+from tvde_qr.services.address import normalize_address, route_key
+from tvde_qr.services.pricing import PricingConfig, PricingService
+from tvde_qr.services.suggest import PrefixIndex
+from tvde_qr.services.ttl_cache import TTLCache
+
+ADDRESSES = [
+    "Aeroporto Humberto Delgado, Lisboa",
+    "  Estação de São Bento,  Porto ",
+    "Rua Augusta 100, 1100-053 Lisboa",
+    "Hotel Tivoli Marina Vilamoura",
+    "Praça do Comércio",
+]
+
+
+def _benchmarks() -> dict[str, Callable[[], object]]:
+    rng = random.Random(42)
+    pricing = PricingService(PricingConfig(price_per_minute=0.2))
+    distances = [rng.uniform(1, 80) for _ in range(1000)]
+    durations = [d * 1.5 for d in distances]
+
+    cache: TTLCache[float] = TTLCache(maxsize=2048, ttl=300)
+    keys = [route_key(f"origem {i}", f"destino {i}") for i in range(4096)]
+    for key in keys[:2048]:
+        cache.set(key, 1.0)
+    hit_key, miss_key = keys[100], keys[3000]
+    churn = iter(range(10**12))
+
+    index = PrefixIndex()
+    for i in range(20_000):
+        index.add(f"Rua {rng.choice(['Augusta', 'Áurea', 'da Prata', 'do Ouro'])} {i}", 38.7, -9.1)
+
+    return {
+        "normalize_address": lambda: [normalize_address(a) for a in ADDRESSES],
+        "route_key": lambda: route_key(ADDRESSES[0], ADDRESSES[1]),
+        "pricing.calculate_price": lambda: pricing.calculate_price(12.3, 18.0),
+        "pricing.calculate_prices_1000": lambda: pricing.calculate_prices(distances, durations),
+        "ttl_cache.get_hit": lambda: cache.get(hit_key),
+        "ttl_cache.get_miss": lambda: cache.get(miss_key),
+        "ttl_cache.set_evict": lambda: cache.set(next(churn), 1.0),
+        "prefix_index.search": lambda: index.search("rua aur", limit=5),
+    }
+
+
+def run(repeat: int = 5, only: str = "") -> dict[str, float]:
+    results = {}
+    for name, fn in _benchmarks().items():
+        if only and only not in name:
+            continue
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()  # iterações para ~0.2 s por medição
+        best = min(timer.repeat(repeat=repeat, number=number))
+        results[name] = best / number * 1e9
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks (ns/op)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="só benchmarks com este texto no nome")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--save-baseline", help="grava os resultados neste JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat, only=args.only)
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        save_results(args.save_baseline, results)
+    if baseline is not None:
+        regressions = compare(
+            results, baseline, {name: LOWER for name in results}, tolerance=args.tolerance
+        )
+        for line in regressions:
+            print(f"REGRESSÃO {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
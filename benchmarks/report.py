@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+from typing import Mapping, Sequence
+
+# Direção de cada métrica: "lower" = menor é melhor (latências), "higher" = maior é melhor
+LOWER = "lower"
+HIGHER = "higher"
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Percentil q (0-100) por nearest-rank: sempre um valor observado, sem interpolação."""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def load_baseline(path: str | Path) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_results(path: str | Path, results: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", "utf-8")
+
+
+def compare(
+    current: Mapping[str, float],
+    baseline: Mapping[str, float],
+    directions: Mapping[str, str],
+    *,
+    tolerance: float,
+) -> list[str]:
+    """
+    Regressões de current face à baseline: métricas que pioraram mais do que tolerance
+    (fração, ex.: 0.2 = 20%). Métricas que só existem num dos lados são ignoradas.
+    """
+    regressions = []
+    for name, direction in directions.items():
+        if name not in current or name not in baseline:
+            continue
+        now, before = current[name], baseline[name]
+        if direction == LOWER:
+            worse = now > before * (1 + tolerance)
+        else:
+            worse = now < before * (1 - tolerance)
+        if worse:
+            change = (now - before) / before * 100 if before else math.inf
+            regressions.append(f"{name}: {before:.4g} -> {now:.4g} ({change:+.1f}%)")
+    return regressions
+
+
+def print_table(rows: Mapping[str, float], baseline: Mapping[str, float] | None = None) -> None:
+    width = max((len(name) for name in rows), default=0)
+    for name, value in rows.items():
+        line = f"{name:<{width}}  {value:>12.4g}"
+        if baseline and name in baseline and baseline[name]:
+            line += f"  (baseline {baseline[name]:.4g}, {(value / baseline[name] - 1) * 100:+.1f}%)"
+        print(line)
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import argparse
+from datetime import timedelta
+
+from tvde_qr.settings import settings
+
+
+def _compact_cache(args: argparse.Namespace) -> int:
+    from tvde_qr.db import SessionLocal
+    from tvde_qr.jobs.compaction import compact_caches
+
+    if SessionLocal is None:
+        raise SystemExit("DATABASE_URL não configurada")
+
+    with SessionLocal() as session:
+        report = compact_caches(
+            session,
+            route_max_age=timedelta(hours=settings.route_cache_ttl_hours),
+            geocode_max_age=timedelta(days=settings.geocode_cache_ttl_days),
+            batch_size=args.batch_size,
+        )
+
+    print(f"route_cache: {report.route_cache} linhas removidas")
+    print(f"geocode_cache: {report.geocode_cache} linhas removidas")
+    return 0
+
+
+def _fit_road_factors(args: argparse.Namespace) -> int:
+    from tvde_qr.db import SessionLocal
+    from tvde_qr.repositories.route_cache import RouteCacheRepository
+    from tvde_qr.services.distance import DistanceService
+
+    if SessionLocal is None:
+        raise SystemExit("DATABASE_URL não configurada")
+
+    service = DistanceService(
+        default_factor=settings.road_factor_default,
+        default_speed_kmh=settings.local_estimate_speed_kmh,
+        region_deg=settings.road_factor_region_deg,
+        min_samples=settings.road_factor_min_samples,
+    )
+    with SessionLocal() as session:
+        used = service.fit(RouteCacheRepository(session).geocoded_routes(args.limit))
+
+    default = service.default
+    print(f"{used} amostras; por omissão: fator {default.factor:.3f}, {default.speed_kmh:.1f} km/h")
+    for (lat, lon), road in sorted(service.factors.items()):
+        print(
+            f"região {lat * service.region_deg:g},{lon * service.region_deg:g}: "
+            f"fator {road.factor:.3f}, {road.speed_kmh:.1f} km/h ({road.samples} rotas)"
+        )
+    return 0
+
+
+def _build_geocoder(args: argparse.Namespace) -> int:
+    from tvde_qr.services.geocoder_index import build_index, read_extract
+
+    countries = [c.strip() for c in args.countries.split(",") if c.strip()]
+    count = build_index(read_extract(args.input, countries), args.output)
+    print(f"{count} nomes indexados em {args.output}")
+    return 0
+
+
+def _warm_hubs(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from tvde_qr.db import AsyncSessionLocal, async_engine
+    from tvde_qr.jobs.hubs import load_hubs, warm_hubs
+    from tvde_qr.services.backends import BackendPool, parse_urls
+    from tvde_qr.services.osrm import OSRMClient
+
+    if AsyncSessionLocal is None:
+        raise SystemExit("DATABASE_URL não configurada")
+
+    osrm = OSRMClient(
+        osrm_timeout=settings.osrm_timeout_s,
+        connect_timeout=settings.http_connect_timeout_s,
+        osrm_backends=BackendPool("osrm", parse_urls(settings.osrm_urls)),
+    )
+    hubs = load_hubs(args.path or settings.hubs_path or None)
+
+    async def run():
+        try:
+            return await warm_hubs(hubs, osrm, AsyncSessionLocal)
+        finally:
+            await async_engine.dispose()
+
+    report = asyncio.run(run())
+    print(f"{report.hubs} hubs: {report.routes} rotas gravadas, {report.missing} sem rota")
+    return 0
+
+
+def _build_assets(args: argparse.Namespace) -> int:
+    from tvde_qr.web.assets import resolve_assets_dir
+    from tvde_qr.web.build import build_assets
+
+    # Por omissão, onde a app o vai procurar (ASSETS_DIR a partir da raiz do projeto)
+    output = args.output or resolve_assets_dir(settings.assets_dir)
+    widths = [int(w) for w in args.widths.split(",") if w.strip()]
+    manifest = build_assets(output, widths=widths)
+    variants = sum(len(v) for formats in manifest["images"].values() for v in formats.values())
+    print(f"{len(manifest['files'])} ficheiros e {variants} variantes de imagem em {output}")
+    return 0
+
+
+def _set_driver(args: argparse.Namespace) -> int:
+    from tvde_qr.db import SessionLocal
+    from tvde_qr.repositories.drivers import DRIVER_FIELDS, TARIFF_FIELDS, DriverRepository
+
+    if SessionLocal is None:
+        raise SystemExit("DATABASE_URL não configurada")
+
+    fields = {n: getattr(args, n) for n in DRIVER_FIELDS if getattr(args, n) is not None}
+    with SessionLocal() as session:
+        repo = DriverRepository(session)
+        if repo.get(args.slug) is None:
+            if "name" not in fields or "whatsapp_number" not in fields:
+                raise SystemExit("Motorista novo: --name e --whatsapp são obrigatórios")
+            # Tarifa não indicada: a das Settings (a do motorista por omissão)
+            for name in TARIFF_FIELDS:
+                fields.setdefault(name, getattr(settings, name))
+        driver = repo.upsert(args.slug, **fields)
+
+    state = "ativo" if driver.active else "inativo"
+    print(
+        f"/m/{driver.slug}: {driver.name} ({state}), {driver.currency} {driver.base_fare} + "
+        f"{driver.price_per_km}/km, mínimo {driver.minimum_fare}"
+    )
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="tvde-qr", description="Tarefas de manutenção do TVDE QR")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compact = sub.add_parser("compact-cache", help="Apaga entradas expiradas dos caches")
+    compact.add_argument("--batch-size", type=int, default=settings.cache_compaction_batch_size)
+    compact.set_defaults(func=_compact_cache)
+
+    fit = sub.add_parser("fit-road-factors", help="Mostra os fatores da estimativa local")
+    fit.add_argument("--limit", type=int, default=50_000)
+    fit.set_defaults(func=_fit_road_factors)
+
+    geocoder = sub.add_parser(
+        "build-geocoder", help="Cria o índice local de geocoding a partir de um extrato CSV"
+    )
+    geocoder.add_argument("input", help="CSV com colunas name, lat, lon (e country, opcional)")
+    geocoder.add_argument("output", help="Diretório do índice (LOCAL_GEOCODER_PATH)")
+    geocoder.add_argument("--countries", default="pt,es", help="Filtro pela coluna country")
+    geocoder.set_defaults(func=_build_geocoder)
+
+    hubs = sub.add_parser("warm-hubs", help="Pré-calcula as rotas entre hubs no route_cache")
+    hubs.add_argument("--path", default="", help="JSON de hubs (por omissão, HUBS_PATH)")
+    hubs.set_defaults(func=_warm_hubs)
+
+    assets = sub.add_parser(
+        "build-assets", help="Gera os estáticos de produção (hash, AVIF/WebP, .br/.gz)"
+    )
+    assets.add_argument("--output", default="", help="Diretório (por omissão, ASSETS_DIR)")
+    assets.add_argument("--widths", default="128,256,640,1280,1920", help="Larguras das variantes")
+    assets.set_defaults(func=_build_assets)
+
+    driver = sub.add_parser(
+        "set-driver", help="Cria ou altera um motorista (página /m/SLUG, contacto e tarifa)"
+    )
+    driver.add_argument("slug")
+    driver.add_argument("--name")
+    driver.add_argument("--whatsapp", dest="whatsapp_number")
+    driver.add_argument("--photo", help="Ficheiro em web/static ou URL absoluto")
+    driver.add_argument("--currency")
+    driver.add_argument("--base-fare", type=float)
+    driver.add_argument("--price-per-km", type=float)
+    driver.add_argument("--minimum-fare", type=float)
+    driver.add_argument("--price-per-minute", type=float)
+    active = driver.add_mutually_exclusive_group()
+    active.add_argument("--enable", dest="active", action="store_true", default=None)
+    active.add_argument("--disable", dest="active", action="store_false")
+    driver.set_defaults(func=_set_driver)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
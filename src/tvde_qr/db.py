@@ -1,7 +1,10 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from typing import Iterator, Sequence, TypeVar
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from tvde_qr.settings import settings
 
@@ -10,12 +13,71 @@ class Base(DeclarativeBase):
     pass
 
 
+T = TypeVar("T")
+
+# O Postgres aceita no máximo 65535 parâmetros por statement; um INSERT multi-linha de
+# route_cache leva 7 por linha, por isso os upserts em lote vão em blocos deste tamanho
+UPSERT_BATCH_ROWS = 5000
+
+
+def _engine_options(pool_size: int, max_overflow: int) -> dict:
+    options: dict = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.db_pool_timeout_s,
+    }
+    if settings.db_statement_timeout_ms > 0:
+        # Uma query lenta não prende a conexão (nem o pedido) indefinidamente
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+    return options
+
+
 if not settings.database_url or "driver://" in settings.database_url:
     engine = None
     SessionLocal = None
+    async_engine = None
+    AsyncSessionLocal = None
 else:
     db_url = settings.database_url
     if db_url.startswith("postgresql://"):
         db_url = db_url.replace("postgresql://", "postgresql+psycopg://", 1)
-    engine = create_engine(db_url, pool_pre_ping=True)
-    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
\ No newline at end of file
+    # Engine sync: só jobs em background (compactação) e CLI, por isso um pool pequeno;
+    # os pedidos usam o async_engine abaixo
+    engine = create_engine(
+        db_url, **_engine_options(settings.db_sync_pool_size, settings.db_sync_max_overflow)
+    )
+    # expire_on_commit=False: a linha devolvida pelo RETURNING continua utilizável
+    # após o commit, sem um SELECT de refresh
+    SessionLocal = sessionmaker(
+        bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
+    )
+
+    # Engine async (psycopg 3) para o caminho quente do /quote: não bloqueia o event loop
+    async_engine = create_async_engine(
+        db_url, **_engine_options(settings.db_pool_size, settings.db_max_overflow)
+    )
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+def delete_in_batches(session: Session, model, condition, batch_size: int) -> int:
+    """
+    DELETE em lotes de até batch_size linhas (uma transação curta por lote),
+    para não bloquear a tabela nem inchar o WAL. Retorna o total removido.
+    """
+    total = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        deleted = session.execute(delete(model).where(model.id.in_(ids))).rowcount
+        session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def batched(rows: Sequence[T], size: int = UPSERT_BATCH_ROWS) -> Iterator[Sequence[T]]:
+    """rows em blocos de até size (o último pode ser menor)."""
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from tvde_qr.repositories.geocode_cache import GeocodeCacheRepository
+from tvde_qr.repositories.route_cache import RouteCacheRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CompactionReport:
+    route_cache: int
+    geocode_cache: int
+
+
+def compact_caches(
+    session: Session,
+    *,
+    route_max_age: timedelta,
+    geocode_max_age: timedelta,
+    batch_size: int = 1000,
+) -> CompactionReport:
+    """
+    Apaga as entradas expiradas de route_cache e geocode_cache (em lotes).
+    """
+    return CompactionReport(
+        route_cache=RouteCacheRepository(session).delete_expired(route_max_age, batch_size),
+        geocode_cache=GeocodeCacheRepository(session).delete_expired(geocode_max_age, batch_size),
+    )
+
+
+async def run_periodic_compaction(
+    session_factory: Callable[[], Session],
+    *,
+    interval_s: float,
+    route_max_age: timedelta,
+    geocode_max_age: timedelta,
+    batch_size: int = 1000,
+) -> None:
+    """
+    Loop em background (startup da app): compacta os caches a cada interval_s.
+    O trabalho síncrono corre numa thread para não bloquear o event loop.
+    """
+
+    def run_once() -> CompactionReport:
+        with session_factory() as session:
+            return compact_caches(
+                session,
+                route_max_age=route_max_age,
+                geocode_max_age=geocode_max_age,
+                batch_size=batch_size,
+            )
+
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            report = await asyncio.to_thread(run_once)
+            logger.info(
+                "Compactação de cache: route_cache=%d geocode_cache=%d linhas removidas",
+                report.route_cache,
+                report.geocode_cache,
+            )
+        except Exception:
+            logger.exception("Compactação de cache falhou")
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tvde_qr.repositories.geocode_cache import AsyncGeocodeCacheRepository
+from tvde_qr.repositories.route_cache import AsyncRouteCacheRepository, CachedRoute
+from tvde_qr.services.address import route_key
+from tvde_qr.services.osrm import OSRMClient
+from tvde_qr.services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Lista incluída no pacote (aeroportos, estações, hotéis); HUBS_PATH substitui
+DEFAULT_HUBS_PATH = Path(__file__).resolve().parent.parent / "data" / "hubs.json"
+
+
+@dataclass(frozen=True)
+class Hub:
+    name: str
+    lat: float
+    lon: float
+
+
+@dataclass(frozen=True)
+class WarmReport:
+    hubs: int
+    routes: int
+    missing: int  # pares sem rota no OSRM
+
+
+def load_hubs(path: str | Path | None = None) -> list[Hub]:
+    """Lê a lista de hubs (JSON: [{"name", "lat", "lon"}, ...])."""
+    with open(path or DEFAULT_HUBS_PATH, encoding="utf-8") as f:
+        return [Hub(str(h["name"]), float(h["lat"]), float(h["lon"])) for h in json.load(f)]
+
+
+async def warm_hubs(
+    hubs: list[Hub],
+    osrm: OSRMClient,
+    session_factory: Callable[[], AsyncSession],
+    *,
+    memory: TTLCache | None = None,
+    memory_ttl: float | None = None,
+    max_coords: int = 100,
+) -> WarmReport:
+    """
+    Pré-calcula todas as rotas hub -> hub (matriz do OSRM /table, em blocos de origens
+    para não passar de max_coords por pedido) e grava-as no route_cache, no geocode_cache
+    e, se dado, na memória. O /quote entre hubs passa a ser sempre cache hit.
+    """
+    if len(hubs) < 2:
+        return WarmReport(len(hubs), 0, 0)
+
+    coords = [(h.lat, h.lon) for h in hubs]
+    chunk = max(1, max_coords - len(hubs))
+    rows: list[dict] = []
+    missing = 0
+    for start in range(0, len(hubs), chunk):
+        matrix = await osrm.table(coords[start : start + chunk], coords)
+        for i, line in enumerate(matrix, start):
+            for j, route in enumerate(line):
+                if i == j:
+                    continue
+                if route is None:
+                    missing += 1
+                    continue
+                rows.append(
+                    {
+                        "origin": hubs[i].name,
+                        "destination": hubs[j].name,
+                        "grid_key": None,
+                        "distance_km": route.distance_km,
+                        "duration_min": route.duration_min,
+                        "source": "osrm",
+                    }
+                )
+
+    # Sem writer: o aquecimento já é um lote e precisa das linhas gravadas (created_at)
+    async with session_factory() as session:
+        await AsyncGeocodeCacheRepository(session).save_many(
+            [(h.name, h.lat, h.lon, "hub") for h in hubs]
+        )
+        saved = await AsyncRouteCacheRepository(session).save_many(rows)
+        if memory is not None:
+            for row in saved:
+                memory.set(
+                    route_key(row.origin, row.destination), CachedRoute.from_row(row), ttl=memory_ttl
+                )
+
+    logger.info("Hubs: %d rotas pré-calculadas (%d sem rota)", len(rows), missing)
+    return WarmReport(len(hubs), len(rows), missing)
+
+
+async def run_periodic_warm(
+    hubs: list[Hub],
+    osrm: OSRMClient,
+    session_factory: Callable[[], AsyncSession],
+    *,
+    memory: TTLCache | None = None,
+    interval_s: float,
+) -> None:
+    """
+    Aquece no arranque e depois a cada interval_s (0 = só no arranque).
+    Na memória, as rotas ficam até ao aquecimento seguinte (com folga para falhas).
+    """
+    memory_ttl = 2 * interval_s if interval_s > 0 else None
+    while True:
+        try:
+            await warm_hubs(hubs, osrm, session_factory, memory=memory, memory_ttl=memory_ttl)
+        except Exception:
+            logger.exception("Aquecimento das rotas entre hubs falhou")
+        if interval_s <= 0:
+            return
+        await asyncio.sleep(interval_s)
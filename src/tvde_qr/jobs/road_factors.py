@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tvde_qr.repositories.route_cache import AsyncRouteCacheRepository
+from tvde_qr.services.distance import DistanceService
+
+logger = logging.getLogger(__name__)
+
+
+async def fit_road_factors(
+    session_factory: Callable[[], AsyncSession],
+    service: DistanceService,
+    *,
+    limit: int = 50_000,
+) -> int:
+    """
+    Recalibra a estimativa local com as rotas reais do route_cache.
+    Retorna o número de amostras usadas.
+    """
+    async with session_factory() as session:
+        samples = await AsyncRouteCacheRepository(session).geocoded_routes(limit)
+    used = service.fit(samples)
+    logger.info(
+        "Estimativa local: %d amostras, %d regiões, fator por omissão %.3f",
+        used,
+        len(service.factors),
+        service.default.factor,
+    )
+    return used
+
+
+async def run_periodic_fit(
+    session_factory: Callable[[], AsyncSession],
+    service: DistanceService,
+    *,
+    interval_s: float,
+    limit: int = 50_000,
+) -> None:
+    """
+    Calibra no arranque e depois a cada interval_s (0 = só no arranque).
+    Falhas ficam no log: a estimativa continua com os fatores anteriores.
+    """
+    while True:
+        try:
+            await fit_road_factors(session_factory, service, limit=limit)
+        except Exception:
+            logger.exception("Calibração da estimativa local falhou")
+        if interval_s <= 0:
+            return
+        await asyncio.sleep(interval_s)
@@ -1,30 +1,251 @@
 ﻿from __future__ import annotations
 
+import asyncio
+import json
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
 from datetime import timedelta
+from functools import lru_cache
 from urllib.parse import quote
 
-from fastapi import Depends, FastAPI, Form, Request
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import Depends, FastAPI, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-
-from tvde_qr.db import SessionLocal
-from tvde_qr.repositories.route_cache import RouteCacheRepository
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tvde_qr import metrics
+from tvde_qr.db import AsyncSessionLocal, SessionLocal, async_engine
+from tvde_qr.jobs.compaction import run_periodic_compaction
+from tvde_qr.jobs.hubs import load_hubs, run_periodic_warm
+from tvde_qr.jobs.road_factors import run_periodic_fit
+from tvde_qr.repositories.geocode_cache import AsyncGeocodeCacheRepository
+from tvde_qr.repositories.route_cache import AsyncRouteCacheRepository, CachedRouteCacheRepository
+from tvde_qr.schemas import (
+    AddressSuggestion,
+    BatchQuote,
+    BatchQuoteRequest,
+    BatchQuoteResponse,
+)
+from tvde_qr.services.address import normalize_address
+from tvde_qr.services.backends import BackendPool, parse_urls, run_health_checks
 from tvde_qr.services.distance import DistanceService
-from tvde_qr.services.pricing import PricingConfig, PricingService
+from tvde_qr.services.drivers import DriverProfile, DriverRegistry, run_periodic_refresh
+from tvde_qr.services.geocoder_index import LocalGeocoder
+from tvde_qr.services.google_maps import GoogleMapsClient
+from tvde_qr.services.http import build_http_client
+from tvde_qr.services.pricing import PricingConfig
+from tvde_qr.services.resilience import CircuitBreaker, TokenBucket
+from tvde_qr.services.routing import RoutingError, RoutingService
+from tvde_qr.services.suggest import PrefixIndex, Suggestion, load_suggestions
+from tvde_qr.services.ttl_cache import TTLCache
+from tvde_qr.services.write_behind import WriteBehindQueue
 from tvde_qr.settings import settings
-from tvde_qr.services.osrm import OSRMClient, OSRMError
+from tvde_qr.services.osrm import OSRMBusy, OSRMClient, OSRMError
+from tvde_qr.web.assets import (
+    STATIC_DIR,
+    AssetVersions,
+    CachedStaticFiles,
+    load_manifest,
+    resolve_assets_dir,
+)
+from tvde_qr.web.pages import RenderedPage
+
+
+def _breaker(name: str) -> CircuitBreaker | None:
+    if not settings.circuit_breaker_enabled:
+        return None
+    return CircuitBreaker(
+        name,
+        failure_rate=settings.circuit_failure_rate,
+        window=settings.circuit_window,
+        min_calls=settings.circuit_min_calls,
+        open_s=settings.circuit_open_s,
+    )
+
+
+osrm_backends = BackendPool(
+    "osrm",
+    parse_urls(settings.osrm_urls),
+    health_path="/nearest/v1/driving/-9.14,38.72",
+    cooldown_s=settings.backend_cooldown_s,
+)
+nominatim_backends = BackendPool(
+    "nominatim",
+    parse_urls(settings.nominatim_urls),
+    health_path="/status",
+    cooldown_s=settings.backend_cooldown_s,
+)
+backends = (osrm_backends, nominatim_backends)
+
+osrm = OSRMClient(
+    osrm_timeout=settings.osrm_timeout_s,
+    nominatim_timeout=settings.nominatim_timeout_s,
+    connect_timeout=settings.http_connect_timeout_s,
+    nominatim_max_concurrency=settings.nominatim_max_concurrency or None,
+    geocode_ttl=timedelta(days=settings.geocode_cache_ttl_days),
+    osrm_breaker=_breaker("osrm"),
+    nominatim_breaker=_breaker("nominatim"),
+    nominatim_limiter=(
+        TokenBucket(settings.nominatim_rate_per_s, settings.nominatim_burst)
+        if settings.nominatim_rate_per_s > 0
+        else None
+    ),
+    nominatim_max_wait=settings.nominatim_max_wait_s,
+    osrm_backends=osrm_backends,
+    nominatim_backends=nominatim_backends,
+)
+
+# Só entra na corrida de rotas (hedge) se houver chave
+google = (
+    GoogleMapsClient(
+        settings.google_maps_api_key,
+        settings.google_maps_language,
+        settings.google_maps_region,
+        timeout=settings.google_maps_timeout_s,
+        connect_timeout=settings.http_connect_timeout_s,
+    )
+    if settings.google_maps_api_key
+    else None
+)
 
-osrm = OSRMClient()
+ROUTE_CACHE_TTL = timedelta(hours=settings.route_cache_ttl_hours)
 
+route_memory = TTLCache(
+    maxsize=settings.route_memory_cache_size,
+    ttl=settings.route_memory_cache_ttl_s,
+)
+
+# Escritas de cache fora do caminho do pedido (iniciadas no lifespan)
+route_writer = WriteBehindQueue(
+    "route_cache",
+    AsyncSessionLocal,
+    lambda session, rows: AsyncRouteCacheRepository(session).save_many(rows),
+    maxsize=settings.cache_write_queue_size,
+    batch_size=settings.cache_write_batch_size,
+)
+geocode_writer = WriteBehindQueue(
+    "geocode_cache",
+    AsyncSessionLocal,
+    lambda session, rows: AsyncGeocodeCacheRepository(session).save_many(rows),
+    maxsize=settings.cache_write_queue_size,
+    batch_size=settings.cache_write_batch_size,
+)
+writers = (route_writer, geocode_writer)
 
-app = FastAPI(title="TVDE QR")
+# quote_result.html já renderizado, por endereços + tarifa (ver _render_quote)
+quote_fragments = TTLCache(
+    maxsize=settings.quote_fragment_cache_size,
+    ttl=settings.quote_fragment_cache_ttl_s,
+)
+
+# Autocomplete: hubs e endereços de orçamentos concluídos, por prefixo (carregado no lifespan)
+SUGGEST_TTL = timedelta(hours=settings.suggest_ttl_hours)
+suggestions = PrefixIndex(maxsize=settings.suggest_index_size, ttl=SUGGEST_TTL.total_seconds())
+# Um limitador por cliente (IP) do /geocode/prefetch; os inativos saem por TTL/LRU
+prefetch_limits: TTLCache[TokenBucket] = TTLCache(maxsize=10_000, ttl=600)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Um único cliente HTTP (pool + keep-alive) para todos os upstreams
+    http_client = build_http_client(settings)
+    osrm.client = http_client
+    if settings.local_geocoder_path:
+        osrm.local_geocoder = LocalGeocoder(
+            settings.local_geocoder_path, min_score=settings.local_geocoder_min_score
+        )
+    if google is not None:
+        google.client = http_client
+    # Página do QR renderizada já no arranque (o primeiro scan não paga o Jinja)
+    landing_page(drivers.default)
+
+    if AsyncSessionLocal is not None and settings.cache_write_behind:
+        for writer in writers:
+            writer.start()
+
+    road_factors = suggest_load = driver_refresh = None
+    if AsyncSessionLocal is not None:
+        driver_refresh = asyncio.create_task(
+            run_periodic_refresh(
+                drivers, AsyncSessionLocal, interval_s=settings.drivers_refresh_interval_s
+            )
+        )
+        suggest_load = asyncio.create_task(
+            load_suggestions(
+                AsyncSessionLocal,
+                suggestions,
+                max_age=SUGGEST_TTL,
+                hubs=load_hubs(settings.hubs_path or None),
+            )
+        )
+        road_factors = asyncio.create_task(
+            run_periodic_fit(
+                AsyncSessionLocal,
+                distance_service,
+                interval_s=settings.road_factor_refit_interval_s,
+            )
+        )
+
+    hubs = None
+    if AsyncSessionLocal is not None and settings.hubs_warm_enabled:
+        hubs = asyncio.create_task(
+            run_periodic_warm(
+                load_hubs(settings.hubs_path or None),
+                osrm,
+                AsyncSessionLocal,
+                memory=route_memory,
+                interval_s=settings.hubs_refresh_interval_s,
+            )
+        )
+
+    health_checks = None
+    if settings.backend_health_interval_s > 0:
+        health_checks = asyncio.create_task(
+            run_health_checks(
+                backends, http_client, interval_s=settings.backend_health_interval_s
+            )
+        )
+
+    compaction = None
+    if SessionLocal is not None and settings.cache_compaction_interval_s > 0:
+        compaction = asyncio.create_task(
+            run_periodic_compaction(
+                SessionLocal,
+                interval_s=settings.cache_compaction_interval_s,
+                route_max_age=ROUTE_CACHE_TTL,
+                geocode_max_age=timedelta(days=settings.geocode_cache_ttl_days),
+                batch_size=settings.cache_compaction_batch_size,
+            )
+        )
+
+    try:
+        yield
+    finally:
+        for task in (compaction, road_factors, suggest_load, hubs, health_checks, driver_refresh):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        # Grava o que ainda estiver na fila antes de fechar o engine
+        for writer in writers:
+            await writer.stop()
+        osrm.client = None
+        if osrm.local_geocoder is not None:
+            osrm.local_geocoder.close()
+            osrm.local_geocoder = None
+        if google is not None:
+            google.client = None
+        await http_client.aclose()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+
+app = FastAPI(title="TVDE QR", lifespan=lifespan)
 
 @app.get("/", response_class=HTMLResponse)
-def landing(request: Request) -> HTMLResponse:
-    # Página principal do QR (link do cartão)
-    return templates.TemplateResponse("driver.html", {"request": request})
+def landing(request: Request) -> Response:
+    # Página principal do QR (link do cartão): da memória, com ETag e gzip/brotli
+    return landing_page(drivers.default).response(request)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -37,175 +258,604 @@ def health():
     return {"ok": True}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "route_cache": {**route_memory.stats.as_dict(), "size": len(route_memory)},
+        "quote_fragments": {**quote_fragments.stats.as_dict(), "size": len(quote_fragments)},
+        "drivers": {"loaded": len(drivers), "landing_pages": landing_page.cache_info().currsize},
+        "single_flight": {
+            "geocode": osrm.geocode_flight.stats.as_dict(),
+            "route": osrm.route_flight.stats.as_dict(),
+        },
+        "upstreams": {
+            "osrm": osrm.osrm_breaker.snapshot() if osrm.osrm_breaker else None,
+            "nominatim": {
+                "breaker": osrm.nominatim_breaker.snapshot() if osrm.nominatim_breaker else None,
+                "limiter": osrm.nominatim_limiter.snapshot() if osrm.nominatim_limiter else None,
+            },
+            "backends": {pool.name: pool.snapshot() for pool in backends},
+        },
+        "routing": {**routing.stats.as_dict(), "hedge_delay_s": routing.hedge_delay()},
+        "write_behind": {
+            w.name: {**w.stats.as_dict(), "depth": w.depth, "maxsize": w.maxsize} for w in writers
+        },
+    }
+
+
+def _cache_counts() -> dict[tuple[str, ...], float]:
+    counts = {}
+    for name, cache in (("route", route_memory), ("quote_fragment", quote_fragments)):
+        counts[(name, "hit")] = cache.stats.hits
+        counts[(name, "miss")] = cache.stats.misses
+    return counts
+
+
+def _cache_hit_ratios() -> dict[tuple[str, ...], float]:
+    ratios = {}
+    for name, cache in (("route", route_memory), ("quote_fragment", quote_fragments)):
+        lookups = cache.stats.hits + cache.stats.misses
+        ratios[(name,)] = cache.stats.hits / lookups if lookups else 0.0
+    return ratios
+
+
+# Os caches já contam hits/misses: lidos só no scrape, sem custo no pedido
+metrics.REGISTRY.register(
+    metrics.CallbackMetric(
+        "tvde_cache_lookups_total",
+        "Consultas aos caches em memória por resultado.",
+        "counter",
+        ["cache", "result"],
+        _cache_counts,
+    )
+)
+metrics.REGISTRY.register(
+    metrics.CallbackMetric(
+        "tvde_cache_hit_ratio",
+        "Fração de hits desde o arranque.",
+        "gauge",
+        ["cache"],
+        _cache_hit_ratios,
+    )
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint() -> PlainTextResponse:
+    # Formato de texto do Prometheus
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "web/static")), name="static")
+# Com `tvde-qr build-assets` feito, serve o build (nomes com hash, .br/.gz, AVIF/WebP)
+assets_dir = resolve_assets_dir(settings.assets_dir) if settings.assets_dir else None
+asset_manifest = load_manifest(assets_dir) if assets_dir is not None else None
+static_dir = assets_dir if asset_manifest is not None else STATIC_DIR
+# {{ asset_url("style.css") }} -> URL com hash: cache longa no browser
+asset_versions = AssetVersions(static_dir, manifest=asset_manifest)
+app.mount(
+    "/static", CachedStaticFiles(directory=static_dir, versions=asset_versions), name="static"
+)
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "web/templates"))
+templates.env.globals["asset_url"] = asset_versions.url
+templates.env.globals["asset_srcset"] = asset_versions.srcset
+
+
+@lru_cache(maxsize=1024)
+def landing_page(driver: DriverProfile) -> RenderedPage:
+    """
+    driver.html renderizado uma vez por motorista (não depende do pedido). O perfil é
+    imutável: depois de uma alteração na tabela drivers a chave é outra e a página é nova.
+    """
+    template_dir = os.path.join(BASE_DIR, "web/templates")
+    modified = max(
+        os.path.getmtime(os.path.join(template_dir, name)) for name in os.listdir(template_dir)
+    )
+    html = templates.get_template("driver.html").render(driver=driver)
+    return RenderedPage.from_html(html, modified=modified)
 
-distance_service = DistanceService()
 
-pricing_service = PricingService(
-    PricingConfig(
-        currency=settings.currency,
-        base_fare=settings.base_fare,
-        price_per_km=settings.price_per_km,
-        minimum_fare=settings.minimum_fare,
-    )
+# Estimativa local (sem rede) quando o OSRM falha; calibrada no arranque (lifespan)
+distance_service = DistanceService(
+    default_factor=settings.road_factor_default,
+    default_speed_kmh=settings.local_estimate_speed_kmh,
+    region_deg=settings.road_factor_region_deg,
+    min_samples=settings.road_factor_min_samples,
 )
 
-def get_db():
-    if SessionLocal is None:
+routing = RoutingService(
+    osrm,
+    google=google,
+    estimator=distance_service,
+    budget_s=settings.routing_budget_s,
+    hedge_percentile=settings.routing_hedge_percentile,
+    hedge_min_delay_s=settings.routing_hedge_min_delay_s,
+    hedge_default_delay_s=settings.routing_hedge_default_delay_s,
+    route_cache_ttl=ROUTE_CACHE_TTL,
+    session_factory=AsyncSessionLocal,
+)
+
+# Motoristas em memória (tabela drivers, recarregada no lifespan quando muda);
+# o por omissão vem das Settings e serve / e /m/demo mesmo sem base de dados
+drivers = DriverRegistry(
+    DriverProfile(
+        slug=settings.driver_slug,
+        name=settings.driver_name,
+        whatsapp_number=settings.whatsapp_number,
+        photo=settings.driver_photo or None,
+        tariff=PricingConfig(
+            currency=settings.currency,
+            base_fare=settings.base_fare,
+            price_per_km=settings.price_per_km,
+            minimum_fare=settings.minimum_fare,
+            price_per_minute=settings.price_per_minute,
+        ),
+    ),
+    # Páginas renderizadas de perfis antigos saem da lru_cache em vez de esperar pela LRU
+    on_replace=landing_page.cache_clear,
+)
+
+
+def _driver(slug: str) -> DriverProfile:
+    driver = drivers.get(slug.strip())
+    if driver is None:
+        raise HTTPException(status_code=404, detail="Motorista não encontrado")
+    return driver
+
+
+async def get_db():
+    if AsyncSessionLocal is None:
         raise RuntimeError("DATABASE_URL não configurada")
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
+@app.get("/m/{slug}", response_class=HTMLResponse)
+def driver_landing(request: Request, slug: str) -> Response:
+    # Página do QR de cada motorista: sem query (DriverRegistry) e renderizada uma vez
+    return landing_page(_driver(slug)).response(request)
 
-@app.get("/m/demo", response_class=HTMLResponse)
-def driver_demo(request: Request) -> HTMLResponse:
-    return templates.TemplateResponse("driver.html", {"request": request})
 
+@dataclass(frozen=True)
+class QuoteResult:
+    distance_km: float | None
+    duration_min: float | None
+    distance_source: str
 
-@app.post("/quote", response_class=HTMLResponse)
-async def quote_page(
-    request: Request,
-    origin: str = Form(...),
-    destination: str = Form(...),
-    distance_km: str = Form(""),
-    db: Session = Depends(get_db),
-) -> HTMLResponse:
-    origin_clean = origin.strip()
-    destination_clean = destination.strip()
 
-    repo = RouteCacheRepository(db)
+def _route_repo(db: AsyncSession) -> CachedRouteCacheRepository:
+    return CachedRouteCacheRepository(
+        AsyncRouteCacheRepository(db, route_writer),
+        route_memory,
+        negative_ttl=settings.route_negative_cache_ttl_s,
+    )
+
 
+def _manual_km(distance_km: str) -> float | None:
+    if not distance_km or not distance_km.strip():
+        return None
+    try:
+        return float(distance_km.strip().replace(",", "."))
+    except ValueError:
+        return None
+
+
+async def _quick_quote(
+    db: AsyncSession,
+    repo: CachedRouteCacheRepository,
+    origin: str,
+    destination: str,
+    distance_km: str,
+    *,
+    provisional: bool = False,
+) -> tuple[QuoteResult, bool]:
+    """
+    Tudo o que se resolve sem ir à rede: km manual, cache de rotas, cache negativo.
+    Retorna (resultado, final). Com provisional=True e sem resposta final,
+    devolve já a estimativa local (linha reta) a partir do geocode_cache.
+    """
     # -------------------------
     # A3.1: KM manual (se o cliente informar)
     # -------------------------
-    km: float | None = None
-    duration_min: float | None = None
-    distance_source = "estimated"
-
-    if distance_km and distance_km.strip():
-        try:
-            km = float(distance_km.strip().replace(",", "."))
-            if km > 0:
-                distance_source = "manual_km"
-        except ValueError:
-            km = None
-
+    km = _manual_km(distance_km)
     if km is not None:
-        repo.save(
-            origin=origin_clean,
-            destination=destination_clean,
-            distance_km=km,
-            duration_min=None,
-            source=distance_source,
-        )
+        # Não vai para o route_cache: é o valor de um cliente, não uma rota medida, e
+        # seria servido como cache hit a quem pedisse o mesmo par sem km
+        distance_source = "manual_km" if km > 0 else "estimated"
+        return QuoteResult(km, None, distance_source), True
 
+    # -------------------------
+    # A3.2: Cache (route_cache_ttl_hours, 24h por omissão)
+    # -------------------------
+    cached = await repo.get_recent(origin, destination, max_age=ROUTE_CACHE_TTL)
+    if cached:
+        return QuoteResult(cached.distance_km, cached.duration_min, f"cache:{cached.source}"), True
+
+    negative = repo.is_unavailable(origin, destination)
+    if not negative and not provisional:
+        return QuoteResult(None, None, "pending"), False
+
+    # Falhou há pouco no OSRM (não repetimos o timeout) ou resposta provisória
+    estimate = await routing.local_estimate(
+        origin, destination, geocode_cache=AsyncGeocodeCacheRepository(db)
+    )
+    if estimate:
+        result = QuoteResult(estimate.distance_km, estimate.duration_min, "local_estimate")
     else:
-        # -------------------------
-        # A3.2: Cache (24h)
-        # -------------------------
-        cached = repo.get_recent(
-            origin_clean,
-            destination_clean,
-            max_age=timedelta(hours=24),
-        )
-
-        if cached:
-            km = cached.distance_km
-            duration_min = cached.duration_min
-            distance_source = f"cache:{cached.source}"
-
-        else:
-            try:
-                route = await osrm.route_by_addresses(origin_clean, destination_clean)
-                km = route.distance_km
-                duration_min = route.duration_min
-                distance_source = "osrm"
-            
-
-                repo.save(
-                    origin=origin_clean,
-                    destination=destination_clean,
-                    distance_km=km,
-                    duration_min=duration_min,
-                    source=distance_source,
-                )
-                
-            except OSRMError:
-                km = None
-                duration_min = None
-                distance_source = "unavailable"
-                
-            
-                
+        result = QuoteResult(None, None, "unavailable" if negative else "pending")
+    return result, negative
+
+
+async def _routed_quote(
+    db: AsyncSession,
+    repo: CachedRouteCacheRepository,
+    origin: str,
+    destination: str,
+) -> QuoteResult:
+    # OSRM -> (hedge) Google -> estimativa local, dentro do orçamento de latência
+    try:
+        answer = await routing.route(
+            origin,
+            destination,
+            geocode_cache=AsyncGeocodeCacheRepository(db, geocode_writer),
+            route_cache=repo,
+            grid_cell_deg=settings.route_cache_grid_cell_deg,
+        )
+    except RoutingError:
+        repo.mark_unavailable(origin, destination)
+        return QuoteResult(None, None, "unavailable")
+
+    if answer.source in ("osrm", "google"):
+        await repo.save(
+            origin=origin,
+            destination=destination,
+            distance_km=answer.distance_km,
+            duration_min=answer.duration_min,
+            source=answer.source,
+            grid_key=answer.grid_key,
+        )
+        if answer.coords is not None:
+            # Orçamento concluído: os dois endereços passam a poder ser sugeridos
+            (o_lat, o_lon), (d_lat, d_lon) = answer.coords
+            suggestions.add(origin, o_lat, o_lon)
+            suggestions.add(destination, d_lat, d_lon)
+    elif answer.source == "local_estimate":
+        repo.mark_unavailable(origin, destination)
+    return QuoteResult(answer.distance_km, answer.duration_min, answer.source)
+
+
+def _quote_context(
+    request: Request,
+    driver: DriverProfile,
+    origin: str,
+    destination: str,
+    result: QuoteResult,
+    *,
+    provisional: bool = False,
+) -> dict:
+    km = result.distance_km
+    currency = driver.tariff.currency
+
     # Se não foi possível calcular distância real e o usuário não informou km,
     # retornamos uma resposta honesta (sem estourar erro).
     if km is None:
-        currency = pricing_service.config.currency
         msg = (
             "Olá! Vi seu QR e queria um orçamento.\n"
             "Não consegui calcular a rota automaticamente agora.\n"
-            f"Origem: {origin_clean}\n"
-            f"Destino: {destination_clean}\n"
+            f"Origem: {origin}\n"
+            f"Destino: {destination}\n"
             "Pode me confirmar a morada completa ou informar os km aproximados?"
         )
-        whatsapp_url = f"https://wa.me/{settings.whatsapp_number}?text={quote(msg)}"
-
-        return templates.TemplateResponse(
-            "quote_result.html",
-            {
-                "request": request,
-                "origin": origin_clean,
-                "destination": destination_clean,
-                "distance_km": None,
-                "duration_min": None,
-                "price": None,
-                "currency": currency,
-                "distance_source": distance_source,
-                "whatsapp_url": whatsapp_url,
-            },
+        price = None
+    else:
+        # preço
+        price = driver.pricing.calculate_price(km, result.duration_min)
+        msg = (
+            f"Olá! Vi seu QR e queria confirmar o valor.\n"
+            f"Origem: {origin}\n"
+            f"Destino: {destination}\n"
+            f"Distância: {km} km ({result.distance_source})\n"
+            f"Estimativa: {currency} {price}\n"
+            f"Horário: "
         )
+    whatsapp_url = f"https://wa.me/{driver.whatsapp_number}?text={quote(msg)}"
+
+    return {
+        "request": request,
+        "driver": driver,
+        "origin": origin,
+        "destination": destination,
+        "distance_km": km,
+        "duration_min": result.duration_min,
+        "price": price,
+        "currency": currency,
+        "distance_source": result.distance_source,
+        "whatsapp_url": whatsapp_url,
+        # Lido pelo static/quote.js (o fragmento não leva scripts inline)
+        "quote_data": {
+            "origin": origin,
+            "destination": destination,
+            "distance": f"{km} km" if km is not None else "",
+            "duration": f"{result.duration_min} min" if result.duration_min else "",
+            "price": f"{currency} {price}" if price is not None else "",
+            "wa_number": driver.whatsapp_number,
+        },
+        "provisional": provisional,
+    }
 
-    # preço
-    price = pricing_service.calculate_price(km)
-    currency = pricing_service.config.currency
 
-    msg = (
-        f"Olá! Vi seu QR e queria confirmar o valor.\n"
-        f"Origem: {origin_clean}\n"
-        f"Destino: {destination_clean}\n"
-        f"Distância: {km} km ({distance_source})\n"
-        f"Estimativa: {currency} {price}\n"
-        f"Horário: "
-    )
-    whatsapp_url = f"https://wa.me/{settings.whatsapp_number}?text={quote(msg)}"
+def _render_quote(
+    request: Request,
+    driver: DriverProfile,
+    origin: str,
+    destination: str,
+    result: QuoteResult,
+    *,
+    provisional: bool = False,
+) -> str:
+    """
+    quote_result.html em cache por (endereços mostrados, motorista, resultado): o perfil
+    inclui tarifa e contacto, por isso mudar qualquer um muda a chave e cada motorista
+    só vê o seu HTML. A chave usa a grafia do cliente e não a rota normalizada: o
+    fragmento e a mensagem do WhatsApp repetem os endereços tal como foram escritos.
+    """
+    if not provisional:
+        # Cada orçamento final é renderizado uma vez: conta aqui a origem da distância
+        metrics.QUOTES.inc(distance_source=result.distance_source)
+    key = (origin, destination, driver, result, provisional)
+    with metrics.QUOTE_STAGE_SECONDS.time(stage="render"):
+        html = quote_fragments.get(key)
+        if html is None:
+            html = templates.get_template("quote_result.html").render(
+                _quote_context(
+                    request, driver, origin, destination, result, provisional=provisional
+                )
+            )
+            quote_fragments.set(key, html)
+    return html
+
+
+@app.post("/quote", response_class=HTMLResponse)
+async def quote_page(
+    request: Request,
+    origin: str = Form(...),
+    destination: str = Form(...),
+    distance_km: str = Form(""),
+    driver: str = Form(""),
+    db: AsyncSession = Depends(get_db),
+) -> HTMLResponse:
+    profile = _driver(driver)
+    origin_clean = origin.strip()
+    destination_clean = destination.strip()
+
+    repo = _route_repo(db)
+    with metrics.QUOTE_STAGE_SECONDS.time(stage="cache"):
+        result, final = await _quick_quote(db, repo, origin_clean, destination_clean, distance_km)
+    if not final:
+        with metrics.QUOTE_STAGE_SECONDS.time(stage="route"):
+            result = await _routed_quote(db, repo, origin_clean, destination_clean)
+
+    return HTMLResponse(_render_quote(request, profile, origin_clean, destination_clean, result))
+
 
-    return templates.TemplateResponse(
-        "quote_result.html",
-        {
-            "request": request,
-            "origin": origin_clean,
-            "destination": destination_clean,
-            "distance_km": km,
-            "duration_min": duration_min,
-            "price": price,
-            "currency": currency,
-            "distance_source": distance_source,
-            "whatsapp_url": whatsapp_url,
-        },
-    )
 @app.post("/quote/fragment", response_class=HTMLResponse)
 async def quote_fragment(
     request: Request,
     origin: str = Form(...),
     destination: str = Form(...),
     distance_km: str = Form(""),
-    db: Session = Depends(get_db),
+    driver: str = Form(""),
+    db: AsyncSession = Depends(get_db),
 ) -> HTMLResponse:
-    return await quote_page(request, origin, destination, distance_km, db)
\ No newline at end of file
+    return await quote_page(request, origin, destination, distance_km, driver, db)
+
+
+def _sse(stage: str, html: str) -> str:
+    return f"event: quote\ndata: {json.dumps({'stage': stage, 'html': html})}\n\n"
+
+
+@app.post("/quote/stream")
+async def quote_stream(
+    request: Request,
+    origin: str = Form(...),
+    destination: str = Form(...),
+    distance_km: str = Form(""),
+    driver: str = Form(""),
+) -> StreamingResponse:
+    """
+    Versão progressiva do /quote (server-sent events): primeiro um evento "provisional"
+    (cache ou estimativa em linha reta, sem rede), depois o "final" com a rota real.
+    Se o cache já tiver a resposta, vai só o "final".
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("DATABASE_URL não configurada")
+    profile = _driver(driver)
+    origin_clean = origin.strip()
+    destination_clean = destination.strip()
+
+    def render(result: QuoteResult, provisional: bool = False) -> str:
+        return _render_quote(
+            request, profile, origin_clean, destination_clean, result, provisional=provisional
+        )
+
+    async def events():
+        # Sessão própria: o gerador corre depois de o endpoint devolver a resposta
+        async with AsyncSessionLocal() as db:
+            repo = _route_repo(db)
+            with metrics.QUOTE_STAGE_SECONDS.time(stage="cache"):
+                result, final = await _quick_quote(
+                    db, repo, origin_clean, destination_clean, distance_km, provisional=True
+                )
+            if final:
+                yield _sse("final", render(result))
+                return
+            yield _sse("provisional", render(result, provisional=True))
+
+            with metrics.QUOTE_STAGE_SECONDS.time(stage="route"):
+                result = await _routed_quote(db, repo, origin_clean, destination_clean)
+            yield _sse("final", render(result))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Sem buffering em proxies (nginx) para o primeiro evento sair logo
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/geocode/suggest", response_model=list[AddressSuggestion])
+async def geocode_suggest(
+    q: str = Query("", max_length=200),
+    db: AsyncSession = Depends(get_db),
+) -> list[AddressSuggestion]:
+    """
+    Hubs e endereços de orçamentos concluídos que começam pelo que o cliente escreveu
+    (sem ir à rede): índice em memória primeiro, Postgres (LIKE 'prefixo%') se faltarem.
+    """
+    if len(normalize_address(q)) < settings.suggest_min_chars:
+        return []
+    limit = settings.suggest_limit
+    found = {normalize_address(s.label): s for s in suggestions.search(q, limit)}
+    if len(found) < limit:
+        rows = await AsyncGeocodeCacheRepository(db).search_prefix(
+            q,
+            limit=limit,
+            max_age=timedelta(days=settings.geocode_cache_ttl_days),
+            quoted_max_age=SUGGEST_TTL,
+        )
+        # Não entram no índice: lá cada entrada expira a contar do orçamento
+        for row in rows:
+            found.setdefault(row.query_key, Suggestion(row.query, row.lat, row.lon))
+    ordered = [found[key] for key in sorted(found)[:limit]]
+    return [AddressSuggestion(label=s.label, lat=s.lat, lon=s.lon) for s in ordered]
+
+
+async def _prefetch_allowed(client: str) -> bool:
+    if settings.geocode_prefetch_rate_per_s <= 0:
+        return True
+    bucket = prefetch_limits.get(client)
+    if bucket is None:
+        bucket = TokenBucket(settings.geocode_prefetch_rate_per_s, settings.geocode_prefetch_burst)
+        prefetch_limits.set(client, bucket)
+    return await bucket.acquire(max_wait=0)
+
+
+@app.post("/geocode/prefetch", response_model=AddressSuggestion)
+async def geocode_prefetch(
+    request: Request,
+    q: str = Form(..., max_length=200),
+    db: AsyncSession = Depends(get_db),
+) -> AddressSuggestion:
+    """
+    Geocodifica já o endereço escolhido/escrito (ao sair do campo), para o /quote
+    seguinte encontrar as coordenadas no geocode_cache e não esperar pelo Nominatim.
+    Prioridade baixa: limitado por cliente e só com vaga livre no Nominatim (503 se não
+    houver). Não entra nas sugestões: só orçamentos concluídos entram.
+    """
+    label = q.strip()
+    if not normalize_address(label):
+        raise HTTPException(status_code=422, detail="Endereço vazio")
+    if not await _prefetch_allowed(request.client.host if request.client else ""):
+        raise HTTPException(status_code=429, detail="Demasiados pedidos")
+    try:
+        # Sem write-behind: a linha tem de estar gravada antes de o /quote chegar
+        [(lat, lon)] = await osrm.geocode_many(
+            [label], geocode_cache=AsyncGeocodeCacheRepository(db), background=True
+        )
+    except OSRMBusy as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except OSRMError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return AddressSuggestion(label=label, lat=lat, lon=lon)
+
+
+def _unique_addresses(addresses: list[str]) -> list[str]:
+    # Um endereço por chave normalizada (fica a primeira grafia)
+    unique: dict[str, str] = {}
+    for address in addresses:
+        unique.setdefault(normalize_address(address), address)
+    return list(unique.values())
+
+
+@app.post("/quotes/batch", response_model=BatchQuoteResponse)
+async def quotes_batch(
+    payload: BatchQuoteRequest,
+    db: AsyncSession = Depends(get_db),
+) -> BatchQuoteResponse:
+    """
+    Orçamentos para todas as origens x destinos: geocoding de cada endereço único
+    uma vez e uma só chamada ao /table do OSRM para a matriz inteira. Um endereço
+    que não se consiga geocodificar só deixa sem preço as suas células.
+    """
+    profile = _driver(payload.driver)
+    origins = _unique_addresses(payload.origins)
+    destinations = _unique_addresses(payload.destinations)
+    if len(origins) + len(destinations) > settings.batch_quote_max_addresses:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Máximo de {settings.batch_quote_max_addresses} endereços por pedido",
+        )
+
+    try:
+        coords = await osrm.geocode_batch(
+            [*origins, *destinations],
+            geocode_cache=AsyncGeocodeCacheRepository(db, geocode_writer),
+            max_wait=settings.batch_quote_geocode_wait_s,
+        )
+        sources = [i for i, c in enumerate(coords[: len(origins)]) if c is not None]
+        targets = [j for j, c in enumerate(coords[len(origins) :]) if c is not None]
+        if not sources or not targets:
+            raise OSRMError("Nenhuma origem ou nenhum destino geocodificado")
+        matrix = await osrm.table(
+            [coords[i] for i in sources], [coords[len(origins) + j] for j in targets]
+        )
+    except OSRMError as e:
+        raise HTTPException(status_code=502, detail=str(e)) from e
+
+    located = {
+        (i, j): route for i, row in zip(sources, matrix) for j, route in zip(targets, row)
+    }
+    cells = [
+        (origin, destination, located.get((i, j)))
+        for i, origin in enumerate(origins)
+        for j, destination in enumerate(destinations)
+    ]
+    routes = [
+        {
+            "origin": origin,
+            "destination": destination,
+            "grid_key": None,
+            "distance_km": route.distance_km,
+            "duration_min": route.duration_min,
+            "source": "osrm",
+        }
+        for origin, destination, route in cells
+        if route is not None
+    ]
+    # Todas as células com rota numa só passagem (vetorizada com numpy)
+    prices = iter(
+        profile.pricing.calculate_prices(
+            [r["distance_km"] for r in routes],
+            [r["duration_min"] for r in routes],
+        )
+    )
+
+    quotes = [
+        BatchQuote(
+            origin=origin,
+            destination=destination,
+            distance_km=route.distance_km if route else None,
+            duration_min=route.duration_min if route else None,
+            price=next(prices) if route else None,
+            distance_source="osrm" if route else "unavailable",
+        )
+        for origin, destination, route in cells
+    ]
+
+    # As rotas da matriz ficam no cache para os /quote seguintes
+    await AsyncRouteCacheRepository(db, route_writer).save_many(routes)
+
+    return BatchQuoteResponse(currency=profile.tariff.currency, quotes=quotes)
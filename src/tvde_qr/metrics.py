@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import abc
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence, TypeVar
+
+# Segundos: de um cache hit em memória (~ms) até ao timeout dos upstreams (10 s)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperadas {self.labelnames}, recebidas {labels}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abc.abstractmethod
+    def lines(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join([*header, *self.lines()])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # por labels: [contagem por bucket (não cumulativa)..., +Inf], soma
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = next((i for i, b in enumerate(self.buckets) if value <= b), len(self.buckets))
+        with self._lock:
+            counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Mede o bloco (também com exceção: falhas lentas são o que mais interessa)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._series.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield (
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackMetric(_Metric):
+    """Valores lidos no momento do scrape (ex.: estatísticas que os caches já contam)."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        labelnames: Sequence[str],
+        collect: Callable[[], dict[Labels, float]],
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def lines(self) -> Iterator[str]:
+        for key, value in sorted(self.collect().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Formato de texto do Prometheus (0.0.4)."""
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+QUOTE_STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "tvde_quote_stage_seconds",
+        "Tempo de cada etapa do orçamento (cache, rota, render).",
+        ["stage"],
+    )
+)
+QUOTES = REGISTRY.register(
+    Counter(
+        "tvde_quotes_total",
+        "Orçamentos respondidos, por origem da distância.",
+        ["distance_source"],
+    )
+)
+UPSTREAM_SECONDS = REGISTRY.register(
+    Histogram(
+        "tvde_upstream_request_seconds",
+        "Duração dos pedidos HTTP aos upstreams.",
+        ["upstream"],
+    )
+)
+UPSTREAM_REQUESTS = REGISTRY.register(
+    Counter(
+        "tvde_upstream_requests_total",
+        "Pedidos aos upstreams por resultado (success, failure, ignored).",
+        ["upstream", "outcome"],
+    )
+)
+DB_SECONDS = REGISTRY.register(
+    Histogram("tvde_db_query_seconds", "Duração das operações nos caches em Postgres.", ["op"])
+)
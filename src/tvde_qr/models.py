@@ -2,7 +2,17 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Float, Integer, String, Text, func
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.orm import Mapped, mapped_column
 
 from tvde_qr.db import Base
@@ -15,9 +25,73 @@ class RouteCache(Base):
     origin: Mapped[str] = mapped_column(Text, nullable=False)
     destination: Mapped[str] = mapped_column(Text, nullable=False)
 
+    # Chaves canónicas: texto normalizado e (opcional) célula de grelha das coordenadas
+    route_key: Mapped[str] = mapped_column(Text, nullable=False)
+    grid_key: Mapped[str | None] = mapped_column(Text, nullable=True)
+
     distance_km: Mapped[float] = mapped_column(Float, nullable=False)
     duration_min: Mapped[float | None] = mapped_column(Float, nullable=True)
 
     source: Mapped[str] = mapped_column(String(32), nullable=False, default="google_directions")
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Uma linha por par normalizado (upsert em save)
+        UniqueConstraint("route_key", name="uq_route_cache_route_key"),
+        Index("ix_route_cache_grid_key_created_at", "grid_key", "created_at"),
+        # Compactação: DELETE ... WHERE created_at < now() - ttl
+        Index("ix_route_cache_created_at", "created_at"),
+    )
+
+
+class GeocodeCache(Base):
+    __tablename__ = "geocode_cache"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    query_key: Mapped[str] = mapped_column(Text, nullable=False, unique=True)
+    query: Mapped[str] = mapped_column(Text, nullable=False)
+
+    lat: Mapped[float] = mapped_column(Float, nullable=False)
+    lon: Mapped[float] = mapped_column(Float, nullable=False)
+
+    source: Mapped[str] = mapped_column(String(32), nullable=False, default="nominatim")
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+    __table_args__ = (
+        # Sugestões por prefixo: WHERE query_key LIKE 'prefixo%'
+        Index(
+            "ix_geocode_cache_query_key_prefix",
+            "query_key",
+            postgresql_ops={"query_key": "text_pattern_ops"},
+        ),
+    )
+
+
+class Driver(Base):
+    """Motorista da frota: página do QR (/m/{slug}), contacto e tarifa próprios."""
+
+    __tablename__ = "drivers"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    slug: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    name: Mapped[str] = mapped_column(Text, nullable=False)
+    whatsapp_number: Mapped[str] = mapped_column(String(32), nullable=False)
+    # Ficheiro em web/static (com variantes do build-assets) ou URL absoluto
+    photo: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    currency: Mapped[str] = mapped_column(String(8), nullable=False, default="€")
+    base_fare: Mapped[float] = mapped_column(Float, nullable=False)
+    price_per_km: Mapped[float] = mapped_column(Float, nullable=False)
+    minimum_fare: Mapped[float] = mapped_column(Float, nullable=False)
+    price_per_minute: Mapped[float] = mapped_column(Float, nullable=False, default=0.0)
+
+    active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    # Qualquer UPDATE renova updated_at (trigger drivers_touch_updated_at, também fora
+    # do ORM): é o que o DriverRegistry observa
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from tvde_qr.models import Driver
+
+TARIFF_FIELDS = ("currency", "base_fare", "price_per_km", "minimum_fare", "price_per_minute")
+# Campos que o `tvde-qr set-driver` pode alterar
+DRIVER_FIELDS = ("name", "whatsapp_number", "photo", *TARIFF_FIELDS, "active")
+
+
+class DriverRepository:
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def get(self, slug: str) -> Driver | None:
+        return self.session.execute(select(Driver).where(Driver.slug == slug)).scalar_one_or_none()
+
+    def all(self) -> list[Driver]:
+        return list(self.session.execute(select(Driver).order_by(Driver.slug)).scalars())
+
+    def upsert(self, slug: str, **fields) -> Driver:
+        """
+        Cria o motorista ou altera só os campos dados. updated_at é renovado pelo
+        trigger da tabela em qualquer UPDATE (daqui ou de fora da app): é o sinal para
+        as instâncias da app recarregarem o DriverRegistry.
+        """
+        unknown = set(fields) - set(DRIVER_FIELDS)
+        if unknown:
+            raise ValueError(f"Campos desconhecidos: {sorted(unknown)}")
+        driver = self.get(slug)
+        if driver is None:
+            driver = Driver(slug=slug, **fields)
+            self.session.add(driver)
+        else:
+            for name, value in fields.items():
+                setattr(driver, name, value)
+        self.session.commit()
+        self.session.refresh(driver)
+        return driver
+
+
+class AsyncDriverRepository:
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+
+    async def fingerprint(self) -> tuple[int, datetime | None, float | None]:
+        """
+        (linhas, última alteração, soma dos updated_at): muda com qualquer insert/update/
+        delete. A soma apanha um UPDATE cuja transação começou antes da última alteração
+        vista (updated_at mais antigo do que o max) e só fez commit depois.
+        """
+        stmt = select(
+            func.count(Driver.id),
+            func.max(Driver.updated_at),
+            func.sum(func.extract("epoch", Driver.updated_at)),
+        )
+        count, updated, total = (await self.session.execute(stmt)).one()
+        return count, updated, total
+
+    async def active(self) -> list[Driver]:
+        stmt = select(Driver).where(Driver.active.is_(True)).order_by(Driver.slug)
+        return list((await self.session.execute(stmt)).scalars())
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, exists, func, or_, select
+
+from tvde_qr import metrics
+from tvde_qr.db import batched, delete_in_batches
+from tvde_qr.models import GeocodeCache, RouteCache
+from tvde_qr.services.address import normalize_address
+from tvde_qr.services.write_behind import WriteBehindQueue
+
+
+def _recent_stmt(keys: Iterable[str], max_age: timedelta):
+    return (
+        select(GeocodeCache)
+        .where(GeocodeCache.query_key.in_(list(keys)))
+        .where(GeocodeCache.created_at >= func.now() - max_age)
+    )
+
+
+# Rotas calculadas de facto: só estes endereços (e os hubs) podem ser sugeridos a outros
+QUOTED_SOURCES = ("osrm", "google")
+
+
+def _quoted_routes(max_age: timedelta):
+    """Condição: a linha do geocode_cache é origem ou destino de um orçamento recente."""
+    return (
+        RouteCache.source.in_(QUOTED_SOURCES),
+        RouteCache.created_at >= func.now() - max_age,
+        or_(
+            func.split_part(RouteCache.route_key, "|", 1) == GeocodeCache.query_key,
+            func.split_part(RouteCache.route_key, "|", 2) == GeocodeCache.query_key,
+        ),
+    )
+
+
+def _prefix_stmt(prefix: str, limit: int, max_age: timedelta, quoted_max_age: timedelta):
+    # LIKE 'prefixo%' usa o índice text_pattern_ops de query_key
+    return (
+        select(GeocodeCache)
+        .where(GeocodeCache.query_key.startswith(normalize_address(prefix), autoescape=True))
+        .where(GeocodeCache.created_at >= func.now() - max_age)
+        .where(
+            or_(
+                GeocodeCache.source == "hub",
+                exists().where(*_quoted_routes(quoted_max_age)),
+            )
+        )
+        .order_by(GeocodeCache.query_key)
+        .limit(limit)
+    )
+
+
+def _upsert_stmt(rows: list[tuple[str, float, float, str]]):
+    # Uma linha por chave: o Postgres recusa ON CONFLICT que atualiza a mesma linha duas vezes
+    by_key = {
+        normalize_address(query): {
+            "query_key": normalize_address(query),
+            "query": query.strip(),
+            "lat": lat,
+            "lon": lon,
+            "source": source,
+        }
+        for query, lat, lon, source in rows
+    }
+    stmt = insert(GeocodeCache).values(list(by_key.values()))
+    return (
+        stmt.on_conflict_do_update(
+            index_elements=[GeocodeCache.query_key],
+            set_={
+                "query": stmt.excluded.query,
+                "lat": stmt.excluded.lat,
+                "lon": stmt.excluded.lon,
+                "source": stmt.excluded.source,
+                "created_at": func.now(),
+            },
+        )
+        .returning(GeocodeCache)
+        .execution_options(populate_existing=True)
+    )
+
+
+class GeocodeCacheRepository:
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def get_recent(self, query: str, max_age: timedelta) -> GeocodeCache | None:
+        """
+        Retorna coordenadas do endereço (normalizado) se não estiverem expiradas.
+        """
+        stmt = _recent_stmt([normalize_address(query)], max_age)
+        return self.session.execute(stmt).scalar_one_or_none()
+
+    def save(self, query: str, lat: float, lon: float, source: str) -> GeocodeCache:
+        """
+        Grava (ou renova) as coordenadas de um endereço.
+        """
+        geocode = self.session.execute(_upsert_stmt([(query, lat, lon, source)])).scalar_one()
+        self.session.commit()
+        return geocode
+
+    def delete_expired(self, max_age: timedelta, batch_size: int = 1000) -> int:
+        """
+        Remove entradas expiradas em lotes. Retorna o total removido.
+        """
+        return delete_in_batches(
+            self.session, GeocodeCache, GeocodeCache.created_at < func.now() - max_age, batch_size
+        )
+
+
+class AsyncGeocodeCacheRepository:
+    """
+    Versão async (AsyncSession) usada no caminho do /quote.
+    Uma AsyncSession não aceita operações concorrentes: por isso as leituras e
+    escritas são agrupadas (get_many / save_many) em vez de uma por tarefa.
+    Com um writer (write-behind), as escritas vão para a fila.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        writer: WriteBehindQueue[tuple[str, float, float, str]] | None = None,
+    ) -> None:
+        self.session = session
+        self.writer = writer
+
+    async def get_recent(self, query: str, max_age: timedelta) -> GeocodeCache | None:
+        found = await self.get_many([query], max_age)
+        return found.get(normalize_address(query))
+
+    async def get_many(self, queries: Iterable[str], max_age: timedelta) -> dict[str, GeocodeCache]:
+        """
+        Busca vários endereços numa só query. Retorna {chave normalizada: linha}.
+        """
+        keys = {normalize_address(q) for q in queries}
+        if not keys:
+            return {}
+        with metrics.DB_SECONDS.time(op="geocode_get"):
+            result = await self.session.execute(_recent_stmt(keys, max_age))
+        return {row.query_key: row for row in result.scalars()}
+
+    async def search_prefix(
+        self, prefix: str, *, limit: int, max_age: timedelta, quoted_max_age: timedelta
+    ) -> list[GeocodeCache]:
+        """
+        Endereços cuja chave normalizada começa por prefix (sugestões enquanto se escreve):
+        só hubs e endereços de orçamentos concluídos nos últimos quoted_max_age.
+        """
+        if not normalize_address(prefix):
+            return []
+        stmt = _prefix_stmt(prefix, limit, max_age, quoted_max_age)
+        return list((await self.session.execute(stmt)).scalars())
+
+    async def quoted(
+        self, *, limit: int, max_age: timedelta
+    ) -> list[tuple[GeocodeCache, datetime]]:
+        """
+        (endereço, hora do último orçamento) dos limit endereços de orçamentos concluídos
+        mais recentes (para carregar o índice de sugestões).
+        """
+        quoted_at = func.max(RouteCache.created_at).label("quoted_at")
+        stmt = (
+            select(GeocodeCache, quoted_at)
+            .join(RouteCache, and_(*_quoted_routes(max_age)))
+            .group_by(GeocodeCache.id)
+            .order_by(quoted_at.desc())
+            .limit(limit)
+        )
+        return [(row, at) for row, at in (await self.session.execute(stmt)).all()]
+
+    async def save(self, query: str, lat: float, lon: float, source: str) -> GeocodeCache | None:
+        saved = await self.save_many([(query, lat, lon, source)])
+        return saved[0] if saved else None
+
+    async def save_many(self, rows: list[tuple[str, float, float, str]]) -> list[GeocodeCache]:
+        """
+        Grava vários (endereço, lat, lon, source) com INSERT ... ON CONFLICT multi-linha.
+        Com writer ativo, só enfileira e devolve [].
+        """
+        if not rows:
+            return []
+        if self.writer is not None and self.writer.offer(rows):
+            return []
+        saved = []
+        with metrics.DB_SECONDS.time(op="geocode_save"):
+            # Em blocos: um só INSERT com milhares de linhas passa o limite de parâmetros
+            for batch in batched(rows):
+                result = await self.session.execute(_upsert_stmt(batch))
+                saved.extend(result.scalars())
+            await self.session.commit()
+        return saved
@@ -1,11 +1,99 @@
 from __future__ import annotations
 
-from datetime import timedelta, datetime
+from dataclasses import dataclass
+from datetime import timedelta, datetime, timezone
 
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, select
 
-from tvde_qr.models import RouteCache
+from tvde_qr import metrics
+from tvde_qr.db import batched, delete_in_batches
+from tvde_qr.models import GeocodeCache, RouteCache
+from tvde_qr.services.address import route_key
+from tvde_qr.services.distance import RouteSample
+from tvde_qr.services.ttl_cache import TTLCache
+from tvde_qr.services.write_behind import WriteBehindQueue
+
+
+def _recent_stmt(origin: str, destination: str, max_age: timedelta):
+    return (
+        select(RouteCache)
+        .where(RouteCache.route_key == route_key(origin, destination))
+        .where(RouteCache.created_at >= func.now() - max_age)
+    )
+
+
+def _recent_by_grid_stmt(grid_key: str, max_age: timedelta):
+    return (
+        select(RouteCache)
+        .where(RouteCache.grid_key == grid_key)
+        .where(RouteCache.created_at >= func.now() - max_age)
+        .order_by(RouteCache.created_at.desc())
+        .limit(1)
+    )
+
+
+def _geocoded_routes_stmt(limit: int):
+    """
+    Rotas reais com as coordenadas dos dois endereços (join ao geocode_cache pela
+    chave normalizada de cada lado do route_key). Mais recentes primeiro.
+    """
+    origin = aliased(GeocodeCache)
+    destination = aliased(GeocodeCache)
+    return (
+        select(
+            origin.lat,
+            origin.lon,
+            destination.lat,
+            destination.lon,
+            RouteCache.distance_km,
+            RouteCache.duration_min,
+        )
+        .select_from(RouteCache)
+        .join(origin, origin.query_key == func.split_part(RouteCache.route_key, "|", 1))
+        .join(destination, destination.query_key == func.split_part(RouteCache.route_key, "|", 2))
+        # km manuais não são medições de estrada
+        .where(RouteCache.source != "manual_km")
+        .order_by(RouteCache.created_at.desc())
+        .limit(limit)
+    )
+
+
+def _as_samples(rows) -> list[RouteSample]:
+    return [
+        ((o_lat, o_lon), (d_lat, d_lon), km, minutes)
+        for o_lat, o_lon, d_lat, d_lon, km, minutes in rows
+    ]
+
+
+def _upsert_stmt(rows: list[dict]):
+    """
+    INSERT ... ON CONFLICT (route_key) DO UPDATE ... RETURNING para uma ou várias rotas.
+    Cada dict tem origin, destination, distance_km, duration_min, source e grid_key.
+    """
+    # Uma linha por chave (fica a última): o Postgres recusa atualizar a mesma linha duas vezes
+    by_key = {route_key(r["origin"], r["destination"]): r for r in rows}
+    stmt = insert(RouteCache).values(
+        [{"route_key": key, "grid_key": None, **row} for key, row in by_key.items()]
+    )
+    return (
+        stmt.on_conflict_do_update(
+            constraint="uq_route_cache_route_key",
+            set_={
+                "origin": stmt.excluded.origin,
+                "destination": stmt.excluded.destination,
+                "grid_key": stmt.excluded.grid_key,
+                "distance_km": stmt.excluded.distance_km,
+                "duration_min": stmt.excluded.duration_min,
+                "source": stmt.excluded.source,
+                "created_at": func.now(),
+            },
+        )
+        .returning(RouteCache)
+        .execution_options(populate_existing=True)
+    )
 
 
 class RouteCacheRepository:
@@ -20,23 +108,29 @@ class RouteCacheRepository:
     ) -> RouteCache | None:
         """
         Retorna rota se existir e não estiver expirada.
+        A busca é pela chave canónica (endereços normalizados), não pelo texto exato.
         """
-        stmt = (
-            select(RouteCache)
-            .where(RouteCache.origin == origin)
-            .where(RouteCache.destination == destination)
-            .order_by(RouteCache.created_at.desc())
-            .limit(1)
-        )
+        return self.session.execute(_recent_stmt(origin, destination, max_age)).scalar_one_or_none()
 
-        result = self.session.execute(stmt).scalar_one_or_none()
-        if not result:
-            return None
+    def get_recent_by_grid(self, grid_key: str, max_age: timedelta) -> RouteCache | None:
+        """
+        Retorna a rota mais recente entre as mesmas células de grelha (coordenadas).
+        """
+        return self.session.execute(_recent_by_grid_stmt(grid_key, max_age)).scalar_one_or_none()
 
-        if datetime.utcnow() - result.created_at.replace(tzinfo=None) > max_age:
-            return None
+    def geocoded_routes(self, limit: int = 50_000) -> list[RouteSample]:
+        """
+        Amostras (origem, destino, km, minutos) para calibrar a estimativa local.
+        """
+        return _as_samples(self.session.execute(_geocoded_routes_stmt(limit)))
 
-        return result
+    def delete_expired(self, max_age: timedelta, batch_size: int = 1000) -> int:
+        """
+        Remove rotas expiradas em lotes. Retorna o total removido.
+        """
+        return delete_in_batches(
+            self.session, RouteCache, RouteCache.created_at < func.now() - max_age, batch_size
+        )
 
     def save(
         self,
@@ -45,15 +139,218 @@ class RouteCacheRepository:
         distance_km: float,
         duration_min: float | None,
         source: str,
+        grid_key: str | None = None,
     ) -> RouteCache:
-        route = RouteCache(
+        """
+        Grava (ou atualiza) a rota do par normalizado: INSERT ... ON CONFLICT DO UPDATE.
+        O RETURNING devolve a linha final sem um SELECT extra.
+        """
+        stmt = _upsert_stmt(
+            [
+                {
+                    "origin": origin,
+                    "destination": destination,
+                    "grid_key": grid_key,
+                    "distance_km": distance_km,
+                    "duration_min": duration_min,
+                    "source": source,
+                }
+            ]
+        )
+        route = self.session.execute(stmt).scalar_one()
+        self.session.commit()
+        return route
+
+
+class AsyncRouteCacheRepository:
+    """
+    Versão async (AsyncSession) do RouteCacheRepository, usada no caminho do /quote.
+    Com um writer (write-behind), as escritas vão para a fila e save devolve None.
+    """
+
+    def __init__(self, session: AsyncSession, writer: WriteBehindQueue[dict] | None = None) -> None:
+        self.session = session
+        self.writer = writer
+
+    async def get_recent(
+        self,
+        origin: str,
+        destination: str,
+        max_age: timedelta,
+    ) -> RouteCache | None:
+        with metrics.DB_SECONDS.time(op="route_get"):
+            result = await self.session.execute(_recent_stmt(origin, destination, max_age))
+        return result.scalar_one_or_none()
+
+    async def get_recent_by_grid(self, grid_key: str, max_age: timedelta) -> RouteCache | None:
+        with metrics.DB_SECONDS.time(op="route_get_grid"):
+            result = await self.session.execute(_recent_by_grid_stmt(grid_key, max_age))
+        return result.scalar_one_or_none()
+
+    async def geocoded_routes(self, limit: int = 50_000) -> list[RouteSample]:
+        return _as_samples(await self.session.execute(_geocoded_routes_stmt(limit)))
+
+    async def save(
+        self,
+        origin: str,
+        destination: str,
+        distance_km: float,
+        duration_min: float | None,
+        source: str,
+        grid_key: str | None = None,
+    ) -> RouteCache | None:
+        saved = await self.save_many(
+            [
+                {
+                    "origin": origin,
+                    "destination": destination,
+                    "grid_key": grid_key,
+                    "distance_km": distance_km,
+                    "duration_min": duration_min,
+                    "source": source,
+                }
+            ]
+        )
+        return saved[0] if saved else None
+
+    async def save_many(self, rows: list[dict]) -> list[RouteCache]:
+        """
+        Grava várias rotas com INSERTs multi-linha (upsert), até UPSERT_BATCH_ROWS por INSERT.
+        Com writer ativo, só enfileira e devolve [].
+        """
+        if not rows:
+            return []
+        if self.writer is not None and self.writer.offer(rows):
+            return []
+        saved = []
+        with metrics.DB_SECONDS.time(op="route_save"):
+            # Em blocos: um só INSERT com milhares de linhas passa o limite de parâmetros
+            for batch in batched(rows):
+                result = await self.session.execute(_upsert_stmt(batch))
+                saved.extend(result.scalars())
+            await self.session.commit()
+        return saved
+
+
+@dataclass(frozen=True)
+class CachedRoute:
+    """Cópia imutável de uma linha de route_cache (segura fora da sessão)."""
+
+    distance_km: float
+    duration_min: float | None
+    source: str
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, row: RouteCache) -> CachedRoute:
+        created_at = row.created_at
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return cls(
+            distance_km=row.distance_km,
+            duration_min=row.duration_min,
+            source=row.source,
+            created_at=created_at,
+        )
+
+
+# Marca de cache negativo: rota que falhou recentemente no OSRM
+UNAVAILABLE = object()
+
+
+class CachedRouteCacheRepository:
+    """
+    Camada em memória (LRU + TTL) à frente do AsyncRouteCacheRepository.
+    Leitura: memória -> Postgres (read-through). Escrita: memória + Postgres (write-through,
+    ou write-behind se o repositório tiver writer).
+    """
+
+    def __init__(
+        self,
+        repo: AsyncRouteCacheRepository,
+        memory: TTLCache,
+        *,
+        negative_ttl: float = 0.0,
+    ) -> None:
+        self.repo = repo
+        self.memory = memory
+        self.negative_ttl = negative_ttl
+
+    async def get_recent(
+        self,
+        origin: str,
+        destination: str,
+        max_age: timedelta,
+    ) -> CachedRoute | None:
+        key = route_key(origin, destination)
+        hit = self._memory_hit(key, max_age)
+        if hit is not None:
+            return hit or None
+        return self._remember(key, await self.repo.get_recent(origin, destination, max_age=max_age))
+
+    async def get_recent_by_grid(self, grid_key: str, max_age: timedelta) -> CachedRoute | None:
+        key = ("grid", grid_key)
+        hit = self._memory_hit(key, max_age)
+        if hit is not None:
+            return hit or None
+        return self._remember(key, await self.repo.get_recent_by_grid(grid_key, max_age=max_age))
+
+    def _memory_hit(self, key, max_age: timedelta) -> CachedRoute | bool | None:
+        """
+        CachedRoute se houver entrada válida; False se for cache negativo; None se for miss.
+        """
+        hit = self.memory.get(key)
+        if hit is UNAVAILABLE:
+            return False
+        if hit is not None and datetime.utcnow() - hit.created_at <= max_age:
+            return hit
+        return None
+
+    def _remember(self, key, row: RouteCache | None) -> CachedRoute | None:
+        if row is None:
+            return None
+        route = CachedRoute.from_row(row)
+        self.memory.set(key, route)
+        return route
+
+    async def save(
+        self,
+        origin: str,
+        destination: str,
+        distance_km: float,
+        duration_min: float | None,
+        source: str,
+        grid_key: str | None = None,
+    ) -> CachedRoute:
+        row = await self.repo.save(
             origin=origin,
             destination=destination,
             distance_km=distance_km,
             duration_min=duration_min,
             source=source,
+            grid_key=grid_key,
         )
-        self.session.add(route)
-        self.session.commit()
-        self.session.refresh(route)
+        if row is not None:
+            route = CachedRoute.from_row(row)
+        else:
+            # Escrita adiada (write-behind): a memória fica já com o valor novo
+            route = CachedRoute(
+                distance_km=distance_km,
+                duration_min=duration_min,
+                source=source,
+                created_at=datetime.utcnow(),
+            )
+        self.memory.set(route_key(origin, destination), route)
+        if grid_key:
+            self.memory.set(("grid", grid_key), route)
         return route
+
+    def is_unavailable(self, origin: str, destination: str) -> bool:
+        if not self.negative_ttl:
+            return False
+        return self.memory.peek(route_key(origin, destination)) is UNAVAILABLE
+
+    def mark_unavailable(self, origin: str, destination: str) -> None:
+        # Cache negativo opcional (negative_ttl=0 desliga)
+        if self.negative_ttl:
+            self.memory.set(route_key(origin, destination), UNAVAILABLE, ttl=self.negative_ttl)
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class BatchQuoteRequest(BaseModel):
+    """Pedido de orçamentos em lote: todas as origens x todos os destinos."""
+
+    origins: list[str] = Field(min_length=1)
+    destinations: list[str] = Field(min_length=1)
+    driver: str = ""  # slug do motorista (tarifa); vazio = motorista por omissão
+
+    @field_validator("origins", "destinations")
+    @classmethod
+    def _not_blank(cls, values: list[str]) -> list[str]:
+        cleaned = [v.strip() for v in values]
+        if not all(cleaned):
+            raise ValueError("Endereços vazios não são permitidos")
+        return cleaned
+
+
+class BatchQuote(BaseModel):
+    origin: str
+    destination: str
+    distance_km: float | None
+    duration_min: float | None
+    price: float | None
+    distance_source: str
+
+
+class BatchQuoteResponse(BaseModel):
+    currency: str
+    quotes: list[BatchQuote]
+
+
+class AddressSuggestion(BaseModel):
+    """Endereço já geocodificado (autocomplete do formulário)."""
+
+    label: str
+    lat: float
+    lon: float
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+# Abreviaturas comuns em moradas portuguesas (já sem acentos)
+ABBREVIATIONS: dict[str, str] = {
+    "r": "rua",
+    "av": "avenida",
+    "avda": "avenida",
+    "al": "alameda",
+    "pc": "praca",
+    "pca": "praca",
+    "lg": "largo",
+    "lgo": "largo",
+    "tv": "travessa",
+    "trav": "travessa",
+    "estr": "estrada",
+    "calc": "calcada",
+    "qta": "quinta",
+    "bo": "bairro",
+    "urb": "urbanizacao",
+    "sta": "santa",
+    "sto": "santo",
+    "s": "sao",
+    "dr": "doutor",
+    "eng": "engenheiro",
+    "aerop": "aeroporto",
+}
+
+# Palavras de ligação ignoradas na chave ("Aeroporto de Lisboa" == "Aeroporto Lisboa")
+STOPWORDS = frozenset({"de", "da", "do", "das", "dos", "d"})
+
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_address(text: str) -> str:
+    """
+    Forma canónica de um endereço para chaves de cache.
+    "  Av. da Liberdade, 10 " -> "avenida liberdade 10"
+    """
+    folded = _strip_accents((text or "").casefold())
+    tokens = (ABBREVIATIONS.get(t, t) for t in _NON_WORD.split(folded) if t)
+    return " ".join(t for t in tokens if t not in STOPWORDS)
+
+
+def route_key(origin: str, destination: str) -> str:
+    """Chave canónica do par origem -> destino (a ordem importa)."""
+    return f"{normalize_address(origin)}|{normalize_address(destination)}"
+
+
+def grid_key(
+    origin: tuple[float, float],
+    destination: tuple[float, float],
+    cell_deg: float,
+) -> str:
+    """
+    Chave por célula de grelha: pontos geocodificados na mesma célula
+    (ex.: 0.002° ~ 200 m) partilham a mesma rota em cache.
+    """
+
+    def cell(lat: float, lon: float) -> str:
+        return f"{round(lat / cell_deg)}:{round(lon / cell_deg)}"
+
+    return f"{cell_deg:g}|{cell(*origin)}|{cell(*destination)}"
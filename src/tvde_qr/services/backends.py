@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from typing import Callable, Iterable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def parse_urls(value: str) -> list[str]:
+    """Lista de URLs em texto (Settings): "https://a, https://b/" -> ["https://a", "https://b"]."""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class BackendPool:
+    """
+    Instâncias de um upstream (ex.: vários OSRM self-hosted) servidas em round-robin.
+
+    Uma instância marcada em baixo (falha passiva no pedido ou health check ativo)
+    sai da rotação durante cooldown_s. Se estiverem todas em baixo, usa todas:
+    mais vale tentar do que recusar sem perguntar.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        urls: Iterable[str],
+        *,
+        health_path: str = "",
+        cooldown_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.urls = [url.rstrip("/") for url in urls]
+        if not self.urls:
+            raise ValueError(f"{name}: nenhum URL configurado")
+        self.health_path = health_path
+        self.cooldown_s = cooldown_s
+        self._clock = clock
+        self._down_until: dict[str, float] = {}
+        self._turn = itertools.count()
+
+    def healthy(self) -> list[str]:
+        now = self._clock()
+        return [url for url in self.urls if self._down_until.get(url, 0.0) <= now]
+
+    def pick(self) -> str:
+        candidates = self.healthy() or self.urls
+        return candidates[next(self._turn) % len(candidates)]
+
+    def mark_down(self, url: str) -> None:
+        if url in self.urls:
+            self._down_until[url] = self._clock() + self.cooldown_s
+
+    def mark_up(self, url: str) -> None:
+        self._down_until.pop(url, None)
+
+    async def check(self, client: httpx.AsyncClient, timeout: float = 2.0) -> None:
+        """Health check ativo: GET url + health_path em todas as instâncias, em paralelo."""
+
+        async def probe(url: str) -> None:
+            try:
+                r = await client.get(f"{url}{self.health_path}", timeout=timeout)
+                ok = r.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                self.mark_up(url)
+            else:
+                logger.warning("%s: %s falhou o health check", self.name, url)
+                self.mark_down(url)
+
+        await asyncio.gather(*(probe(url) for url in self.urls))
+
+    def snapshot(self) -> dict:
+        healthy = set(self.healthy())
+        return {url: "up" if url in healthy else "down" for url in self.urls}
+
+
+async def run_health_checks(
+    pools: Iterable[BackendPool],
+    client: httpx.AsyncClient,
+    *,
+    interval_s: float,
+) -> None:
+    """Loop em background (lifespan): health check de todos os pools a cada interval_s."""
+    pools = list(pools)
+    while True:
+        for pool in pools:
+            try:
+                await pool.check(client)
+            except Exception:
+                logger.exception("Health check de %s falhou", pool.name)
+        await asyncio.sleep(interval_s)
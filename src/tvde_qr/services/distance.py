@@ -1,19 +1,132 @@
 from __future__ import annotations
 
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from statistics import median
+from typing import Iterable
+
+EARTH_RADIUS_KM = 6371.0088
+
+Coords = tuple[float, float]
+# (origem, destino, km de estrada, minutos) de uma rota real
+RouteSample = tuple[Coords, Coords, float, float | None]
+
+# Amostras fora destes limites são ruído (geocode errado, rota de ferry, etc.)
+_MIN_STRAIGHT_KM = 0.5
+_FACTOR_RANGE = (1.0, 3.0)
+_SPEED_RANGE_KMH = (5.0, 150.0)
+
+
+def _midpoint(origin: Coords, destination: Coords) -> Coords:
+    return (origin[0] + destination[0]) / 2, (origin[1] + destination[1]) / 2
+
+
+def haversine_km(origin: Coords, destination: Coords) -> float:
+    """Distância em linha reta (grande círculo) entre dois pontos (lat, lon)."""
+    lat1, lon1 = map(math.radians, origin)
+    lat2, lon2 = map(math.radians, destination)
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+@dataclass(frozen=True)
+class RoadFactor:
+    factor: float  # km de estrada / km em linha reta
+    speed_kmh: float
+    samples: int = 0
+
+
+@dataclass(frozen=True)
+class LocalEstimate:
+    distance_km: float
+    duration_min: float
+
 
 class DistanceService:
     """
-    Estimativa simples (mock) sem mapa.
-    Depois você troca por Haversine (lat/lon) ou API (Google/Mapbox).
+    Estimativa local, sem rede: linha reta (haversine) x fator de desvio da estrada.
+    Os fatores (e a velocidade média) são calibrados por região (célula de region_deg graus)
+    a partir das rotas reais já guardadas em route_cache. Sem dados, usa os valores por omissão.
     """
 
-    def estimate_km(self, origin: str, destination: str) -> float:
-        origin = (origin or "").strip()
-        destination = (destination or "").strip()
+    def __init__(
+        self,
+        *,
+        default_factor: float = 1.3,
+        default_speed_kmh: float = 40.0,
+        region_deg: float = 0.5,
+        min_samples: int = 5,
+    ) -> None:
+        self.region_deg = region_deg
+        self.min_samples = min_samples
+        self.default = RoadFactor(default_factor, default_speed_kmh)
+        self.factors: dict[tuple[int, int], RoadFactor] = {}
+
+    def region(self, point: Coords) -> tuple[int, int]:
+        lat, lon = point
+        return round(lat / self.region_deg), round(lon / self.region_deg)
+
+    def factor_for(self, origin: Coords, destination: Coords) -> RoadFactor:
+        # Região do ponto médio: uma viagem entre duas células usa a do meio do caminho
+        return self.factors.get(self.region(_midpoint(origin, destination)), self.default)
+
+    def estimate(self, origin: Coords, destination: Coords) -> LocalEstimate:
+        road = self.factor_for(origin, destination)
+        km = haversine_km(origin, destination) * road.factor
+        return LocalEstimate(
+            distance_km=round(km, 2),
+            duration_min=round(km / road.speed_kmh * 60.0, 1),
+        )
+
+    def estimate_km(self, origin: Coords, destination: Coords) -> float:
+        return self.estimate(origin, destination).distance_km
+
+    def fit(self, routes: Iterable[RouteSample]) -> int:
+        """
+        Recalibra os fatores com (origem, destino, km de estrada, minutos) de rotas reais.
+        Mediana por região com pelo menos min_samples amostras; a mediana global
+        passa a ser o valor por omissão. Retorna o número de amostras usadas.
+        """
+        factors: dict[tuple[int, int], list[float]] = defaultdict(list)
+        speeds: dict[tuple[int, int], list[float]] = defaultdict(list)
+        used = 0
+
+        for origin, destination, road_km, duration_min in routes:
+            straight = haversine_km(origin, destination)
+            if straight < _MIN_STRAIGHT_KM:
+                continue
+            ratio = road_km / straight
+            if not _FACTOR_RANGE[0] <= ratio <= _FACTOR_RANGE[1]:
+                continue
+
+            key = self.region(_midpoint(origin, destination))
+            factors[key].append(ratio)
+            if duration_min:
+                speed = road_km / (duration_min / 60.0)
+                if _SPEED_RANGE_KMH[0] <= speed <= _SPEED_RANGE_KMH[1]:
+                    speeds[key].append(speed)
+            used += 1
 
-        if not origin or not destination:
-            raise ValueError("Origem e destino são obrigatórios")
+        all_factors = [f for values in factors.values() for f in values]
+        all_speeds = [s for values in speeds.values() for s in values]
+        if len(all_factors) >= self.min_samples:
+            self.default = RoadFactor(
+                factor=median(all_factors),
+                speed_kmh=median(all_speeds) if all_speeds else self.default.speed_kmh,
+                samples=len(all_factors),
+            )
 
-        # Mock previsível: evita 0 km e dá algo consistente.
-        base = abs(len(origin) - len(destination)) + 5
-        return round(float(base), 1)
+        self.factors = {
+            key: RoadFactor(
+                factor=median(values),
+                speed_kmh=median(speeds[key]) if speeds[key] else self.default.speed_kmh,
+                samples=len(values),
+            )
+            for key, values in factors.items()
+            if len(values) >= self.min_samples
+        }
+        return used
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Callable, Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tvde_qr.repositories.drivers import AsyncDriverRepository
+from tvde_qr.services.pricing import PricingConfig, PricingService
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DriverProfile:
+    """
+    O que a página e o orçamento precisam de um motorista. Imutável: uma alteração
+    na base de dados dá um perfil novo (e chaves novas nos caches de HTML).
+    """
+
+    slug: str
+    name: str
+    whatsapp_number: str
+    tariff: PricingConfig
+    photo: str | None = None
+
+    @property
+    def first_name(self) -> str:
+        return self.name.split()[0] if self.name.strip() else self.name
+
+    @cached_property
+    def pricing(self) -> PricingService:
+        return PricingService(self.tariff)
+
+    @classmethod
+    def from_row(cls, row) -> DriverProfile:
+        return cls(
+            slug=row.slug,
+            name=row.name,
+            whatsapp_number=row.whatsapp_number,
+            photo=row.photo,
+            tariff=PricingConfig(
+                currency=row.currency,
+                base_fare=row.base_fare,
+                price_per_km=row.price_per_km,
+                minimum_fare=row.minimum_fare,
+                price_per_minute=row.price_per_minute,
+            ),
+        )
+
+
+class DriverRegistry:
+    """
+    Motoristas ativos em memória, por slug: o /m/{slug} e o /quote não fazem query.
+
+    refresh() compara a impressão digital da tabela (linhas, max(updated_at)) com a da
+    última carga e só relê tudo quando muda; corre em background a cada intervalo.
+    O motorista por omissão (Settings) serve / e o seu slug quando não está na tabela.
+    """
+
+    def __init__(
+        self, default: DriverProfile, *, on_replace: Callable[[], None] | None = None
+    ) -> None:
+        self.default = default
+        # Chamado depois de cada carga (ex.: limpar caches de HTML por perfil)
+        self.on_replace = on_replace
+        self._drivers: dict[str, DriverProfile] = {}
+        self._fingerprint: tuple | None = None
+
+    def __len__(self) -> int:
+        return len(self._drivers)
+
+    def get(self, slug: str) -> DriverProfile | None:
+        """Motorista do slug ("" = por omissão); None se não existir ou estiver inativo."""
+        if not slug:
+            return self.default
+        driver = self._drivers.get(slug)
+        if driver is None and slug == self.default.slug:
+            return self.default
+        return driver
+
+    def replace(self, profiles: Iterable[DriverProfile], fingerprint: tuple | None = None) -> None:
+        # Troca o dicionário inteiro: quem está a ler nunca vê uma carga a meio
+        self._drivers = {p.slug: p for p in profiles}
+        self._fingerprint = fingerprint
+        if self.on_replace is not None:
+            self.on_replace()
+
+    def invalidate(self) -> None:
+        """Força a próxima refresh() a reler a tabela."""
+        self._fingerprint = None
+
+    async def refresh(self, session_factory: Callable[[], AsyncSession]) -> bool:
+        """Relê os motoristas se a tabela mudou. Retorna True se recarregou."""
+        async with session_factory() as session:
+            repo = AsyncDriverRepository(session)
+            fingerprint = await repo.fingerprint()
+            if fingerprint == self._fingerprint:
+                return False
+            rows = await repo.active()
+        self.replace((DriverProfile.from_row(row) for row in rows), fingerprint)
+        logger.info("%d motoristas carregados", len(self._drivers))
+        return True
+
+
+async def run_periodic_refresh(
+    registry: DriverRegistry,
+    session_factory: Callable[[], AsyncSession],
+    *,
+    interval_s: float,
+) -> None:
+    """
+    Carrega no arranque e depois verifica a cada interval_s (0 = só no arranque).
+    Falhas ficam no log: continuam a servir os motoristas da carga anterior.
+    """
+    while True:
+        try:
+            await registry.refresh(session_factory)
+        except Exception:
+            logger.exception("Carga dos motoristas falhou")
+        if interval_s <= 0:
+            return
+        await asyncio.sleep(interval_s)
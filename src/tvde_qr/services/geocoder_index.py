@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import csv
+import json
+import mmap
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+from tvde_qr.services.address import normalize_address
+
+# Tudo binário e lido por mmap (nada do índice na heap): index.json só tem metadados.
+# Nomes e trigramas: blobs UTF-8 ordenados por bytes + offsets uint64 (n + 1), para
+# pesquisa binária; postings: ids uint32 de cada trigrama, contíguos, com offsets uint64.
+INDEX_FILE = "index.json"
+COORDS_FILE = "coords.bin"
+NAMES_FILE = "names.bin"
+NAME_OFFSETS_FILE = "names.off"
+TRIGRAMS_FILE = "trigrams.bin"
+TRIGRAM_OFFSETS_FILE = "trigrams.off"
+POSTINGS_FILE = "postings.bin"
+POSTING_OFFSETS_FILE = "postings.off"
+INDEX_VERSION = 2
+
+
+def trigrams(name: str) -> set[str]:
+    """Trigramas de um nome já normalizado (com espaços nas pontas, como no pg_trgm)."""
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def read_extract(
+    path: str | Path,
+    countries: Iterable[str] | None = None,
+) -> Iterator[tuple[str, float, float]]:
+    """
+    Lê um extrato CSV (colunas name, lat, lon e, opcional, country).
+    Com countries, ignora linhas de outros países (ex.: {"pt", "es"}).
+    """
+    wanted = {c.lower() for c in countries} if countries else None
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            if wanted and (row.get("country") or "").lower() not in wanted:
+                continue
+            try:
+                yield row["name"], float(row["lat"]), float(row["lon"])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+
+def _write_blobs(out: Path, data_file: str, offsets_file: str, items: Iterable[bytes]) -> None:
+    offsets = array("Q", [0])
+    with open(out / data_file, "wb") as f:
+        for item in items:
+            f.write(item)
+            offsets.append(offsets[-1] + len(item))
+    with open(out / offsets_file, "wb") as f:
+        offsets.tofile(f)
+
+
+def build_index(rows: Iterable[tuple[str, float, float]], out_dir: str | Path) -> int:
+    """
+    Escreve o índice em out_dir (ver INDEX_FILE e seguintes): nomes normalizados
+    ordenados, trigramas -> ids e lat/lon em float32. Retorna o número de entradas.
+    Nomes repetidos depois de normalizados ficam com a primeira ocorrência.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    points: dict[bytes, tuple[float, float]] = {}
+    for name, lat, lon in rows:
+        key = normalize_address(name)
+        if key:
+            points.setdefault(key.encode("utf-8"), (lat, lon))
+
+    # O id é a posição na ordem dos bytes: a mesma que a pesquisa binária usa
+    names = sorted(points)
+    coords = array("f")
+    postings: dict[bytes, array] = defaultdict(lambda: array("I"))
+    for idx, name in enumerate(names):
+        coords.extend(points[name])
+        for tri in trigrams(name.decode("utf-8")):
+            postings[tri.encode("utf-8")].append(idx)
+    keys = sorted(postings)
+
+    with open(out / COORDS_FILE, "wb") as f:
+        coords.tofile(f)
+    _write_blobs(out, NAMES_FILE, NAME_OFFSETS_FILE, names)
+    _write_blobs(out, TRIGRAMS_FILE, TRIGRAM_OFFSETS_FILE, keys)
+    _write_blobs(out, POSTINGS_FILE, POSTING_OFFSETS_FILE, (postings[k].tobytes() for k in keys))
+    with open(out / INDEX_FILE, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": INDEX_VERSION, "byteorder": sys.byteorder, "count": len(names)}, f
+        )
+    return len(names)
+
+
+class _Blobs(Sequence[bytes]):
+    """Blob + offsets em mmap como uma sequência de bytes (para o bisect)."""
+
+    def __init__(self, data: memoryview, offsets: memoryview) -> None:
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._data[self._offsets[i] : self._offsets[i + 1]].tobytes()
+
+    def find(self, item: bytes) -> int | None:
+        i = bisect_left(self, item)
+        return i if i < len(self) and self[i] == item else None
+
+
+class LocalGeocoder:
+    """
+    Geocoder local (sem rede) sobre um índice criado por build_index.
+    Procura primeiro o nome normalizado exato; senão, o mais parecido por trigramas
+    (coeficiente de Dice >= min_score). Todo o índice fica em mmap, não na heap:
+    arranca sem ler os ficheiros e as páginas são partilhadas entre workers.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        min_score: float = 0.8,
+        max_candidates: int = 50,
+    ) -> None:
+        base = Path(path)
+        with open(base / INDEX_FILE, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION or meta.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Índice de geocoding incompatível: {base}")
+
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self._count: int = meta["count"]
+        self._open: list[tuple] = []
+        self._coords = self._map(base / COORDS_FILE, "f")
+        self._names = _Blobs(self._map(base / NAMES_FILE), self._map(base / NAME_OFFSETS_FILE, "Q"))
+        self._trigrams = _Blobs(
+            self._map(base / TRIGRAMS_FILE), self._map(base / TRIGRAM_OFFSETS_FILE, "Q")
+        )
+        self._postings = self._map(base / POSTINGS_FILE, "I")
+        self._posting_offsets = self._map(base / POSTING_OFFSETS_FILE, "Q")
+
+    def _map(self, path: Path, fmt: str = "B") -> memoryview:
+        f = open(path, "rb")
+        if path.stat().st_size == 0:  # mmap não aceita ficheiros vazios
+            view, mapped = memoryview(b"").cast(fmt), None
+        else:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped).cast(fmt)
+        self._open.append((view, mapped, f))
+        return view
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        for view, mapped, f in self._open:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+            f.close()
+        self._open.clear()
+
+    def _point(self, idx: int) -> tuple[float, float]:
+        # float32 guarda ~7 algarismos: 6 casas decimais (~0.1 m) é o que faz sentido devolver
+        return round(self._coords[2 * idx], 6), round(self._coords[2 * idx + 1], 6)
+
+    def _posting(self, tri: str) -> memoryview:
+        i = self._trigrams.find(tri.encode("utf-8"))
+        if i is None:
+            return self._postings[0:0]
+        return self._postings[self._posting_offsets[i] // 4 : self._posting_offsets[i + 1] // 4]
+
+    def lookup(self, query: str) -> tuple[float, float] | None:
+        key = normalize_address(query)
+        if not key:
+            return None
+
+        idx = self._names.find(key.encode("utf-8"))
+        if idx is not None:
+            return self._point(idx)
+
+        wanted = trigrams(key)
+        overlap: Counter[int] = Counter()
+        for tri in wanted:
+            overlap.update(self._posting(tri))
+
+        best, best_score = None, 0.0
+        for idx, shared in overlap.most_common(self.max_candidates):
+            name = self._names[idx].decode("utf-8")
+            score = 2 * shared / (len(wanted) + len(trigrams(name)))
+            if score > best_score:
+                best, best_score = idx, score
+        if best is None or best_score < self.min_score:
+            return None
+        return self._point(best)
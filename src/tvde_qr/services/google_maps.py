@@ -17,10 +17,22 @@ class GoogleMapsError(RuntimeError):
 
 
 class GoogleMapsClient:
-    def __init__(self, api_key: str, language: str = "pt-BR", region: str = "br") -> None:
+    def __init__(
+        self,
+        api_key: str,
+        language: str = "pt-BR",
+        region: str = "br",
+        *,
+        client: httpx.AsyncClient | None = None,
+        timeout: float = 8.0,
+        connect_timeout: float = 3.0,
+    ) -> None:
         self.api_key = api_key
         self.language = language
         self.region = region
+        # Cliente partilhado (pool/keep-alive); sem ele, abre um cliente por pedido
+        self.client = client
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
 
     async def route_by_addresses(self, origin: str, destination: str) -> GoogleRoute:
         if not self.api_key:
@@ -41,9 +53,12 @@ class GoogleMapsClient:
             "key": self.api_key,
         }
 
-        async with httpx.AsyncClient(timeout=8.0) as c:
-            r = await c.get(url, params=params)
-            data = r.json()
+        if self.client is not None:
+            r = await self.client.get(url, params=params, timeout=self.timeout)
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout) as c:
+                r = await c.get(url, params=params)
+        data = r.json()
 
         status = data.get("status")
         if status != "OK":
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import importlib.util
+
+import httpx
+
+from tvde_qr.settings import Settings
+
+
+def http2_available() -> bool:
+    # HTTP/2 no httpx depende do "h2" (extra httpx[http2], nas dependências do projeto)
+    return importlib.util.find_spec("h2") is not None
+
+
+def build_http_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Cliente HTTP async partilhado (pool de conexões + keep-alive).
+
+    Criado no startup da app e fechado no shutdown; os timeouts por host
+    são passados em cada pedido pelos clientes (OSRM, Nominatim, Google).
+    """
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry_s,
+    )
+    timeout = httpx.Timeout(
+        settings.http_default_timeout_s,
+        connect=settings.http_connect_timeout_s,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=settings.http_http2 and http2_available(),
+    )
@@ -1,9 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
+from datetime import timedelta
 
 import httpx
 
+from tvde_qr import metrics
+from tvde_qr.repositories.geocode_cache import AsyncGeocodeCacheRepository
+from tvde_qr.services.address import normalize_address
+from tvde_qr.services.backends import BackendPool
+from tvde_qr.services.geocoder_index import LocalGeocoder
+from tvde_qr.services.resilience import CircuitBreaker, TokenBucket
+from tvde_qr.services.singleflight import SingleFlight
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
 
 @dataclass(frozen=True)
 class OSRMRoute:
@@ -15,31 +32,146 @@ class OSRMError(RuntimeError):
     pass
 
 
+class OSRMBusy(OSRMError):
+    """Sem vaga no upstream agora (limite de ritmo ou de pedidos simultâneos)."""
+
+
 class OSRMClient:
     """
     Roteamento gratuito usando:
     - Nominatim (OpenStreetMap) para geocoding (endereço -> lat/lon)
     - OSRM público para rota (lat/lon -> distância/tempo)
 
-    Observação: serviços públicos têm rate limit. Para produção, ideal hospedar o próprio.
+    Observação: serviços públicos têm rate limit. Para produção, ideal hospedar o próprio:
+    osrm_backends / nominatim_backends apontam para uma ou várias instâncias (round-robin).
     """
     BASE_OSRM = "https://router.project-osrm.org"
     NOMINATIM = "https://nominatim.openstreetmap.org/search"
 
-    def __init__(self, user_agent: str = "tvde-qr/1.0") -> None:
+    def __init__(
+        self,
+        user_agent: str = "tvde-qr/1.0",
+        *,
+        client: httpx.AsyncClient | None = None,
+        osrm_timeout: float = 10.0,
+        nominatim_timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        nominatim_max_concurrency: int | None = None,
+        geocode_ttl: timedelta = timedelta(days=30),
+        osrm_breaker: CircuitBreaker | None = None,
+        nominatim_breaker: CircuitBreaker | None = None,
+        nominatim_limiter: TokenBucket | None = None,
+        nominatim_max_wait: float | None = None,
+        local_geocoder: LocalGeocoder | None = None,
+        osrm_backends: BackendPool | None = None,
+        nominatim_backends: BackendPool | None = None,
+    ) -> None:
         self.user_agent = user_agent
+        # Cliente partilhado (pool/keep-alive); sem ele, abre um cliente por pedido
+        self.client = client
+        # Timeout por host com o de conexão à parte: um float no pedido substituía os dois
+        self.osrm_timeout = httpx.Timeout(osrm_timeout, connect=connect_timeout)
+        self.nominatim_timeout = httpx.Timeout(nominatim_timeout, connect=connect_timeout)
+        # Limite opcional de pedidos simultâneos ao Nominatim (política de uso)
+        self._nominatim_slots = (
+            asyncio.Semaphore(nominatim_max_concurrency) if nominatim_max_concurrency else None
+        )
+        self.geocode_ttl = geocode_ttl
+        # Opcionais: falha rápida com o upstream em baixo e ritmo do Nominatim (1 req/s)
+        self.osrm_breaker = osrm_breaker
+        self.nominatim_breaker = nominatim_breaker
+        self.nominatim_limiter = nominatim_limiter
+        self.nominatim_max_wait = nominatim_max_wait
+        # Índice local opcional (extrato OSM): consultado antes do Nominatim
+        self.local_geocoder = local_geocoder
+        # Instâncias configuradas (Settings); sem elas, os servidores públicos acima
+        self.osrm_backends = osrm_backends
+        self.nominatim_backends = nominatim_backends
+        # Pedidos iguais em simultâneo (ex.: grupo a ler o mesmo QR) partilham a chamada
+        self.geocode_flight: SingleFlight[tuple[float, float, str]] = SingleFlight()
+        self.route_flight: SingleFlight[OSRMRoute] = SingleFlight()
+
+    def _osrm_base(self) -> str:
+        return self.osrm_backends.pick() if self.osrm_backends else self.BASE_OSRM
 
-    async def _get_json(self, url: str, *, params: dict, headers: dict) -> object:
+    async def _get_json(
+        self,
+        url: str,
+        *,
+        params: dict,
+        headers: dict,
+        timeout: httpx.Timeout,
+        breaker: CircuitBreaker | None = None,
+        limiter: TokenBucket | None = None,
+        backends: BackendPool | None = None,
+        base: str | None = None,
+        upstream: str = "upstream",
+        max_wait: float | None = None,
+    ) -> object:
+        if breaker is not None and not breaker.allow():
+            raise OSRMError(f"{breaker.name} indisponível (circuit breaker aberto)")
+        verdict = "ignored"
         try:
-            async with httpx.AsyncClient(timeout=10.0) as c:
-                r = await c.get(url, params=params, headers=headers)
-                r.raise_for_status()
-                return r.json()
+            if max_wait is None:
+                max_wait = self.nominatim_max_wait
+            if limiter is not None and not await limiter.acquire(max_wait=max_wait):
+                raise OSRMBusy("Limite de pedidos ao upstream atingido")
+            with metrics.UPSTREAM_SECONDS.time(upstream=upstream):
+                if self.client is not None:
+                    r = await self.client.get(url, params=params, headers=headers, timeout=timeout)
+                else:
+                    async with httpx.AsyncClient(timeout=timeout) as c:
+                        r = await c.get(url, params=params, headers=headers)
+            if r.status_code == 429 and limiter is not None:
+                limiter.penalize(_retry_after(r))
+            r.raise_for_status()
+            data = r.json()
+        except httpx.HTTPStatusError as e:
+            # 429 e 5xx são o upstream em apuros; outros 4xx são problema do pedido
+            if e.response.status_code == 429 or e.response.status_code >= 500:
+                verdict = "failure"
+            raise OSRMError(str(e)) from e
         except (httpx.TimeoutException, httpx.HTTPError, ValueError) as e:
             # ValueError cobre JSONDecodeError e outros problemas de parse
+            verdict = "failure"
             raise OSRMError(str(e)) from e
+        else:
+            verdict = "success"
+            if limiter is not None:
+                limiter.reward()
+            return data
+        finally:
+            metrics.UPSTREAM_REQUESTS.inc(upstream=upstream, outcome=verdict)
+            # Health check passivo: falha tira a instância da rotação, sucesso devolve-a
+            if backends is not None and base is not None:
+                if verdict == "failure":
+                    backends.mark_down(base)
+                elif verdict == "success":
+                    backends.mark_up(base)
+            if breaker is None:
+                pass
+            elif verdict == "success":
+                breaker.record_success()
+            elif verdict == "failure":
+                breaker.record_failure()
+            else:
+                # Cancelado, 4xx ou travado pelo limitador: não diz nada sobre o upstream
+                breaker.record_ignored()
+
+    async def _geocode_one(
+        self, query: str, *, background: bool = False, max_wait: float | None = None
+    ) -> tuple[float, float, str]:
+        """
+        (lat, lon, source) de um endereço: índice local primeiro, Nominatim só se falhar.
+        background=True (prefetch) só usa o Nominatim se houver vaga já: nunca espera na
+        fila do limitador nem pelos pedidos simultâneos, que ficam para os orçamentos.
+        max_wait substitui a espera máxima pelo limitador (None = nominatim_max_wait).
+        """
+        if self.local_geocoder is not None:
+            hit = self.local_geocoder.lookup(query)
+            if hit is not None:
+                return hit[0], hit[1], "local"
 
-    async def _geocode_one(self, query: str) -> tuple[float, float]:
         params = {
             "q": query,
             "format": "json",
@@ -49,7 +181,26 @@ class OSRMClient:
         }
         headers = {"User-Agent": self.user_agent}
 
-        data = await self._get_json(self.NOMINATIM, params=params, headers=headers)
+        base = self.nominatim_backends.pick() if self.nominatim_backends else None
+        request = dict(
+            params=params,
+            headers=headers,
+            timeout=self.nominatim_timeout,
+            breaker=self.nominatim_breaker,
+            limiter=self.nominatim_limiter,
+            backends=self.nominatim_backends,
+            base=base,
+            upstream="nominatim",
+            max_wait=0.0 if background else max_wait,
+        )
+        url = f"{base}/search" if base else self.NOMINATIM
+        if background and self._nominatim_slots is not None and self._nominatim_slots.locked():
+            raise OSRMBusy("Nominatim ocupado com orçamentos")
+        if self._nominatim_slots is None:
+            data = await self._get_json(url, **request)
+        else:
+            async with self._nominatim_slots:
+                data = await self._get_json(url, **request)
 
         if not isinstance(data, list) or not data:
             raise OSRMError(f"Endereço não encontrado: {query}")
@@ -60,22 +211,167 @@ class OSRMClient:
         except (KeyError, TypeError, ValueError) as e:
             raise OSRMError("Resposta inválida do Nominatim") from e
 
-        return lat, lon
+        return lat, lon, "nominatim"
+
+    async def geocode_many(
+        self,
+        queries: list[str],
+        *,
+        geocode_cache: AsyncGeocodeCacheRepository | None = None,
+        background: bool = False,
+    ) -> list[tuple[float, float]]:
+        """
+        Geocodifica vários endereços: uma leitura do cache para todos, depois
+        índice local / Nominatim em paralelo só para os que faltam (um pedido por endereço
+        normalizado, partilhado com outros pedidos em curso para o mesmo endereço).
+        Se um falhar, os outros são cancelados (TaskGroup) e o erro original sobe.
+        background=True: prioridade baixa (ver _geocode_one), fora do pedido partilhado,
+        para um orçamento nunca herdar a recusa (OSRMBusy) de um prefetch.
+        """
+        found = await self._geocode_all(queries, geocode_cache, background=background)
+        return [found[normalize_address(q)] for q in queries]
+
+    async def geocode_batch(
+        self,
+        queries: list[str],
+        *,
+        geocode_cache: AsyncGeocodeCacheRepository | None = None,
+        max_wait: float | None = None,
+    ) -> list[tuple[float, float] | None]:
+        """
+        geocode_many para lotes (/quotes/batch): cada endereço em falta ocupa uma vaga do
+        limitador, por isso a espera cresce com o número deles (até max_wait). Um endereço
+        que falhe (não encontrado, sem vaga a tempo) fica a None sem cancelar os outros.
+        """
+        found = await self._geocode_all(queries, geocode_cache, partial=True, max_wait=max_wait)
+        return [found.get(normalize_address(q)) for q in queries]
+
+    def _batch_wait(self, missing: int, max_wait: float | None) -> float | None:
+        if self.nominatim_limiter is None:
+            return max_wait
+        # O último da fila só tem vaga daqui a missing / rate segundos
+        wait = (self.nominatim_max_wait or 0.0) + missing / self.nominatim_limiter.rate
+        return wait if max_wait is None else min(wait, max_wait)
+
+    async def _geocode_all(
+        self,
+        queries: list[str],
+        geocode_cache: AsyncGeocodeCacheRepository | None,
+        *,
+        background: bool = False,
+        partial: bool = False,
+        max_wait: float | None = None,
+    ) -> dict[str, tuple[float, float]]:
+        """Coordenadas por endereço normalizado (ver geocode_many e geocode_batch)."""
+        found: dict[str, tuple[float, float]] = {}
+        if geocode_cache is not None:
+            rows = await geocode_cache.get_many(queries, max_age=self.geocode_ttl)
+            found = {key: (row.lat, row.lon) for key, row in rows.items()}
+
+        missing: dict[str, str] = {}
+        for query in queries:
+            key = normalize_address(query)
+            if key not in found:
+                missing.setdefault(key, query.strip())
+        if not missing:
+            return found
+
+        fetched: dict[str, tuple[float, float, str]] = {}
+        if partial:
+            # Fora do pedido partilhado: um /quote não deve herdar a espera longa do lote
+            wait = self._batch_wait(len(missing), max_wait)
+            results = await asyncio.gather(
+                *(self._geocode_one(q, max_wait=wait) for q in missing.values()),
+                return_exceptions=True,
+            )
+            for key, result in zip(missing, results):
+                if isinstance(result, OSRMError):
+                    continue
+                if isinstance(result, BaseException):
+                    raise result
+                fetched[key] = result
+        else:
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    tasks = {
+                        key: tg.create_task(
+                            self._geocode_one(q, background=True)
+                            if background
+                            else self.geocode_flight.do(key, lambda q=q: self._geocode_one(q))
+                        )
+                        for key, q in missing.items()
+                    }
+            except ExceptionGroup as eg:
+                errors = [e for e in eg.exceptions if isinstance(e, OSRMError)]
+                raise (errors or list(eg.exceptions))[0] from None
+            fetched = {key: task.result() for key, task in tasks.items()}
 
-    async def route_by_addresses(self, origin: str, destination: str) -> OSRMRoute:
+        found.update({key: (lat, lon) for key, (lat, lon, _) in fetched.items()})
+        if geocode_cache is not None:
+            # Só o que veio da rede: o índice local já é mais rápido do que o cache
+            rows = [
+                (missing[key], lat, lon, source)
+                for key, (lat, lon, source) in fetched.items()
+                if source != "local"
+            ]
+            if rows:
+                await geocode_cache.save_many(rows)
+        return found
+
+    async def geocode_pair(
+        self,
+        origin: str,
+        destination: str,
+        *,
+        geocode_cache: AsyncGeocodeCacheRepository | None = None,
+    ) -> tuple[tuple[float, float], tuple[float, float]]:
+        """
+        Geocodifica origem e destino em paralelo (ver geocode_many).
+        """
         origin = origin.strip()
         destination = destination.strip()
         if not origin or not destination:
             raise OSRMError("Origem e destino obrigatórios")
 
-        o_lat, o_lon = await self._geocode_one(origin)
-        d_lat, d_lon = await self._geocode_one(destination)
+        o_coords, d_coords = await self.geocode_many(
+            [origin, destination], geocode_cache=geocode_cache
+        )
+        return o_coords, d_coords
+
+    async def route_by_coords(
+        self,
+        origin: tuple[float, float],
+        destination: tuple[float, float],
+    ) -> OSRMRoute:
+        """
+        Rota entre coordenadas. Chamadas simultâneas para o mesmo par partilham o pedido.
+        """
+        return await self.route_flight.do(
+            (origin, destination), lambda: self._route_one(origin, destination)
+        )
 
-        url = f"{self.BASE_OSRM}/route/v1/driving/{o_lon},{o_lat};{d_lon},{d_lat}"
+    async def _route_one(
+        self,
+        origin: tuple[float, float],
+        destination: tuple[float, float],
+    ) -> OSRMRoute:
+        (o_lat, o_lon), (d_lat, d_lon) = origin, destination
+
+        base = self._osrm_base()
+        url = f"{base}/route/v1/driving/{o_lon},{o_lat};{d_lon},{d_lat}"
         params = {"overview": "false"}
         headers = {"User-Agent": self.user_agent}
 
-        data = await self._get_json(url, params=params, headers=headers)
+        data = await self._get_json(
+            url,
+            params=params,
+            headers=headers,
+            timeout=self.osrm_timeout,
+            breaker=self.osrm_breaker,
+            backends=self.osrm_backends,
+            base=base,
+            upstream="osrm",
+        )
 
         if not isinstance(data, dict) or data.get("code") != "Ok":
             raise OSRMError("Falha ao calcular rota (OSRM)")
@@ -93,4 +389,76 @@ class OSRMClient:
         return OSRMRoute(
             distance_km=round(distance_m / 1000.0, 2),
             duration_min=round(duration_s / 60.0, 1),
-        )
\ No newline at end of file
+        )
+
+    async def table(
+        self,
+        sources: list[tuple[float, float]],
+        destinations: list[tuple[float, float]],
+    ) -> list[list[OSRMRoute | None]]:
+        """
+        Matriz origens x destinos num só pedido (serviço /table do OSRM).
+        Células sem rota vêm a None.
+        """
+        if not sources or not destinations:
+            raise OSRMError("Origens e destinos obrigatórios")
+
+        coords = [*sources, *destinations]
+        path = ";".join(f"{lon},{lat}" for lat, lon in coords)
+        base = self._osrm_base()
+        url = f"{base}/table/v1/driving/{path}"
+        params = {
+            "sources": ";".join(str(i) for i in range(len(sources))),
+            "destinations": ";".join(str(len(sources) + j) for j in range(len(destinations))),
+            "annotations": "distance,duration",
+        }
+        headers = {"User-Agent": self.user_agent}
+
+        data = await self._get_json(
+            url,
+            params=params,
+            headers=headers,
+            timeout=self.osrm_timeout,
+            breaker=self.osrm_breaker,
+            backends=self.osrm_backends,
+            base=base,
+            upstream="osrm",
+        )
+
+        if not isinstance(data, dict) or data.get("code") != "Ok":
+            raise OSRMError("Falha ao calcular matriz (OSRM)")
+
+        try:
+            distances = data["distances"]
+            durations = data["durations"]
+            return [
+                [
+                    None
+                    if distance is None or duration is None
+                    else OSRMRoute(
+                        distance_km=round(float(distance) / 1000.0, 2),
+                        duration_min=round(float(duration) / 60.0, 1),
+                    )
+                    for distance, duration in zip(distances[i], durations[i], strict=True)
+                ]
+                for i in range(len(sources))
+            ]
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise OSRMError("Resposta inválida do OSRM (table)") from e
+
+    async def route_by_addresses(
+        self,
+        origin: str,
+        destination: str,
+        *,
+        geocode_cache: AsyncGeocodeCacheRepository | None = None,
+    ) -> OSRMRoute:
+        """
+        Geocoding + rota. As duas etapas passam pelo single-flight, por isso pedidos
+        idênticos em simultâneo fazem um só pedido ao Nominatim e ao OSRM; o cache
+        de geocoding continua a ser lido/gravado na sessão de cada chamador.
+        """
+        o_coords, d_coords = await self.geocode_pair(
+            origin, destination, geocode_cache=geocode_cache
+        )
+        return await self.route_by_coords(o_coords, d_coords)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
 
 
 @dataclass(frozen=True)
@@ -9,18 +12,76 @@ class PricingConfig:
     base_fare: float = 3.00
     price_per_km: float = 0.90
     minimum_fare: float = 6.00
+    price_per_minute: float = 0.00
 
 
 class PricingService:
+    """
+    Tarifa: (base + km * preço/km + min * preço/min) * multiplicador,
+    com mínimo aplicado depois do multiplicador, mais sobretaxa fixa.
+    """
+
     def __init__(self, config: PricingConfig) -> None:
         self.config = config
 
-    def calculate_price(self, distance_km: float) -> float:
+    def calculate_price(
+        self,
+        distance_km: float,
+        duration_min: float | None = None,
+        *,
+        multiplier: float = 1.0,
+        surcharge: float = 0.0,
+    ) -> float:
         if distance_km < 0:
             raise ValueError("Distância inválida")
+        if duration_min is not None and duration_min < 0:
+            raise ValueError("Duração inválida")
 
         price = self.config.base_fare + (distance_km * self.config.price_per_km)
+        if duration_min:
+            price += duration_min * self.config.price_per_minute
+        price *= multiplier
         if price < self.config.minimum_fare:
             price = self.config.minimum_fare
+        price += surcharge
 
         return round(price, 2)
+
+    def calculate_prices(
+        self,
+        distances_km: Sequence[float],
+        durations_min: Sequence[float | None] | None = None,
+        *,
+        multipliers: Sequence[float] | float = 1.0,
+        surcharges: Sequence[float] | float = 0.0,
+    ) -> list[float]:
+        """
+        Preço de muitas viagens de uma vez (matrizes, repricing do histórico).
+        Uma só passagem vetorizada (numpy) que dá exatamente os mesmos valores que
+        calculate_price. Duração None conta como 0.
+        """
+        n = len(distances_km)
+        for values in (durations_min, multipliers, surcharges):
+            # Escalares valem para todas as viagens; listas têm de ter uma por viagem
+            if values is not None and not isinstance(values, (int, float)) and len(values) != n:
+                raise ValueError("Listas com tamanhos diferentes")
+
+        km = np.asarray(distances_km, dtype=np.float64)
+        if np.any(km < 0):
+            raise ValueError("Distância inválida")
+
+        price = self.config.base_fare + km * self.config.price_per_km
+        if durations_min is not None:
+            # None -> NaN -> 0 (o dtype float converte None em NaN)
+            minutes = np.nan_to_num(np.asarray(durations_min, dtype=np.float64), nan=0.0)
+            if np.any(minutes < 0):
+                raise ValueError("Duração inválida")
+            price = price + minutes * self.config.price_per_minute
+        price = price * np.asarray(multipliers, dtype=np.float64)
+        price = np.maximum(price, self.config.minimum_fare)
+        price = price + np.asarray(surcharges, dtype=np.float64)
+
+        # As contas acima são as mesmas operações float64 do calculate_price; o
+        # arredondamento fica com o round do Python (np.round/np.rint diferem em ~3%
+        # dos valores com 2 casas, ex.: 3.95 vs 3.94 para 1.05 km)
+        return [round(p, 2) for p in price.tolist()]
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por upstream (closed -> open -> half_open -> closed).
+
+    closed: conta o resultado das últimas `window` chamadas; com pelo menos `min_calls`
+    e taxa de erro >= failure_rate, abre. open: recusa tudo durante open_s (falha rápida,
+    o chamador segue para o cache/fallback). half_open: deixa passar uma chamada de teste;
+    sucesso fecha, falha volta a abrir.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+        open_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_s = open_s
+        self.opened = 0
+        self._clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._results: deque[bool] = deque(maxlen=window)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_s:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        self._results.append(True)
+
+    def record_failure(self) -> None:
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._results.append(False)
+        calls = len(self._results)
+        if calls >= self.min_calls and self._results.count(False) / calls >= self.failure_rate:
+            self._open()
+
+    def record_ignored(self) -> None:
+        """Chamada sem veredito (ex.: cancelada): liberta a vaga de teste do half_open."""
+        self._probing = False
+
+    def snapshot(self) -> dict:
+        results = list(self._results)
+        return {
+            "state": self.state,
+            "opened": self.opened,
+            "calls": len(results),
+            "failures": results.count(False),
+        }
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probing = False
+        self._results.clear()
+        self.opened += 1
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self._probing = False
+        self._results.clear()
+
+
+class TokenBucket:
+    """
+    Limite de ritmo (token bucket, implementado como GCRA) com ritmo adaptativo.
+
+    acquire() reserva a próxima vaga e espera por ela; se a espera passar de max_wait,
+    desiste logo (False) em vez de prender o pedido. penalize() (ex.: HTTP 429) corta o
+    ritmo para metade e respeita o Retry-After; reward() recupera aos poucos até `rate`.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        *,
+        min_rate: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate tem de ser positivo")
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 8
+        self.burst = burst
+        self.throttled = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._tat = 0.0  # "theoretical arrival time" da próxima vaga
+
+    async def acquire(self, max_wait: float | None = None) -> bool:
+        interval = 1.0 / self.rate
+        now = self._clock()
+        tat = max(self._tat, now)
+        wait = tat - (self.burst - 1) * interval - now
+        if max_wait is not None and wait > max_wait:
+            self.throttled += 1
+            return False
+        self._tat = tat + interval
+        if wait > 0:
+            await self._sleep(wait)
+        return True
+
+    def penalize(self, retry_after: float | None = None) -> None:
+        self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after:
+            self._tat = max(self._tat, self._clock() + retry_after)
+
+    def reward(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def snapshot(self) -> dict:
+        return {"rate_per_s": round(self.rate, 3), "burst": self.burst, "throttled": self.throttled}
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tvde_qr.repositories.geocode_cache import AsyncGeocodeCacheRepository
+from tvde_qr.repositories.route_cache import CachedRouteCacheRepository
+from tvde_qr.services.address import grid_key, normalize_address
+from tvde_qr.services.distance import Coords, DistanceService, LocalEstimate
+from tvde_qr.services.google_maps import GoogleMapsClient
+from tvde_qr.services.osrm import OSRMClient
+
+logger = logging.getLogger(__name__)
+
+
+class RoutingError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class RouteAnswer:
+    distance_km: float
+    duration_min: float | None
+    source: str  # "osrm", "google", "cache:<source>" (grelha) ou "local_estimate"
+    grid_key: str | None = None
+    coords: tuple[Coords, Coords] | None = None  # só quando o OSRM geocodificou
+
+
+@dataclass
+class RoutingStats:
+    hedges: int = 0
+    budget_exhausted: int = 0
+    wins: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class LatencyTracker:
+    """
+    Janela das últimas latências (s) do provedor principal, para o atraso do hedge.
+
+    Pedidos cancelados (orçamento esgotado, outro provedor ganhou) ou falhados entram
+    como amostras censuradas: só se sabe que a latência foi >= o tempo decorrido.
+    Sem elas, os pedidos mais lentos nunca contavam e o percentil saía otimista.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: deque[tuple[float, bool]] = deque(maxlen=window)
+
+    def observe(self, seconds: float, *, censored: bool = False) -> None:
+        self._samples.append((seconds, censored))
+
+    def percentile(self, p: float) -> float | None:
+        if len(self._samples) < self.min_samples:
+            return None
+        # Kaplan-Meier: a censurada em t sai do risco depois de t sem contar como resposta.
+        # Empates: respostas antes das censuradas (False < True)
+        ordered = sorted(self._samples)
+        at_risk = len(ordered)
+        survival = 1.0
+        for seconds, censored in ordered:
+            if not censored:
+                survival *= 1 - 1 / at_risk
+                if 1 - survival > p + 1e-9:
+                    return seconds
+            at_risk -= 1
+        # Percentil para lá da última resposta: pelo menos a maior amostra
+        return ordered[-1][0]
+
+
+class RoutingService:
+    """
+    Orquestra OSRM -> Google -> estimativa local dentro de um orçamento de latência.
+
+    O OSRM arranca logo; se não responder até ao percentil p (ex.: p95) das suas
+    latências recentes, lança-se o Google em paralelo (hedge). A primeira resposta boa
+    ganha e as outras são canceladas. Se todos falharem ou o orçamento acabar,
+    responde a estimativa local (coordenadas já geocodificadas ou do geocode_cache).
+    """
+
+    def __init__(
+        self,
+        osrm: OSRMClient,
+        *,
+        google: GoogleMapsClient | None = None,
+        estimator: DistanceService | None = None,
+        budget_s: float = 4.0,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay_s: float = 0.3,
+        hedge_default_delay_s: float = 1.5,
+        route_cache_ttl: timedelta = timedelta(hours=24),
+        session_factory: Callable[[], AsyncSession] | None = None,
+    ) -> None:
+        self.osrm = osrm
+        self.google = google
+        self.estimator = estimator
+        self.budget_s = budget_s
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.hedge_default_delay_s = hedge_default_delay_s
+        self.route_cache_ttl = route_cache_ttl
+        # Sessão própria para a estimativa depois de cancelar provedores (ver route())
+        self.session_factory = session_factory
+        self.latency = LatencyTracker()
+        self.stats = RoutingStats()
+
+    def hedge_delay(self) -> float:
+        observed = self.latency.percentile(self.hedge_percentile)
+        if observed is None:
+            return self.hedge_default_delay_s
+        return min(max(observed, self.hedge_min_delay_s), self.budget_s)
+
+    async def route(
+        self,
+        origin: str,
+        destination: str,
+        *,
+        geocode_cache: AsyncGeocodeCacheRepository | None = None,
+        route_cache: CachedRouteCacheRepository | None = None,
+        grid_cell_deg: float = 0.0,
+    ) -> RouteAnswer:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget_s
+        # Coordenadas que o OSRM chegar a obter (servem à estimativa local)
+        coords: dict[str, tuple[Coords, Coords]] = {}
+
+        hedges: list[Callable[[], Awaitable[RouteAnswer]]] = []
+        if self.google is not None and self.google.api_key:
+            hedges.append(lambda: self._google(origin, destination))
+
+        tasks = {
+            asyncio.create_task(
+                self._osrm(origin, destination, coords, geocode_cache, route_cache, grid_cell_deg)
+            )
+        }
+        next_hedge_at = loop.time() + self.hedge_delay()
+        try:
+            while True:
+                if not tasks:
+                    # Todos falharam: o próximo provedor entra já
+                    if not hedges:
+                        break
+                    tasks.add(asyncio.create_task(hedges.pop(0)()))
+                    self.stats.hedges += 1
+                    next_hedge_at = loop.time() + self.hedge_delay()
+
+                wake = min(deadline, next_hedge_at) if hedges else deadline
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=max(wake - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return self._won(task.result())
+                    logger.info("Provedor de rotas falhou: %r", task.exception())
+
+                now = loop.time()
+                if now >= deadline:
+                    self.stats.budget_exhausted += 1
+                    break
+                if hedges and now >= next_hedge_at:
+                    tasks.add(asyncio.create_task(hedges.pop(0)()))
+                    self.stats.hedges += 1
+                    next_hedge_at = now + self.hedge_delay()
+        finally:
+            # Perdedores (ou atrasados) são cancelados e esperados antes de voltar
+            cancelled = bool(tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        estimate = await self._fallback_estimate(
+            origin, destination, coords.get("pair"), geocode_cache, cancelled=cancelled
+        )
+        if estimate is None:
+            raise RoutingError("Sem rota nem coordenadas para estimar")
+        return self._won(RouteAnswer(estimate.distance_km, estimate.duration_min, "local_estimate"))
+
+    async def local_estimate(
+        self,
+        origin: str,
+        destination: str,
+        *,
+        coords: tuple[Coords, Coords] | None = None,
+        geocode_cache: AsyncGeocodeCacheRepository | None = None,
+    ) -> LocalEstimate | None:
+        """
+        Estimativa sem rede: usa as coordenadas dadas ou as do geocode_cache.
+        None se não houver estimador ou algum endereço nunca foi geocodificado.
+        """
+        if self.estimator is None:
+            return None
+        if coords is None:
+            if geocode_cache is None:
+                return None
+            rows = await geocode_cache.get_many([origin, destination], max_age=self.osrm.geocode_ttl)
+            o_row = rows.get(normalize_address(origin))
+            d_row = rows.get(normalize_address(destination))
+            if o_row is None or d_row is None:
+                return None
+            coords = ((o_row.lat, o_row.lon), (d_row.lat, d_row.lon))
+        return self.estimator.estimate(*coords)
+
+    async def _fallback_estimate(
+        self,
+        origin: str,
+        destination: str,
+        pair: tuple[Coords, Coords] | None,
+        geocode_cache: AsyncGeocodeCacheRepository | None,
+        *,
+        cancelled: bool,
+    ) -> LocalEstimate | None:
+        """
+        Estimativa depois do orçamento. Uma tarefa cancelada pode ter deixado a sessão
+        partilhada a meio de uma query: aí o geocode_cache é lido numa sessão nova.
+        """
+        if pair is not None or not cancelled:
+            return await self.local_estimate(
+                origin, destination, coords=pair, geocode_cache=geocode_cache
+            )
+        if self.session_factory is None:
+            return None
+        async with self.session_factory() as session:
+            return await self.local_estimate(
+                origin, destination, geocode_cache=AsyncGeocodeCacheRepository(session)
+            )
+
+    def _won(self, answer: RouteAnswer) -> RouteAnswer:
+        source = answer.source.split(":", 1)[0]
+        self.stats.wins[source] = self.stats.wins.get(source, 0) + 1
+        return answer
+
+    async def _osrm(
+        self,
+        origin: str,
+        destination: str,
+        coords: dict[str, tuple[Coords, Coords]],
+        geocode_cache: AsyncGeocodeCacheRepository | None,
+        route_cache: CachedRouteCacheRepository | None,
+        grid_cell_deg: float,
+    ) -> RouteAnswer:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            answer = await self._osrm_answer(
+                origin, destination, coords, geocode_cache, route_cache, grid_cell_deg
+            )
+        except (asyncio.CancelledError, Exception):
+            # Cancelado (orçamento esgotado, outro provedor ganhou) ou falhado: não houve
+            # resposta, só se sabe que a latência foi pelo menos esta
+            self.latency.observe(loop.time() - started, censored=True)
+            raise
+        if answer.source == "osrm":
+            self.latency.observe(loop.time() - started)
+        return answer
+
+    async def _osrm_answer(
+        self,
+        origin: str,
+        destination: str,
+        coords: dict[str, tuple[Coords, Coords]],
+        geocode_cache: AsyncGeocodeCacheRepository | None,
+        route_cache: CachedRouteCacheRepository | None,
+        grid_cell_deg: float,
+    ) -> RouteAnswer:
+        o_coords, d_coords = await self.osrm.geocode_pair(
+            origin, destination, geocode_cache=geocode_cache
+        )
+        coords["pair"] = (o_coords, d_coords)
+
+        # Opcional: rotas entre as mesmas células de grelha partilham o cache
+        cell = None
+        if route_cache is not None and grid_cell_deg > 0:
+            cell = grid_key(o_coords, d_coords, grid_cell_deg)
+            snapped = await route_cache.get_recent_by_grid(cell, max_age=self.route_cache_ttl)
+            if snapped:
+                return RouteAnswer(
+                    snapped.distance_km,
+                    snapped.duration_min,
+                    f"cache:{snapped.source}",
+                    cell,
+                    coords["pair"],
+                )
+
+        route = await self.osrm.route_by_coords(o_coords, d_coords)
+        return RouteAnswer(route.distance_km, route.duration_min, "osrm", cell, coords["pair"])
+
+    async def _google(self, origin: str, destination: str) -> RouteAnswer:
+        route = await self.google.route_by_addresses(origin, destination)
+        return RouteAnswer(route.distance_km, route.duration_min, "google")
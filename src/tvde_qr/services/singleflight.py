@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+V = TypeVar("V")
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    coalesced: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+@dataclass
+class _Call(Generic[V]):
+    task: asyncio.Task[V]
+    waiters: int = field(default=0)
+
+
+class SingleFlight(Generic[V]):
+    """
+    Junta chamadas concorrentes com a mesma chave numa só chamada ao upstream.
+
+    O primeiro chamador cria a tarefa; os seguintes esperam por ela e recebem o
+    mesmo resultado (ou a mesma exceção). A chave é esquecida quando a tarefa termina,
+    por isso não há cache de resultados: só partilha do que está "em voo".
+    Se todos os chamadores desistirem (cancelamento), a tarefa é cancelada.
+    """
+
+    def __init__(self) -> None:
+        self.stats = SingleFlightStats()
+        self._calls: dict[Hashable, _Call[V]] = {}
+
+    @property
+    def inflight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> V:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.stats.calls += 1
+        else:
+            self.stats.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # shield: cancelar um chamador não cancela a chamada dos outros
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call[V]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
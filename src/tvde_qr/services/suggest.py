@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+import math
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from tvde_qr.jobs.hubs import Hub
+from tvde_qr.repositories.geocode_cache import AsyncGeocodeCacheRepository
+from tvde_qr.services.address import normalize_address
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    label: str  # texto como foi geocodificado (o que o cliente vê)
+    lat: float
+    lon: float
+
+
+class PrefixIndex:
+    """
+    Índice em memória de endereços públicos (hubs) e de orçamentos concluídos, por prefixo
+    da chave normalizada ("aeroporto lis" -> "aeroporto lisboa"). Lista ordenada + bisect:
+    procura em O(log n + resultados). Cada entrada expira (ttl) e, cheio (maxsize), sai a
+    usada há mais tempo (LRU). O que o cliente só escreveu nunca entra aqui.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 20_000,
+        ttl: float = math.inf,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._keys: list[str] = []
+        # chave -> (expira em, sugestão); a ordem é a LRU (mais antiga primeiro)
+        self._entries: OrderedDict[str, tuple[float, Suggestion]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, label: str, lat: float, lon: float, ttl: float | None = None) -> None:
+        """ttl em segundos (None = o do índice; math.inf = não expira, ex.: hubs)."""
+        key = normalize_address(label)
+        if not key:
+            return
+        if key not in self._entries:
+            if len(self._keys) >= self.maxsize:
+                self._remove(next(iter(self._entries)))
+            insort(self._keys, key)
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, Suggestion(label.strip(), lat, lon))
+        self._entries.move_to_end(key)
+
+    def search(self, prefix: str, limit: int = 5) -> list[Suggestion]:
+        key = normalize_address(prefix)
+        if not key:
+            return []
+        now = self._clock()
+        found, expired = [], []
+        for i in range(bisect_left(self._keys, key), len(self._keys)):
+            if len(found) >= limit or not self._keys[i].startswith(key):
+                break
+            expires_at, suggestion = self._entries[self._keys[i]]
+            if expires_at <= now:
+                expired.append(self._keys[i])
+                continue
+            self._entries.move_to_end(self._keys[i])
+            found.append(suggestion)
+        for stale in expired:
+            self._remove(stale)
+        return found
+
+    def _remove(self, key: str) -> None:
+        del self._entries[key]
+        del self._keys[bisect_left(self._keys, key)]
+
+
+async def load_suggestions(
+    session_factory: Callable[[], AsyncSession],
+    index: PrefixIndex,
+    *,
+    max_age: timedelta,
+    hubs: Iterable[Hub] = (),
+) -> int:
+    """
+    Carrega no índice os hubs (sem expiração) e os endereços de orçamentos concluídos
+    nos últimos max_age (até maxsize), cada um a expirar max_age depois do orçamento.
+    Falhas ficam no log: o /geocode/suggest continua a ir ao Postgres.
+    """
+    for hub in hubs:
+        index.add(hub.name, hub.lat, hub.lon, ttl=math.inf)
+    try:
+        async with session_factory() as session:
+            rows = await AsyncGeocodeCacheRepository(session).quoted(
+                limit=index.maxsize, max_age=max_age
+            )
+    except Exception:
+        logger.exception("Carregamento das sugestões falhou")
+        return 0
+    now = datetime.now(timezone.utc)
+    # Do mais antigo para o mais recente: o mais recente fica o último a sair (LRU)
+    for row, quoted_at in reversed(rows):
+        remaining = (quoted_at + max_age - now).total_seconds()
+        if remaining > 0:
+            index.add(row.query, row.lat, row.lon, ttl=remaining)
+    logger.info("Sugestões: %d endereços carregados", len(index))
+    return len(rows)
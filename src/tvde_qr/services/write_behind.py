@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_STOP = object()
+
+
+@dataclass
+class WriteBehindStats:
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    rejected: int = 0  # oferecidas com a fila parada ou a parar (o chamador grava-as)
+    failed: int = 0
+    batches: int = 0
+    high_watermark: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class WriteBehindQueue(Generic[T]):
+    """
+    Fila em memória (limitada) para escritas de cache fora do caminho do pedido.
+
+    Uma tarefa em background junta o que estiver na fila (até batch_size) e grava
+    num único INSERT multi-linha. Com a fila cheia a escrita é descartada e contada
+    em stats.dropped: é só cache, o cliente nunca espera por ela.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        session_factory: Callable[[], AsyncSession],
+        flush: Callable[[AsyncSession, list[T]], Awaitable[object]],
+        *,
+        maxsize: int = 1000,
+        batch_size: int = 100,
+    ) -> None:
+        self.name = name
+        self.session_factory = session_factory
+        self.flush = flush
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.stats = WriteBehindStats()
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        # A fila nasce aqui (e não no __init__) para ficar no event loop da app
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name=f"write-behind:{self.name}")
+
+    async def stop(self) -> None:
+        """
+        Espera que a fila seja toda gravada e termina a tarefa.
+        """
+        if not self.running:
+            return
+        # O que entrasse na fila depois do _STOP nunca seria gravado: offer() recusa
+        self._stopping = True
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def offer(self, items: list[T]) -> bool:
+        """
+        Enfileira sem bloquear. Retorna False se a fila não está a correr ou já está a
+        parar (o chamador deve gravar diretamente).
+        """
+        if not self.running or self._stopping:
+            self.stats.rejected += len(items)
+            if self._stopping:
+                logger.info(
+                    "Write-behind %s a parar: %d linhas gravadas pelo chamador",
+                    self.name,
+                    len(items),
+                )
+            return False
+        for item in items:
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.stats.dropped += 1
+                continue
+            self.stats.enqueued += 1
+        self.stats.high_watermark = max(self.stats.high_watermark, self._queue.qsize())
+        return True
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[T] = []
+            item = await self._queue.get()
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size or self._queue.empty():
+                    break
+                item = self._queue.get_nowait()
+
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: list[T]) -> None:
+        try:
+            async with self.session_factory() as session:
+                await self.flush(session, batch)
+        except Exception:
+            self.stats.failed += len(batch)
+            logger.exception("Write-behind %s: falha ao gravar %d linhas", self.name, len(batch))
+            return
+        self.stats.written += len(batch)
+        self.stats.batches += 1
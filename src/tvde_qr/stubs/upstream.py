@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import random
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from tvde_qr.services.address import normalize_address
+from tvde_qr.services.distance import Coords, haversine_km
+
+# Geocodes sintéticos caem dentro de Portugal continental
+_LAT_RANGE = (37.0, 42.0)
+_LON_RANGE = (-9.5, -6.5)
+_ROAD_FACTOR = 1.3
+_SPEED_KMH = 40.0
+
+
+def stub_coords(query: str) -> Coords:
+    """Coordenadas determinísticas: o mesmo endereço (normalizado) dá sempre o mesmo ponto."""
+    digest = hashlib.sha256(normalize_address(query).encode("utf-8")).digest()
+    a = int.from_bytes(digest[:4], "big") / 0xFFFFFFFF
+    b = int.from_bytes(digest[4:8], "big") / 0xFFFFFFFF
+    lat = _LAT_RANGE[0] + a * (_LAT_RANGE[1] - _LAT_RANGE[0])
+    lon = _LON_RANGE[0] + b * (_LON_RANGE[1] - _LON_RANGE[0])
+    return round(lat, 6), round(lon, 6)
+
+
+def _parse_coords(path: str) -> list[Coords]:
+    # Formato OSRM: "lon,lat;lon,lat"
+    points = []
+    for pair in path.split(";"):
+        lon, lat = pair.split(",")
+        points.append((float(lat), float(lon)))
+    return points
+
+
+def _leg(origin: Coords, destination: Coords) -> tuple[float, float]:
+    meters = haversine_km(origin, destination) * _ROAD_FACTOR * 1000.0
+    return meters, meters / (_SPEED_KMH / 3.6)
+
+
+def create_app(
+    *,
+    latency_ms: float = 0.0,
+    failure_rate: float = 0.0,
+    places: dict[str, Coords] | None = None,
+    seed: int | None = None,
+) -> FastAPI:
+    """
+    Servidor falso com a API do OSRM e do Nominatim (só o que o OSRMClient usa), para testes
+    e benchmarks sem rede. Rotas = linha reta x 1.3 a 40 km/h.
+
+    latency_ms atrasa cada resposta; failure_rate devolve 503 nessa fração dos pedidos.
+    Com places, só esses endereços existem (o resto dá []); sem places, qualquer endereço
+    tem coordenadas (stub_coords).
+    """
+    app = FastAPI(title="TVDE QR stub upstream")
+    rng = random.Random(seed)
+    known = {normalize_address(k): v for k, v in (places or {}).items()}
+
+    async def degrade() -> JSONResponse | None:
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000.0)
+        if failure_rate > 0 and rng.random() < failure_rate:
+            return JSONResponse({"code": "Unavailable"}, status_code=503)
+        return None
+
+    @app.get("/status")
+    async def status():
+        return await degrade() or {"status": 0, "message": "OK"}
+
+    @app.get("/search")
+    async def search(q: str = ""):
+        if (failed := await degrade()) is not None:
+            return failed
+        key = normalize_address(q)
+        if not key:
+            return []
+        if places is not None:
+            if key not in known:
+                return []
+            lat, lon = known[key]
+        else:
+            lat, lon = stub_coords(q)
+        return [{"lat": str(lat), "lon": str(lon), "display_name": q}]
+
+    @app.get("/route/v1/driving/{coords}")
+    async def route(coords: str):
+        if (failed := await degrade()) is not None:
+            return failed
+        points = _parse_coords(coords)
+        legs = [_leg(a, b) for a, b in zip(points, points[1:])]
+        return {
+            "code": "Ok",
+            "routes": [
+                {
+                    "distance": round(sum(m for m, _ in legs), 1),
+                    "duration": round(sum(s for _, s in legs), 1),
+                }
+            ],
+        }
+
+    @app.get("/table/v1/driving/{coords}")
+    async def table(coords: str, sources: str = "", destinations: str = ""):
+        if (failed := await degrade()) is not None:
+            return failed
+        points = _parse_coords(coords)
+        src = [int(i) for i in sources.split(";")] if sources else range(len(points))
+        dst = [int(i) for i in destinations.split(";")] if destinations else range(len(points))
+        legs = [[_leg(points[i], points[j]) for j in dst] for i in src]
+        return {
+            "code": "Ok",
+            "distances": [[round(m, 1) for m, _ in row] for row in legs],
+            "durations": [[round(s, 1) for _, s in row] for row in legs],
+        }
+
+    @app.get("/nearest/v1/driving/{coords}")
+    async def nearest(coords: str):
+        if (failed := await degrade()) is not None:
+            return failed
+        lat, lon = _parse_coords(coords)[0]
+        return {"code": "Ok", "waypoints": [{"location": [lon, lat], "distance": 0.0}]}
+
+    return app
+
+
+def main(argv: list[str] | None = None) -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub local de OSRM + Nominatim")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    app = create_app(latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mimetypes
+import re
+import stat
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from tvde_qr.web.pages import accepted_encodings
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+# Raiz do projeto (onde está o pyproject.toml): a app arranca de src/, o build fica em dist/
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+STATIC_URL = "/static"
+MANIFEST_FILE = "manifest.json"
+
+# URL com a versão do conteúdo: muda quando o ficheiro muda, por isso pode ficar em cache um ano
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+# Nomes gerados pelo `tvde-qr build-assets`: style.1a2b3c4d5e.css
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+
+
+def resolve_assets_dir(directory: str | Path) -> Path:
+    """ASSETS_DIR relativo é relativo à raiz do projeto, não ao diretório corrente."""
+    return PROJECT_ROOT / directory
+
+
+def load_manifest(directory: str | Path) -> dict | None:
+    """Manifest do `tvde-qr build-assets` em directory, ou None se não houver build."""
+    try:
+        with open(Path(directory) / MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class AssetVersions:
+    """
+    URLs versionadas dos ficheiros estáticos para as templates. Com manifest (build),
+    asset_url("style.css") -> "/static/style.1a2b3c4d5e.css"; sem build, o hash do
+    conteúdo vai na query: "/static/style.css?v=1a2b3c4d5e".
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = STATIC_DIR,
+        url_prefix: str = STATIC_URL,
+        *,
+        manifest: dict | None = None,
+    ) -> None:
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self.manifest = manifest or {}
+        self._versions: dict[str, str] = {}
+
+    def version(self, path: str) -> str | None:
+        if path not in self._versions:
+            try:
+                content = (self.directory / path).read_bytes()
+            except OSError:
+                return None
+            self._versions[path] = hashlib.sha256(content).hexdigest()[:10]
+        return self._versions[path]
+
+    def url(self, path: str) -> str:
+        hashed = self.manifest.get("files", {}).get(path)
+        if hashed is not None:
+            return f"{self.url_prefix}/{hashed}"
+        version = self.version(path)
+        if version is None:
+            return f"{self.url_prefix}/{path}"
+        return f"{self.url_prefix}/{path}?v={version}"
+
+    def srcset(self, path: str, fmt: str) -> str:
+        """srcset das variantes de uma imagem ("" sem build ou sem variantes nesse formato)."""
+        variants = self.manifest.get("images", {}).get(path, {}).get(fmt, [])
+        return ", ".join(f"{self.url_prefix}/{v['file']} {v['width']}w" for v in variants)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles com Cache-Control (imutável para nomes com hash ou ?v= igual ao hash do
+    conteúdo, revalidar nos outros) e, se o build os tiver gerado, .br/.gz servidos no
+    lugar do original.
+    """
+
+    def __init__(self, *args, versions: AssetVersions | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        if versions is None and self.directory is not None:
+            versions = AssetVersions(self.directory)
+        self.versions = versions
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await self._precompressed(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            versioned = await self._is_versioned(path, scope)
+            response.headers["Cache-Control"] = IMMUTABLE if versioned else REVALIDATE
+        return response
+
+    async def _is_versioned(self, path: str, scope: Scope) -> bool:
+        if _HASHED_NAME.search(path) is not None:
+            return True
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if "v" not in query or self.versions is None:
+            return False
+        # Um ?v= qualquer não fica um ano em cache: só o da versão atual do ficheiro
+        version = await anyio.to_thread.run_sync(self.versions.version, path)
+        return version is not None and query["v"][-1] == version
+
+    async def _precompressed(self, path: str, scope: Scope) -> Response | None:
+        if scope["method"] not in ("GET", "HEAD"):
+            return None
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in encodings:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            response = self.file_response(full_path, stat_result, scope)
+            if response.status_code != 200:
+                return response  # 304
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if media_type.startswith("text/"):
+                media_type += "; charset=utf-8"
+            response.headers["Content-Type"] = media_type
+            response.headers["Content-Encoding"] = encoding
+            response.headers["Vary"] = "Accept-Encoding"
+            return response
+        return None
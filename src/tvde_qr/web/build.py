@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import re
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+from tvde_qr.web.assets import MANIFEST_FILE, STATIC_DIR, STATIC_URL
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só há .gz
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow é opcional: sem ele as imagens só são copiadas (com hash)
+    Image = features = None
+
+logger = logging.getLogger(__name__)
+
+# Larguras das variantes: avatar (64 px a 1x/2x/3x ~ 128/256) até fundos em ecrã inteiro
+DEFAULT_WIDTHS = (128, 256, 640, 1280, 1920)
+IMAGE_FORMATS = ("avif", "webp")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+
+_CSS_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_AROUND = re.compile(r"\s*([{};,>])\s*")
+_CSS_AFTER_COLON = re.compile(r":\s+")
+# Declaração: texto que acaba em ; ou } (um seletor acaba em {)
+_CSS_DECLARATION = re.compile(r"[^{};]+(?=[;}])")
+_CSS_AROUND_COLON = re.compile(r"\s*:\s*")
+_CSS_PLACEHOLDER = re.compile(r"\x00(\d+)\x00")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    """Nome com o hash do conteúdo: style.css -> style.1a2b3c4d5e.css."""
+    path = Path(name)
+    return path.with_name(f"{path.stem}.{content_hash(data)}{path.suffix}").as_posix()
+
+
+def minify_css(css: str) -> str:
+    """
+    Minificação conservadora: tira comentários, espaços à volta de { } ; , > e depois de ":"
+    (nas declarações, também antes). Strings ("...") ficam intactas; espaços dentro de
+    valores (calc, margens) e antes de ":" nos seletores (a :hover) também.
+    """
+    strings: list[str] = []
+
+    def _keep(match: re.Match) -> str:
+        strings.append(match.group())
+        return f"\x00{len(strings) - 1}\x00"
+
+    css = _CSS_STRING.sub(_keep, _CSS_COMMENT.sub("", css))
+    css = _CSS_SPACE.sub(" ", css)
+    css = _CSS_AROUND.sub(r"\1", css)
+    css = _CSS_AFTER_COLON.sub(":", css)
+    css = _CSS_DECLARATION.sub(lambda m: _CSS_AROUND_COLON.sub(":", m.group()), css)
+    css = css.replace(";}", "}").strip()
+    return _CSS_PLACEHOLDER.sub(lambda m: strings[int(m.group(1))], css)
+
+
+def _precompress(path: Path) -> None:
+    data = path.read_bytes()
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+
+def _write(out: Path, name: str, data: bytes) -> None:
+    target = out / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(data)
+    if target.suffix in COMPRESSIBLE_SUFFIXES:
+        _precompress(target)
+
+
+def _image_variants(
+    source: Path, out: Path, name: str, widths: Iterable[int]
+) -> dict[str, list[dict]]:
+    """Versões redimensionadas em AVIF/WebP (só larguras até à do original; sem widths, nada)."""
+    widths = list(widths)
+    if Image is None or not widths:
+        return {}
+    variants: dict[str, list[dict]] = {}
+    with Image.open(source) as original:
+        original = original.convert("RGB")
+        for fmt in IMAGE_FORMATS:
+            if not features.check(fmt):
+                logger.warning("Pillow sem suporte para %s: variantes ignoradas", fmt)
+                continue
+            # Larguras a menos de 10% do original não valem um ficheiro à parte
+            sizes = {w for w in widths if w < original.width * 0.9} | {original.width}
+            for width in sorted(sizes):
+                height = round(original.height * width / original.width)
+                resized = original.resize((width, height), Image.LANCZOS)
+                folder = Path(name).parent
+                target = out / folder / f"{source.stem}-{width}.{fmt}"
+                resized.save(target, format=fmt.upper(), quality=70)
+                hashed = hashed_name(target.name, target.read_bytes())
+                target.rename(target.with_name(hashed))
+                variants.setdefault(fmt, []).append(
+                    {"width": width, "file": (folder / hashed).as_posix()}
+                )
+    return variants
+
+
+def build_assets(
+    out_dir: str | Path,
+    *,
+    source_dir: str | Path = STATIC_DIR,
+    widths: Iterable[int] = DEFAULT_WIDTHS,
+) -> dict:
+    """
+    Gera os estáticos de produção em out_dir: cópias com hash no nome (cache imutável),
+    variantes AVIF/WebP das imagens, CSS minificado e .gz/.br ao lado dos ficheiros de texto.
+    Escreve e retorna o manifest ({"files": original -> com hash, "images": variantes}).
+    """
+    source = Path(source_dir)
+    out = Path(out_dir)
+    if (out / MANIFEST_FILE).exists():
+        shutil.rmtree(out)  # build anterior: sem ficheiros com hashes velhos
+    out.mkdir(parents=True, exist_ok=True)
+
+    files: dict[str, str] = {}
+    images: dict[str, dict] = {}
+    sources = sorted(p for p in source.rglob("*") if p.is_file())
+
+    # Imagens primeiro: o CSS aponta para elas (url("/static/..."))
+    for path in sources:
+        name = path.relative_to(source).as_posix()
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        files[name] = hashed_name(name, data)
+        _write(out, name, data)
+        _write(out, files[name], data)
+        images[name] = _image_variants(path, out, name, widths)
+
+    for path in sources:
+        name = path.relative_to(source).as_posix()
+        if path.suffix.lower() in IMAGE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if path.suffix == ".css":
+            css = data.decode("utf-8")
+            for original, hashed in files.items():
+                css = css.replace(f"{STATIC_URL}/{original}", f"{STATIC_URL}/{hashed}")
+            data = minify_css(css).encode("utf-8")
+        files[name] = hashed_name(name, data)
+        # Também com o nome original, para links antigos (sem cache imutável)
+        _write(out, name, data)
+        _write(out, files[name], data)
+
+    manifest = {"files": files, "images": {k: v for k, v in images.items() if v}}
+    (out / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2, sort_keys=True), "utf-8")
+    return manifest
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional: sem ele só há gzip
+    brotli = None
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """Codificações aceites num Accept-Encoding ("gzip, br;q=0" -> {"gzip"})."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+@dataclass(frozen=True)
+class RenderedPage:
+    """
+    Página HTML renderizada uma vez e servida da memória: corpo já comprimido
+    (gzip e, se instalado, brotli), ETag pelo conteúdo (um por codificação) e Last-Modified.
+    """
+
+    body: bytes
+    gzip_body: bytes
+    br_body: bytes | None
+    etag: str  # da versão sem compressão
+    modified: int  # epoch (s)
+
+    @classmethod
+    def from_html(cls, html: str, *, modified: float) -> RenderedPage:
+        body = html.encode("utf-8")
+        return cls(
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+            br_body=brotli.compress(body, quality=11) if brotli is not None else None,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:16]}"',
+            modified=int(modified),
+        )
+
+    def etag_for(self, encoding: str | None) -> str:
+        """ETag forte da representação: bytes diferentes (br, gzip, sem) têm ETags diferentes."""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def encoded(self, request: Request) -> tuple[bytes, str | None]:
+        """(corpo, Content-Encoding) para o Accept-Encoding do pedido."""
+        encodings = accepted_encodings(request.headers.get("accept-encoding", ""))
+        if self.br_body is not None and "br" in encodings:
+            return self.br_body, "br"
+        if "gzip" in encodings:
+            return self.gzip_body, "gzip"
+        return self.body, None
+
+    def is_fresh(self, request: Request, etag: str | None = None) -> bool:
+        """O browser já tem esta versão (If-None-Match, ou If-Modified-Since sem ETag)."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or (etag or self.etag) in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= self.modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def response(self, request: Request) -> Response:
+        body, encoding = self.encoded(request)
+        headers = {
+            "ETag": self.etag_for(encoding),
+            "Last-Modified": formatdate(self.modified, usegmt=True),
+            "Cache-Control": "public, no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if self.is_fresh(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type="text/html; charset=utf-8", headers=headers)
@@ -0,0 +1,137 @@
+// Resultado do orçamento (quote_result.html). Sem scripts inline: os dados vêm em
+// data-quote e initQuoteResult liga o WhatsApp e a data, tanto na página completa
+// (POST /quote, data-autoinit) como no fragmento injetado pelo driver.html.
+var QUOTE_T = {
+  en: {
+    badge:"Estimate ready", headline:"Your ride estimate",
+    sub:"Based on the details you provided. I'll confirm the final price before the trip.",
+    price_label:"Estimated price", price_tbd:"To be confirmed",
+    price_note:"Final price confirmed before departure",
+    stat_dist:"distance", stat_time:"travel time", stat_sched_l:"booking",
+    src_cache:"Distance from cache (previous query).",
+    src_osrm:"Distance calculated automatically (real route).",
+    src_manual:"Distance provided manually.",
+    src_local:"Approximate distance (route service unavailable).",
+    src_provisional:"Provisional estimate — refining the route…",
+    src_simple:"Distance could not be calculated automatically.",
+    datetime_label:"Date & time (optional)",
+    whatsapp:"Request on WhatsApp", back:"Back",
+    disclaimer:"Approximate estimate. May vary based on actual route, traffic, tolls, and time of day.",
+    footer:"Safety and respect first."
+  },
+  pt: {
+    badge:"Estimativa gerada", headline:"Sua estimativa",
+    sub:"Baseada nos dados informados. Confirmo o valor final antes da viagem.",
+    price_label:"Preço estimado", price_tbd:"A combinar",
+    price_note:"Valor final confirmado antes da partida",
+    stat_dist:"distância", stat_time:"tempo de viagem", stat_sched_l:"agendamento",
+    src_cache:"Distância vinda do cache (consulta anterior).",
+    src_osrm:"Distância calculada automaticamente (rota real).",
+    src_manual:"Distância informada manualmente.",
+    src_local:"Distância aproximada (serviço de rotas indisponível).",
+    src_provisional:"Estimativa provisória — a calcular a rota…",
+    src_simple:"Não foi possível calcular a distância automaticamente.",
+    datetime_label:"Data e hora (opcional)",
+    whatsapp:"Pedir no WhatsApp", back:"Voltar",
+    disclaimer:"Estimativa aproximada. Pode variar conforme rota real, trânsito, pedágios e horário.",
+    footer:"Segurança e respeito em primeiro lugar."
+  },
+  es: {
+    badge:"Estimación lista", headline:"Tu estimación de viaje",
+    sub:"Basada en los datos proporcionados. Confirmaré el precio final antes del viaje.",
+    price_label:"Precio estimado", price_tbd:"A confirmar",
+    price_note:"Precio final confirmado antes de salir",
+    stat_dist:"distancia", stat_time:"tiempo de viaje", stat_sched_l:"reserva",
+    src_cache:"Distancia desde caché (consulta anterior).",
+    src_osrm:"Distancia calculada automáticamente (ruta real).",
+    src_manual:"Distancia introducida manualmente.",
+    src_local:"Distancia aproximada (servicio de rutas no disponible).",
+    src_provisional:"Estimación provisional — calculando la ruta…",
+    src_simple:"No se pudo calcular la distancia automáticamente.",
+    datetime_label:"Fecha y hora (opcional)",
+    whatsapp:"Solicitar por WhatsApp", back:"Volver",
+    disclaimer:"Estimación aproximada. Puede variar según la ruta real, tráfico, peajes y horario.",
+    footer:"Seguridad y respeto ante todo."
+  }
+};
+
+function quoteRoot(root) {
+  return root.matches && root.matches('.dg-quote') ? root : root.querySelector('.dg-quote');
+}
+
+function buildQuoteMsg(q, dateStr) {
+  var msg = 'Olá! Vi seu QR e queria confirmar o valor.\n';
+  msg += 'Origem: ' + q.origin + '\n';
+  msg += 'Destino: ' + q.destination + '\n';
+  if (q.distance) msg += 'Distância: ' + q.distance + '\n';
+  if (q.duration) msg += 'Tempo: ' + q.duration + '\n';
+  if (q.price) msg += 'Estimativa: ' + q.price + '\n';
+  msg += 'Horário: ' + (dateStr || '(a confirmar)');
+  return msg;
+}
+
+function updateQuoteLinks(root) {
+  var el = quoteRoot(root);
+  if (!el || !el._quote) return;
+  var state = el._quote;
+  var input = el.querySelector('.js-datetime');
+  var sched = el.querySelector('.js-sched');
+  var dateStr = '';
+  if (input && input.value) {
+    dateStr = new Date(input.value).toLocaleString('pt-PT', {
+      day: '2-digit', month: '2-digit', year: 'numeric',
+      hour: '2-digit', minute: '2-digit'
+    });
+  }
+  if (sched) sched.textContent = dateStr || '—';
+
+  var url = 'https://wa.me/' + state.data.wa_number + '?text=' +
+    encodeURIComponent(buildQuoteMsg(state.data, dateStr));
+  el.querySelectorAll('.js-wa').forEach(function(a) { a.href = url; });
+  if (state.floatBtn) state.floatBtn.href = url;
+}
+
+function setQuoteLang(root, lang) {
+  var el = quoteRoot(root);
+  if (!el) return;
+  var t = QUOTE_T[lang] || QUOTE_T.en;
+  el.querySelectorAll('[data-lang]').forEach(function(b) {
+    b.classList.toggle('active', b.dataset.lang === lang);
+  });
+  el.querySelectorAll('[data-qt]').forEach(function(node) {
+    var k = node.dataset.qt;
+    if (t[k]) node.textContent = t[k];
+  });
+  updateQuoteLinks(el);
+}
+
+// options: lang (por omissão, a guardada) e floatBtn (botão flutuante fora do resultado)
+function initQuoteResult(root, options) {
+  var el = quoteRoot(root);
+  if (!el) return;
+  options = options || {};
+  el._quote = { data: JSON.parse(el.dataset.quote), floatBtn: options.floatBtn || null };
+
+  var input = el.querySelector('.js-datetime');
+  if (input) input.addEventListener('input', function() { updateQuoteLinks(el); });
+  el.querySelectorAll('[data-lang]').forEach(function(b) {
+    b.addEventListener('click', function() {
+      setQuoteLang(el, b.dataset.lang);
+      try { localStorage.setItem('dg-lang', b.dataset.lang); } catch(e) {}
+    });
+  });
+
+  var lang = options.lang;
+  if (!lang) {
+    try { lang = localStorage.getItem('dg-lang'); } catch(e) {}
+  }
+  setQuoteLang(el, lang || 'en');
+}
+
+(function() {
+  var script = document.currentScript;
+  if (!script || !script.hasAttribute('data-autoinit')) return;
+  document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.dg-quote').forEach(function(el) { initQuoteResult(el); });
+  });
+})();
@@ -0,0 +1,29 @@
+from tvde_qr.services.address import grid_key, normalize_address, route_key
+
+
+def test_normalize_address_folds_case_accents_and_whitespace():
+    assert normalize_address("  Estação   do ORIENTE ") == "estacao oriente"
+
+
+def test_normalize_address_expands_portuguese_abbreviations():
+    assert normalize_address("Av. da Liberdade, 10") == "avenida liberdade 10"
+    assert normalize_address("R. Augusta") == normalize_address("Rua Augusta")
+    assert normalize_address("Pç. do Comércio") == "praca comercio"
+
+
+def test_route_key_ignores_free_text_variance():
+    expected = route_key("Aeroporto de Lisboa", "Rossio")
+    assert route_key("aeroporto de lisboa", "rossio") == expected
+    assert route_key("Aeroporto de Lisboa ", "Rossio") == expected
+    assert route_key("Aeroporto Lisboa", "Rossio") == expected
+    # A direção importa
+    assert route_key("Rossio", "Aeroporto de Lisboa") != expected
+
+
+def test_grid_key_snaps_nearby_coordinates():
+    a = grid_key((38.77421, -9.13551), (38.71390, -9.13940), cell_deg=0.002)
+    b = grid_key((38.77440, -9.13520), (38.71400, -9.13910), cell_deg=0.002)
+    far = grid_key((38.80000, -9.13551), (38.71390, -9.13940), cell_deg=0.002)
+
+    assert a == b
+    assert a != far
@@ -0,0 +1,100 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tvde_qr.web.assets import (
+    PROJECT_ROOT,
+    AssetVersions,
+    CachedStaticFiles,
+    load_manifest,
+    resolve_assets_dir,
+)
+from tvde_qr.web.build import build_assets, minify_css
+
+
+def test_minify_css_keeps_strings_and_selectors():
+    css = """
+    /* comentário */
+    a:hover > .x ,  b {
+      color : red;
+      background: url("/static/a b.jpg") center;
+    }
+    nav :first-child { margin : 0 auto; content: "a ; b : c" }
+    """
+    assert minify_css(css) == (
+        'a:hover>.x,b{color:red;background:url("/static/a b.jpg") center}'
+        'nav :first-child{margin:0 auto;content:"a ; b : c"}'
+    )
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    src = tmp_path / "static"
+    src.mkdir()
+    (src / "style.css").write_text('body {\n  background: url("/static/bg.jpg");\n}\n')
+    (src / "bg.jpg").write_bytes(b"not really a jpeg")
+    return src
+
+
+def test_build_assets_hashes_minifies_and_precompresses(source_dir, tmp_path, monkeypatch):
+    # Sem Pillow (ou com uma imagem inválida) as imagens são só copiadas
+    monkeypatch.setattr("tvde_qr.web.build.Image", None)
+    out = tmp_path / "dist"
+    manifest = build_assets(out, source_dir=source_dir)
+
+    css_name = manifest["files"]["style.css"]
+    bg_name = manifest["files"]["bg.jpg"]
+    assert css_name.startswith("style.") and css_name != "style.css"
+    built = (out / css_name).read_text()
+    assert built == f'body{{background:url("/static/{bg_name}")}}'
+    assert gzip.decompress((out / f"{css_name}.gz").read_bytes()).decode() == built
+    assert load_manifest(out) == manifest
+
+    versions = AssetVersions(out, manifest=manifest)
+    assert versions.url("style.css") == f"/static/{css_name}"
+    assert versions.srcset("bg.jpg", "webp") == ""
+
+
+def test_build_assets_image_variants(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    src = tmp_path / "static"
+    src.mkdir()
+    Image.new("RGB", (300, 150), "navy").save(src / "photo.jpg")
+
+    manifest = build_assets(tmp_path / "dist", source_dir=src, widths=[128, 640])
+
+    webp = manifest["images"]["photo.jpg"]["webp"]
+    assert [v["width"] for v in webp] == [128, 300]
+    srcset = AssetVersions(tmp_path / "dist", manifest=manifest).srcset("photo.jpg", "webp")
+    assert srcset.endswith(" 300w")
+    with Image.open(tmp_path / "dist" / webp[0]["file"]) as variant:
+        assert variant.size == (128, 64)
+
+
+def test_static_files_serve_precompressed_with_immutable_cache(source_dir, tmp_path):
+    out = tmp_path / "dist"
+    manifest = build_assets(out, source_dir=source_dir, widths=[])
+    app = FastAPI()
+    app.mount("/static", CachedStaticFiles(directory=out), name="static")
+    client = TestClient(app)
+
+    url = f"/static/{manifest['files']['style.css']}"
+    r = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["content-type"].startswith("text/css")
+    assert "immutable" in r.headers["cache-control"]
+    assert r.text.startswith("body{")
+
+    plain = client.get("/static/style.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["cache-control"] == "public, no-cache"
+
+
+def test_assets_dir_relative_to_project_root(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # como a app, que arranca de src/
+    assert (PROJECT_ROOT / "pyproject.toml").exists()
+    assert resolve_assets_dir("dist/static") == PROJECT_ROOT / "dist" / "static"
+    assert resolve_assets_dir(tmp_path / "out") == tmp_path / "out"
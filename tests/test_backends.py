@@ -0,0 +1,94 @@
+import httpx
+import pytest
+import respx
+
+from tvde_qr.services.backends import BackendPool, parse_urls
+from tvde_qr.services.osrm import OSRMClient, OSRMError
+from tvde_qr.stubs.upstream import create_app, stub_coords
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_parse_urls_strips_blanks_and_trailing_slash():
+    assert parse_urls(" http://a/, ,http://b ") == ["http://a", "http://b"]
+
+
+def test_pool_round_robin_skips_down_until_cooldown():
+    clock = FakeClock()
+    pool = BackendPool("osrm", ["http://a", "http://b"], cooldown_s=30, clock=clock)
+    assert [pool.pick() for _ in range(4)] == ["http://a", "http://b", "http://a", "http://b"]
+
+    pool.mark_down("http://a")
+    assert {pool.pick() for _ in range(3)} == {"http://b"}
+    assert pool.snapshot() == {"http://a": "down", "http://b": "up"}
+
+    clock.now = 30
+    assert pool.healthy() == ["http://a", "http://b"]
+
+
+def test_pool_all_down_still_serves():
+    pool = BackendPool("osrm", ["http://a"], clock=FakeClock())
+    pool.mark_down("http://a")
+    assert pool.healthy() == []
+    assert pool.pick() == "http://a"
+
+
+@pytest.mark.asyncio
+async def test_health_check_against_stub():
+    pool = BackendPool("nominatim", ["http://up", "http://down"], health_path="/status")
+    up = create_app()
+    down = create_app(failure_rate=1.0)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        app = up if request.url.host == "up" else down
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app)) as c:
+            r = await c.get(str(request.url))
+            return httpx.Response(r.status_code, content=r.content)
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await pool.check(client)
+    assert pool.snapshot() == {"http://up": "up", "http://down": "down"}
+
+
+@pytest.mark.asyncio
+async def test_osrm_client_end_to_end_against_stub():
+    transport = httpx.ASGITransport(app=create_app())
+    async with httpx.AsyncClient(transport=transport) as http_client:
+        client = OSRMClient(
+            client=http_client,
+            osrm_backends=BackendPool("osrm", ["http://osrm-stub"]),
+            nominatim_backends=BackendPool("nominatim", ["http://nominatim-stub"]),
+        )
+        route = await client.route_by_addresses("Aeroporto de Faro", "Aeroporto de Lisboa")
+        matrix = await client.table([stub_coords("Aeroporto de Faro")], [stub_coords("Lagos")])
+
+    assert route.distance_km > 0
+    assert route.duration_min == pytest.approx(route.distance_km / 40 * 60, abs=0.2)
+    assert matrix[0][0].distance_km > 0
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_failed_backend_leaves_rotation():
+    respx.get(url__startswith="http://osrm-a/").mock(return_value=httpx.Response(503))
+    ok = respx.get(url__startswith="http://osrm-b/").mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 1000.0, "duration": 60.0}]}
+        )
+    )
+    pool = BackendPool("osrm", ["http://osrm-a", "http://osrm-b"])
+    client = OSRMClient(osrm_backends=pool)
+
+    with pytest.raises(OSRMError):
+        await client.route_by_coords((0.0, 0.0), (1.0, 1.0))
+    assert pool.snapshot()["http://osrm-a"] == "down"
+
+    route = await client.route_by_coords((0.0, 0.0), (2.0, 2.0))
+    assert route.distance_km == 1.0
+    assert ok.call_count == 1
@@ -0,0 +1,68 @@
+import math
+
+import pytest
+
+from benchmarks import micro
+from benchmarks.report import HIGHER, LOWER, compare, load_baseline, percentile, save_results
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 95) == 95.0
+    assert percentile(values, 100) == 100.0
+    assert math.isnan(percentile([], 50))
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = {"p95_ms": 100.0, "throughput_rps": 50.0, "p50_ms": 10.0}
+    directions = {"p95_ms": LOWER, "throughput_rps": HIGHER, "p50_ms": LOWER}
+
+    # Dentro da tolerância (20%) nos dois sentidos: nada a assinalar
+    ok = {"p95_ms": 119.0, "throughput_rps": 41.0, "p50_ms": 5.0}
+    assert compare(ok, baseline, directions, tolerance=0.2) == []
+
+    worse = {"p95_ms": 121.0, "throughput_rps": 39.0, "p50_ms": 5.0}
+    assert compare(worse, baseline, directions, tolerance=0.2) == [
+        "p95_ms: 100 -> 121 (+21.0%)",
+        "throughput_rps: 50 -> 39 (-22.0%)",
+    ]
+
+
+def test_compare_ignores_metrics_missing_on_either_side():
+    directions = {"p95_ms": LOWER, "error_rate": LOWER}
+    assert compare({"p95_ms": 500.0}, {"error_rate": 0.0}, directions, tolerance=0.1) == []
+    # Baseline a zero: qualquer valor acima é regressão (variação infinita)
+    assert compare({"error_rate": 0.1}, {"error_rate": 0.0}, directions, tolerance=0.1) == [
+        "error_rate: 0 -> 0.1 (+inf%)"
+    ]
+
+
+def test_load_baseline_missing_file_returns_none(tmp_path):
+    assert load_baseline(tmp_path / "nao-existe.json") is None
+
+    path = tmp_path / "results" / "micro.json"
+    save_results(path, {"route_key": 850.0})
+    assert load_baseline(path) == {"route_key": 850.0}
+
+
+@pytest.fixture
+def fixed_results(monkeypatch):
+    monkeypatch.setattr(micro, "run", lambda repeat, only: {"route_key": 1000.0})
+
+
+def test_micro_exits_with_error_on_regression(fixed_results, tmp_path):
+    path = tmp_path / "micro.json"
+    save_results(path, {"route_key": 500.0})
+    assert micro.main(["--baseline", str(path), "--tolerance", "0.25"]) == 1
+
+    save_results(path, {"route_key": 900.0})
+    assert micro.main(["--baseline", str(path), "--tolerance", "0.25"]) == 0
+
+
+def test_micro_without_baseline_file_reports_and_succeeds(fixed_results, tmp_path, capsys):
+    missing = tmp_path / "nao-existe.json"
+    assert micro.main(["--baseline", str(missing), "--save-baseline", str(missing)]) == 0
+    assert "route_key" in capsys.readouterr().out
+    # A primeira execução passa a ser a baseline
+    assert load_baseline(missing) == {"route_key": 1000.0}
@@ -1,17 +1,51 @@
 import pytest
 
-from tvde_qr.services.distance import DistanceService
+from tvde_qr.services.distance import DistanceService, haversine_km
 
+LISBOA = (38.7223, -9.1393)
+PORTO = (41.1579, -8.6291)
+FARO = (37.0194, -7.9304)
+FARO_AEROPORTO = (37.0145, -7.9659)
 
-def test_distance_estimate_returns_positive_number():
-    svc = DistanceService()
-    km = svc.estimate_km("Origem", "Destino")
-    assert km > 0
 
+def test_haversine_lisboa_porto():
+    # ~274 km em linha reta
+    assert haversine_km(LISBOA, PORTO) == pytest.approx(274, abs=2)
+    assert haversine_km(LISBOA, LISBOA) == 0
 
-def test_distance_estimate_requires_origin_and_destination():
-    svc = DistanceService()
-    with pytest.raises(ValueError):
-        svc.estimate_km("", "Destino")
-    with pytest.raises(ValueError):
-        svc.estimate_km("Origem", "")
+
+def test_distance_estimate_uses_default_factor_without_data():
+    svc = DistanceService(default_factor=1.3, default_speed_kmh=60.0)
+    estimate = svc.estimate(LISBOA, PORTO)
+
+    assert estimate.distance_km == pytest.approx(haversine_km(LISBOA, PORTO) * 1.3, abs=0.01)
+    assert estimate.duration_min == pytest.approx(estimate.distance_km, abs=0.1)  # 60 km/h
+    assert svc.estimate_km(LISBOA, PORTO) == estimate.distance_km
+
+
+def test_distance_fit_calibrates_factor_per_region():
+    svc = DistanceService(default_factor=1.3, region_deg=0.5, min_samples=3)
+    straight = haversine_km(FARO, FARO_AEROPORTO)
+    samples = [(FARO, FARO_AEROPORTO, straight * 1.6, straight * 1.6 / 30 * 60)] * 3
+
+    assert svc.fit(samples) == 3
+    road = svc.factor_for(FARO, FARO_AEROPORTO)
+    assert road.factor == pytest.approx(1.6)
+    assert road.speed_kmh == pytest.approx(30)
+    assert road.samples == 3
+    # Outras regiões ficam com a mediana global
+    assert svc.factor_for(LISBOA, PORTO).factor == pytest.approx(1.6)
+
+
+def test_distance_fit_ignores_noise_and_small_regions():
+    svc = DistanceService(default_factor=1.3, min_samples=3)
+    straight = haversine_km(FARO, FARO_AEROPORTO)
+    samples = [
+        (FARO, FARO, 5.0, 10.0),  # mesmo ponto
+        (FARO, FARO_AEROPORTO, straight * 10, 10.0),  # fator absurdo
+        (FARO, FARO_AEROPORTO, straight * 1.5, None),
+    ]
+
+    assert svc.fit(samples) == 1
+    assert svc.factors == {}
+    assert svc.factor_for(FARO, FARO_AEROPORTO).factor == 1.3
@@ -0,0 +1,115 @@
+import uuid
+
+import pytest
+from sqlalchemy import update
+from fastapi.testclient import TestClient
+
+from tvde_qr import main
+from tvde_qr.db import AsyncSessionLocal, SessionLocal
+from tvde_qr.main import app
+from tvde_qr.models import Driver
+from tvde_qr.repositories.drivers import DriverRepository
+from tvde_qr.services.drivers import DriverProfile, DriverRegistry
+from tvde_qr.services.pricing import PricingConfig
+
+client = TestClient(app)
+
+
+def _profile(slug: str, **tariff) -> DriverProfile:
+    return DriverProfile(
+        slug=slug,
+        name="Ana Sousa",
+        whatsapp_number="+351910000000",
+        tariff=PricingConfig(**tariff),
+    )
+
+
+@pytest.fixture
+def fleet(monkeypatch):
+    registry = DriverRegistry(main.drivers.default)
+    registry.replace([_profile("ana", base_fare=20.0, price_per_km=2.0, minimum_fare=6.0)])
+    monkeypatch.setattr(main, "drivers", registry)
+    return registry
+
+
+def test_registry_falls_back_to_default_only_for_its_slug():
+    default = _profile("demo")
+    registry = DriverRegistry(default)
+    registry.replace([_profile("ana")])
+
+    assert registry.get("") is default
+    assert registry.get("demo") is default
+    assert registry.get("ana").slug == "ana"
+    assert registry.get("outro") is None
+
+
+def test_registry_replace_clears_rendered_landing_pages():
+    registry = DriverRegistry(_profile("demo"), on_replace=main.landing_page.cache_clear)
+    main.landing_page(_profile("ana", base_fare=9.0))
+    assert main.landing_page.cache_info().currsize > 0
+
+    registry.replace([_profile("ana", base_fare=10.0)])
+
+    assert main.landing_page.cache_info().currsize == 0
+
+
+def test_driver_page_shows_driver_contact(fleet):
+    r = client.get("/m/ana")
+    assert r.status_code == 200
+    assert "Ana Sousa" in r.text
+    assert "https://wa.me/+351910000000" in r.text
+    assert 'name="driver" value="ana"' in r.text
+
+    assert client.get("/m/desconhecido").status_code == 404
+    assert client.get("/m/demo").status_code == 200
+
+
+def test_quote_uses_driver_tariff_and_isolated_fragment(fleet):
+    data = {"origin": "Motorista A", "destination": "Motorista B", "distance_km": "10"}
+
+    default = client.post("/quote", data=data)
+    ana = client.post("/quote", data={**data, "driver": "ana"})
+
+    assert ana.status_code == 200
+    assert "€ 40.0" in ana.text  # 20 + 10 km x 2
+    assert "+351910000000" in ana.text
+    assert ana.text != default.text
+    assert client.post("/quote", data={**data, "driver": "x"}).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_registry_refresh_reloads_only_when_table_changes():
+    slug = f"teste-{uuid.uuid4().hex[:8]}"
+    registry = DriverRegistry(_profile("demo"))
+    with SessionLocal() as session:
+        repo = DriverRepository(session)
+        try:
+            repo.upsert(
+                slug,
+                name="Rui Costa",
+                whatsapp_number="+351920000000",
+                base_fare=4.0,
+                price_per_km=1.0,
+                minimum_fare=7.0,
+            )
+            assert await registry.refresh(AsyncSessionLocal) is True
+            assert registry.get(slug).tariff.base_fare == 4.0
+            assert await registry.refresh(AsyncSessionLocal) is False
+
+            repo.upsert(slug, base_fare=5.0)
+            assert await registry.refresh(AsyncSessionLocal) is True
+            assert registry.get(slug).tariff.base_fare == 5.0
+
+            # Alteração fora do upsert (psql, outro serviço): o trigger renova updated_at
+            session.execute(update(Driver).where(Driver.slug == slug).values(base_fare=6.0))
+            session.commit()
+            assert await registry.refresh(AsyncSessionLocal) is True
+            assert registry.get(slug).tariff.base_fare == 6.0
+
+            repo.upsert(slug, active=False)
+            assert await registry.refresh(AsyncSessionLocal) is True
+            assert registry.get(slug) is None
+        finally:
+            session.rollback()
+            session.query(Driver).filter(Driver.slug == slug).delete()
+            session.commit()
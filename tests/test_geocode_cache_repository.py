@@ -0,0 +1,98 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+
+from tvde_qr.db import AsyncSessionLocal, SessionLocal
+from tvde_qr.repositories.geocode_cache import AsyncGeocodeCacheRepository, GeocodeCacheRepository
+from tvde_qr.repositories.route_cache import AsyncRouteCacheRepository
+
+
+@pytest.fixture
+def db_session():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+def test_save_and_get_recent_geocode_by_normalized_address(db_session):
+    repo = GeocodeCacheRepository(db_session)
+
+    repo.save("Aeroporto de Lisboa", lat=38.7742, lon=-9.1355, source="test")
+
+    cached = repo.get_recent("  aeroporto de   LISBOA ", max_age=timedelta(days=1))
+
+    assert cached is not None
+    assert cached.lat == 38.7742
+    assert cached.lon == -9.1355
+
+
+def test_save_geocode_twice_updates_existing_row(db_session):
+    repo = GeocodeCacheRepository(db_session)
+
+    first = repo.save("Estação do Oriente", lat=38.0, lon=-9.0, source="test")
+    second = repo.save("estação do oriente", lat=38.7678, lon=-9.0990, source="test")
+
+    assert second.id == first.id
+    assert second.lat == 38.7678
+
+
+@pytest_asyncio.fixture
+async def async_db_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.mark.asyncio
+async def test_async_get_many_returns_all_cached_addresses(async_db_session):
+    repo = AsyncGeocodeCacheRepository(async_db_session)
+
+    await repo.save_many(
+        [
+            ("Rossio", 38.7139, -9.1394, "test"),
+            ("Santa Apolónia", 38.7137, -9.1227, "test"),
+        ]
+    )
+
+    found = await repo.get_many(["rossio", "Santa Apolonia", "Nowhere"], max_age=timedelta(days=1))
+
+    assert set(found) == {"rossio", "santa apolonia"}
+    assert found["rossio"].lat == 38.7139
+
+
+@pytest.mark.asyncio
+async def test_only_hubs_and_quoted_addresses_are_suggested(async_db_session):
+    tag = uuid.uuid4().hex[:8]
+    repo = AsyncGeocodeCacheRepository(async_db_session)
+    await repo.save_many(
+        [
+            (f"Sugestao {tag} Casa", 38.71, -9.14, "nominatim"),  # só escrito (prefetch)
+            (f"Sugestao {tag} Origem", 38.72, -9.13, "nominatim"),
+            (f"Sugestao {tag} Destino", 38.73, -9.12, "nominatim"),
+            (f"Sugestao {tag} Hub", 38.77, -9.13, "hub"),
+        ]
+    )
+    await AsyncRouteCacheRepository(async_db_session).save(
+        origin=f"Sugestao {tag} Origem",
+        destination=f"Sugestao {tag} Destino",
+        distance_km=3.0,
+        duration_min=6.0,
+        source="osrm",
+    )
+
+    found = await repo.search_prefix(
+        f"sugestao {tag}", limit=10, max_age=timedelta(days=1), quoted_max_age=timedelta(days=1)
+    )
+    assert [row.query for row in found] == [
+        f"Sugestao {tag} Destino",
+        f"Sugestao {tag} Hub",
+        f"Sugestao {tag} Origem",
+    ]
+
+    quoted = {row.query for row, _ in await repo.quoted(limit=1000, max_age=timedelta(days=1))}
+    assert f"Sugestao {tag} Origem" in quoted
+    assert f"Sugestao {tag} Casa" not in quoted
@@ -0,0 +1,72 @@
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+import respx
+
+from tvde_qr.services.geocoder_index import LocalGeocoder, build_index, read_extract
+from tvde_qr.services.osrm import OSRMClient
+
+FIXTURE = Path(__file__).parent / "fixtures" / "geocoder_extract.csv"
+
+
+@pytest.fixture
+def geocoder(tmp_path):
+    build_index(read_extract(FIXTURE, ["pt", "es"]), tmp_path)
+    geocoder = LocalGeocoder(tmp_path)
+    yield geocoder
+    geocoder.close()
+
+
+def test_build_index_filters_countries(tmp_path):
+    assert build_index(read_extract(FIXTURE, ["pt", "es"]), tmp_path) == 11
+    assert (tmp_path / "coords.bin").stat().st_size == 11 * 2 * 4  # float32 lat/lon
+    assert (tmp_path / "names.off").stat().st_size == 12 * 8  # uint64, n + 1
+
+
+def test_index_metadata_only_in_json(tmp_path):
+    build_index(read_extract(FIXTURE, ["pt", "es"]), tmp_path)
+    # Nomes e trigramas ficam nos ficheiros binários (mmap), não num JSON lido para a heap
+    meta = json.loads((tmp_path / "index.json").read_text())
+    assert set(meta) == {"version", "byteorder", "count"}
+
+
+def test_empty_index(tmp_path):
+    assert build_index([], tmp_path) == 0
+    geocoder = LocalGeocoder(tmp_path)
+    assert len(geocoder) == 0
+    assert geocoder.lookup("Aeroporto de Faro") is None
+    geocoder.close()
+
+
+def test_local_geocoder_exact_match_after_normalization(geocoder):
+    assert geocoder.lookup("aeroporto faro") == pytest.approx((37.0145, -7.9659), abs=1e-5)
+    assert geocoder.lookup("  Av. da Liberdade ") == pytest.approx((38.7197, -9.1454), abs=1e-5)
+
+
+def test_local_geocoder_fuzzy_match_by_trigrams(geocoder):
+    # Erro de digitação e sem acentos
+    assert geocoder.lookup("Estacao de Sao Bentto") == pytest.approx((41.1456, -8.6104), abs=1e-5)
+
+
+def test_local_geocoder_miss_returns_none(geocoder):
+    assert geocoder.lookup("Rua Inexistente 123, Bragança") is None
+    assert geocoder.lookup("Champs Elysees") is None  # fora do filtro de países
+    assert geocoder.lookup("") is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_uses_local_geocoder_before_nominatim(geocoder):
+    nominatim = respx.get(
+        "https://nominatim.openstreetmap.org/search",
+        params={"q": "Hotel Desconhecido"},
+    ).mock(return_value=httpx.Response(200, json=[{"lat": "1", "lon": "1"}]))
+
+    client = OSRMClient(user_agent="tvde-qr-test", local_geocoder=geocoder)
+    coords = await client.geocode_many(["Aeroporto de Faro", "Hotel Desconhecido"])
+
+    assert coords[0] == pytest.approx((37.0145, -7.9659), abs=1e-5)
+    assert coords[1] == (1.0, 1.0)
+    assert nominatim.call_count == 1  # só o que falhou no índice
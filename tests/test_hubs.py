@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import httpx
+import pytest
+
+from tvde_qr.db import AsyncSessionLocal
+from tvde_qr.jobs.hubs import Hub, load_hubs, warm_hubs
+from tvde_qr.repositories.route_cache import AsyncRouteCacheRepository
+from tvde_qr.services.address import normalize_address, route_key
+from tvde_qr.services.backends import BackendPool
+from tvde_qr.services.osrm import OSRMClient
+from tvde_qr.services.ttl_cache import TTLCache
+from tvde_qr.stubs.upstream import create_app
+
+
+def test_packaged_hubs_have_unique_keys():
+    hubs = load_hubs()
+    keys = {normalize_address(h.name) for h in hubs}
+    assert len(hubs) >= 10
+    assert len(keys) == len(hubs)
+    assert "estacao oriente" in keys
+
+
+@pytest.mark.asyncio
+async def test_warm_hubs_fills_route_cache_and_memory():
+    hubs = [
+        Hub("Hub Teste Norte", 41.15, -8.61),
+        Hub("Hub Teste Centro", 40.20, -8.41),
+        Hub("Hub Teste Sul", 38.72, -9.14),
+    ]
+    app = create_app()
+    tables = 0
+
+    async def count_tables(request: httpx.Request) -> None:
+        nonlocal tables
+        tables += "/table/" in request.url.path
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, event_hooks={"request": [count_tables]}
+    ) as http_client:
+        osrm = OSRMClient(client=http_client, osrm_backends=BackendPool("osrm", ["http://stub"]))
+        memory = TTLCache(maxsize=100, ttl=60)
+        # max_coords=4 com 3 destinos: uma origem por pedido
+        report = await warm_hubs(hubs, osrm, AsyncSessionLocal, memory=memory, max_coords=4)
+
+    assert (report.routes, report.missing) == (6, 0)
+    assert tables == 3
+    assert memory.get(route_key("Hub Teste Norte", "Hub Teste Sul")).source == "osrm"
+
+    async with AsyncSessionLocal() as session:
+        cached = await AsyncRouteCacheRepository(session).get_recent(
+            "hub teste sul", "Hub Teste Centro", max_age=timedelta(minutes=5)
+        )
+    assert cached is not None
+    assert cached.distance_km > 0
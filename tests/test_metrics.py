@@ -0,0 +1,76 @@
+import httpx
+import pytest
+import respx
+from fastapi.testclient import TestClient
+
+from tvde_qr import metrics
+from tvde_qr.main import app
+from tvde_qr.services.osrm import OSRMClient, OSRMError
+
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "Teste.", ["stage"], buckets=(0.1, 1.0))
+    h.observe(0.05, stage="cache")
+    h.observe(0.5, stage="cache")
+    h.observe(3, stage="cache")
+
+    text = h.render()
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{stage="cache",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="cache",le="1"} 2' in text
+    assert 't_seconds_bucket{stage="cache",le="+Inf"} 3' in text
+    assert 't_seconds_count{stage="cache"} 3' in text
+    assert 't_seconds_sum{stage="cache"} 3.55' in text
+
+
+def test_counter_escapes_labels_and_checks_names():
+    c = metrics.Counter("t_total", "Teste.", ["q"])
+    c.inc(q='a "b"\\c')
+    c.inc(2, q='a "b"\\c')
+
+    assert 't_total{q="a \\"b\\"\\\\c"} 3' in c.render()
+    with pytest.raises(ValueError):
+        c.inc(other="x")
+
+
+def test_metrics_endpoint_reports_quote_stages():
+    before = metrics.QUOTES.value(distance_source="manual_km")
+    r = client.post("/quote", data={"origin": "A", "destination": "B", "distance_km": "12"})
+    assert r.status_code == 200
+    assert metrics.QUOTES.value(distance_source="manual_km") == before + 1
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'tvde_quotes_total{distance_source="manual_km"}' in r.text
+    assert 'tvde_quote_stage_seconds_count{stage="cache"}' in r.text
+    assert 'tvde_quote_stage_seconds_count{stage="render"}' in r.text
+    assert 'tvde_cache_hit_ratio{cache="quote_fragment"}' in r.text
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_upstream_requests_are_counted_by_outcome():
+    respx.get(url__startswith="https://router.project-osrm.org/route/v1/driving/").mock(
+        side_effect=[
+            httpx.Response(
+                200, json={"code": "Ok", "routes": [{"distance": 1000.0, "duration": 60.0}]}
+            ),
+            httpx.Response(503),
+        ]
+    )
+    ok = metrics.UPSTREAM_REQUESTS.value(upstream="osrm", outcome="success")
+    failed = metrics.UPSTREAM_REQUESTS.value(upstream="osrm", outcome="failure")
+    timed = metrics.UPSTREAM_SECONDS.count(upstream="osrm")
+
+    osrm = OSRMClient()
+    await osrm.route_by_coords((1.0, 1.0), (2.0, 2.0))
+    with pytest.raises(OSRMError):
+        await osrm.route_by_coords((3.0, 3.0), (4.0, 4.0))
+
+    assert metrics.UPSTREAM_REQUESTS.value(upstream="osrm", outcome="success") == ok + 1
+    assert metrics.UPSTREAM_REQUESTS.value(upstream="osrm", outcome="failure") == failed + 1
+    assert metrics.UPSTREAM_SECONDS.count(upstream="osrm") == timed + 2
@@ -1,3 +1,5 @@
+import asyncio
+
 import httpx
 import pytest
 import respx
@@ -138,6 +140,22 @@ async def test_osrm_timeout():
         await client.route_by_addresses("Faro", "Lisboa")
 
 
+@pytest.mark.asyncio
+@respx.mock
+async def test_per_host_timeout_keeps_connect_timeout():
+    route = respx.get("https://nominatim.openstreetmap.org/search").mock(
+        return_value=httpx.Response(200, json=[])
+    )
+
+    async with httpx.AsyncClient() as shared:
+        client = OSRMClient(client=shared, nominatim_timeout=7.0, connect_timeout=2.0)
+        with pytest.raises(OSRMError):
+            await client.route_by_addresses("Faro", "Lisboa")
+
+    timeout = route.calls[0].request.extensions["timeout"]
+    assert timeout == {"connect": 2.0, "read": 7.0, "write": 7.0, "pool": 7.0}
+
+
 @pytest.mark.asyncio
 @respx.mock
 async def test_osrm_empty_routes():
@@ -160,3 +178,243 @@ async def test_osrm_empty_routes():
 
     with pytest.raises(OSRMError):
         await client.route_by_addresses("A", "B")
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_uses_shared_client():
+    nominatim_url = "https://nominatim.openstreetmap.org/search"
+
+    respx.get(nominatim_url, params={"q": "A", "format": "json", "limit": 1}).mock(
+        return_value=httpx.Response(200, json=[{"lat": "0", "lon": "0"}])
+    )
+    respx.get(nominatim_url, params={"q": "B", "format": "json", "limit": 1}).mock(
+        return_value=httpx.Response(200, json=[{"lat": "1", "lon": "1"}])
+    )
+    respx.get(
+        "https://router.project-osrm.org/route/v1/driving/0.0,0.0;1.0,1.0",
+        params={"overview": "false"},
+    ).mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 1000.0, "duration": 60.0}]}
+        )
+    )
+
+    async with httpx.AsyncClient() as shared:
+        client = OSRMClient(user_agent="tvde-qr-test", client=shared)
+        route = await client.route_by_addresses("A", "B")
+
+        # O cliente partilhado continua aberto para os próximos pedidos
+        assert not shared.is_closed
+
+    assert route.distance_km == 1.0
+    assert route.duration_min == 1.0
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_geocodes_origin_and_destination_concurrently():
+    in_flight = 0
+    peak = 0
+
+    async def slow_geocode(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        lat = "0" if request.url.params["q"] == "A" else "1"
+        return httpx.Response(200, json=[{"lat": lat, "lon": lat}])
+
+    respx.get("https://nominatim.openstreetmap.org/search").mock(side_effect=slow_geocode)
+    respx.get("https://router.project-osrm.org/route/v1/driving/0.0,0.0;1.0,1.0").mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 1000.0, "duration": 60.0}]}
+        )
+    )
+
+    await OSRMClient(user_agent="tvde-qr-test").route_by_addresses("A", "B")
+    assert peak == 2
+
+    # Com limite de concorrência opcional, volta a um pedido de cada vez
+    peak = 0
+    capped = OSRMClient(user_agent="tvde-qr-test", nominatim_max_concurrency=1)
+    await capped.route_by_addresses("A", "B")
+    assert peak == 1
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_geocode_failure_cancels_other_lookup():
+    cancelled = asyncio.Event()
+
+    async def geocode(request):
+        if request.url.params["q"] == "A":
+            return httpx.Response(200, json=[])
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return httpx.Response(200, json=[{"lat": "1", "lon": "1"}])
+
+    respx.get("https://nominatim.openstreetmap.org/search").mock(side_effect=geocode)
+
+    client = OSRMClient(user_agent="tvde-qr-test")
+
+    with pytest.raises(OSRMError):
+        await asyncio.wait_for(client.route_by_addresses("A", "B"), timeout=1)
+
+    assert cancelled.is_set()
+
+
+class FakeGeocodeCache:
+    def __init__(self, known: dict[str, tuple[float, float]]) -> None:
+        self.known = known
+        self.saved: list[str] = []
+
+    async def get_many(self, queries, max_age):
+        rows = {}
+        for query in queries:
+            if query in self.known:
+                lat, lon = self.known[query]
+                rows[query.lower()] = type("Row", (), {"lat": lat, "lon": lon})()
+        return rows
+
+    async def save_many(self, rows):
+        self.saved.extend(query for query, _, _, _ in rows)
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_geocode_cache_skips_nominatim_on_hit():
+    nominatim = respx.get(
+        "https://nominatim.openstreetmap.org/search",
+        params={"q": "B", "format": "json", "limit": 1},
+    ).mock(return_value=httpx.Response(200, json=[{"lat": "1", "lon": "1"}]))
+    respx.get("https://router.project-osrm.org/route/v1/driving/0.0,0.0;1.0,1.0").mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 1000.0, "duration": 60.0}]}
+        )
+    )
+
+    cache = FakeGeocodeCache({"A": (0.0, 0.0)})
+    client = OSRMClient(user_agent="tvde-qr-test")
+    await client.route_by_addresses("A", "B", geocode_cache=cache)
+
+    # "A" veio do cache; só "B" foi ao Nominatim e foi gravado
+    assert nominatim.call_count == 1
+    assert cache.saved == ["B"]
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_coalesces_identical_concurrent_requests():
+    async def geocode(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[{"lat": "1", "lon": "1"}])
+
+    nominatim = respx.get("https://nominatim.openstreetmap.org/search").mock(side_effect=geocode)
+    osrm_route = respx.get("https://router.project-osrm.org/route/v1/driving/1.0,1.0;1.0,1.0").mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 1000.0, "duration": 60.0}]}
+        )
+    )
+
+    client = OSRMClient(user_agent="tvde-qr-test")
+    routes = await asyncio.gather(
+        *(client.route_by_addresses("Rua A, 1", "rua a 1") for _ in range(5))
+    )
+
+    # Mesmo endereço normalizado: 1 pedido ao Nominatim e 1 ao OSRM para os 5 chamadores
+    assert {r.distance_km for r in routes} == {1.0}
+    assert nominatim.call_count == 1
+    assert osrm_route.call_count == 1
+    assert client.geocode_flight.stats.coalesced == 4
+    assert client.route_flight.stats.coalesced == 4
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_table_returns_matrix_in_one_call():
+    table = respx.get(
+        "https://router.project-osrm.org/table/v1/driving/0.0,0.0;1.0,1.0;2.0,2.0",
+        params={"sources": "0;1", "destinations": "2", "annotations": "distance,duration"},
+    ).mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "code": "Ok",
+                "distances": [[1500.0], [None]],
+                "durations": [[120.0], [None]],
+            },
+        )
+    )
+
+    client = OSRMClient(user_agent="tvde-qr-test")
+    matrix = await client.table([(0.0, 0.0), (1.0, 1.0)], [(2.0, 2.0)])
+
+    assert table.call_count == 1
+    assert matrix[0][0].distance_km == 1.5
+    assert matrix[0][0].duration_min == 2.0
+    assert matrix[1][0] is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_table_invalid_response_raises():
+    respx.get(url__startswith="https://router.project-osrm.org/table/v1/driving/").mock(
+        return_value=httpx.Response(200, json={"code": "Ok", "distances": [[1.0]]})
+    )
+
+    client = OSRMClient(user_agent="tvde-qr-test")
+    with pytest.raises(OSRMError):
+        await client.table([(0.0, 0.0)], [(1.0, 1.0)])
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_circuit_breaker_fails_fast_when_open():
+    from tvde_qr.services.resilience import OPEN, CircuitBreaker
+
+    route = respx.get(url__startswith="https://router.project-osrm.org/route/v1/driving/").mock(
+        return_value=httpx.Response(503)
+    )
+    breaker = CircuitBreaker("osrm", min_calls=2, failure_rate=0.5)
+    client = OSRMClient(user_agent="tvde-qr-test", osrm_breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(OSRMError):
+            await client.route_by_coords((0.0, 0.0), (1.0, 1.0))
+    assert breaker.state == OPEN
+
+    with pytest.raises(OSRMError, match="circuit breaker"):
+        await client.route_by_coords((0.0, 0.0), (1.0, 1.0))
+    assert route.call_count == 2
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_osrm_nominatim_429_slows_limiter_and_4xx_does_not_trip_breaker():
+    from tvde_qr.services.resilience import CLOSED, CircuitBreaker, TokenBucket
+
+    respx.get("https://nominatim.openstreetmap.org/search").mock(
+        side_effect=[
+            httpx.Response(400),
+            httpx.Response(429, headers={"Retry-After": "1"}),
+        ]
+    )
+    breaker = CircuitBreaker("nominatim", min_calls=1)
+    limiter = TokenBucket(100.0)
+    client = OSRMClient(
+        user_agent="tvde-qr-test", nominatim_breaker=breaker, nominatim_limiter=limiter
+    )
+
+    with pytest.raises(OSRMError):
+        await client.geocode_many(["A"])
+    assert breaker.state == CLOSED
+
+    with pytest.raises(OSRMError):
+        await client.geocode_many(["B"])
+    assert limiter.rate == 50.0
+    assert breaker.opened == 1
@@ -0,0 +1,84 @@
+import dataclasses
+import gzip
+
+from fastapi.testclient import TestClient
+
+from tvde_qr import main
+from tvde_qr.main import app
+from tvde_qr.web.pages import accepted_encodings
+
+client = TestClient(app)
+
+
+def test_accepted_encodings_drops_q_zero():
+    assert accepted_encodings("gzip, deflate, br;q=0") == {"gzip", "deflate"}
+    assert accepted_encodings("") == set()
+
+
+def test_landing_served_compressed_with_etag_and_revalidates():
+    r = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert "David Garcia" in r.text  # o TestClient descomprime
+    page = main.landing_page(main.drivers.default)
+    assert gzip.decompress(page.gzip_body) == page.body
+
+    etag = r.headers["etag"]
+    revalidate = {"Accept-Encoding": "gzip", "If-None-Match": etag}
+    assert client.get("/", headers=revalidate).status_code == 304
+    since = r.headers["last-modified"]
+    assert client.get("/", headers={"If-Modified-Since": since}).status_code == 304
+    assert client.get("/", headers={"If-None-Match": '"outra"'}).status_code == 200
+
+
+def test_landing_etag_differs_per_encoding():
+    gzipped = client.get("/", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert gzipped.headers["etag"] != plain.headers["etag"]
+    # A cópia em gzip não valida a representação sem compressão
+    headers = {"Accept-Encoding": "identity", "If-None-Match": gzipped.headers["etag"]}
+    assert client.get("/", headers=headers).status_code == 200
+    headers["If-None-Match"] = plain.headers["etag"]
+    assert client.get("/", headers=headers).status_code == 304
+
+
+def test_landing_links_fingerprinted_assets_with_long_cache():
+    html = client.get("/").text
+    url = main.asset_versions.url("style.css")
+    assert "?v=" in url
+    assert url in html
+
+    r = client.get(url)
+    assert r.status_code == 200
+    assert "immutable" in r.headers["cache-control"]
+    assert client.get("/static/style.css").headers["cache-control"] == "public, no-cache"
+    stale = client.get("/static/style.css?v=0000000000")
+    assert stale.headers["cache-control"] == "public, no-cache"
+
+
+def test_quote_fragment_cached_per_address_and_tariff(monkeypatch):
+    data = {"origin": "Fragmento A", "destination": "Fragmento B", "distance_km": "12"}
+    main.quote_fragments.clear()
+
+    first = client.post("/quote", data=data)
+    hits = main.quote_fragments.stats.hits
+    again = client.post("/quote", data=data)
+    assert again.text == first.text
+    assert main.quote_fragments.stats.hits == hits + 1
+
+    # Mesma rota normalizada, outra grafia: o cliente vê (e envia) o que escreveu
+    spelled = client.post("/quote", data={**data, "origin": "fragmento  a"})
+    assert main.quote_fragments.stats.hits == hits + 1
+    assert "fragmento  a" in spelled.text
+    assert "Fragmento A" not in spelled.text
+
+    # Tarifa nova -> perfil novo -> chave nova -> preço novo
+    default = main.drivers.default
+    monkeypatch.setattr(
+        main.drivers,
+        "default",
+        dataclasses.replace(default, tariff=dataclasses.replace(default.tariff, base_fare=50.0)),
+    )
+    changed = client.post("/quote", data=data)
+    assert changed.text != first.text
@@ -17,3 +17,77 @@ def test_pricing_negative_distance_raises():
     svc = PricingService(PricingConfig())
     with pytest.raises(ValueError):
         svc.calculate_price(-1)
+
+
+def test_pricing_time_rate_multiplier_and_surcharge():
+    svc = PricingService(
+        PricingConfig(base_fare=2.0, price_per_km=1.0, minimum_fare=0.0, price_per_minute=0.5)
+    )
+    # (2 + 10 + 20 * 0.5) * 1.5 + 1 = 34
+    assert svc.calculate_price(10, 20, multiplier=1.5, surcharge=1.0) == 34.0
+
+
+def test_pricing_batch_matches_scalar():
+    svc = PricingService(
+        PricingConfig(base_fare=3.0, price_per_km=0.9, minimum_fare=6.0, price_per_minute=0.15)
+    )
+    distances = [0.0, 0.5, 1.005, 3.333, 12.345, 40.0, 123.456]
+    durations = [None, 1.0, 2.5, 7.7, 18.1, None, 95.3]
+    multipliers = [1.0, 1.2, 1.0, 1.25, 1.0, 1.5, 1.1]
+
+    batch = svc.calculate_prices(distances, durations, multipliers=multipliers, surcharges=0.5)
+    scalar = [
+        svc.calculate_price(km, minutes, multiplier=mult, surcharge=0.5)
+        for km, minutes, mult in zip(distances, durations, multipliers)
+    ]
+
+    assert batch == scalar
+
+
+def test_pricing_batch_treats_missing_duration_as_zero():
+    svc = PricingService(PricingConfig(base_fare=3.0, price_per_km=1.0, minimum_fare=6.0))
+
+    assert svc.calculate_prices([1.0, 10.0], [None, 5.0]) == [6.0, 13.0]
+
+
+def test_pricing_batch_negative_distance_raises():
+    svc = PricingService(PricingConfig())
+    with pytest.raises(ValueError):
+        svc.calculate_prices([1.0, -1.0])
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"durations_min": [5.0]},
+        {"multipliers": [1.0, 1.0, 1.0]},
+        {"surcharges": [0.5]},
+    ],
+)
+def test_pricing_batch_rejects_mismatched_lengths(kwargs):
+    svc = PricingService(PricingConfig())
+    # Uma lista de tamanho 1 seria difundida pelo numpy sem erro
+    with pytest.raises(ValueError, match="tamanhos diferentes"):
+        svc.calculate_prices([1.0, 2.0], **kwargs)
+
+
+def test_pricing_rounds_like_round_two_decimals():
+    svc = PricingService(PricingConfig(base_fare=3.0, price_per_km=0.9, minimum_fare=0.0))
+    # Distâncias com 2 casas (precisão do OSRM) em que round(x * 100) / 100 dá outro cêntimo
+    distances = [1.05, 3.15, 20.45]
+    expected = [round(3.0 + km * 0.9, 2) for km in distances]
+
+    assert [svc.calculate_price(km) for km in distances] == expected == [3.95, 5.83, 21.41]
+    assert svc.calculate_prices(distances) == expected
+
+
+def test_pricing_batch_matches_scalar_on_two_decimal_distances():
+    svc = PricingService(
+        PricingConfig(base_fare=3.0, price_per_km=0.9, minimum_fare=6.0, price_per_minute=0.15)
+    )
+    distances = [i / 100 for i in range(0, 10_000, 7)]
+    durations = [km * 1.7 for km in distances]
+
+    assert svc.calculate_prices(distances, durations) == [
+        svc.calculate_price(km, minutes) for km, minutes in zip(distances, durations)
+    ]
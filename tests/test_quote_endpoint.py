@@ -1,11 +1,30 @@
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+
+import httpx
+import pytest
+import respx
 from fastapi.testclient import TestClient
 
+from tvde_qr import main
+from tvde_qr.db import SessionLocal
 from tvde_qr.main import app
+from tvde_qr.repositories.route_cache import RouteCacheRepository
+from tvde_qr.services.address import route_key
+from tvde_qr.services.resilience import TokenBucket
 
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def no_nominatim_rate_limit(monkeypatch):
+    # O Nominatim está mockado: o limite de 1 req/s só tornaria os testes dependentes da ordem
+    monkeypatch.setattr(main.osrm, "nominatim_limiter", None)
+
+
 def test_get_driver_page_ok():
     r = client.get("/m/demo")
     assert r.status_code == 200
@@ -24,6 +43,21 @@ def test_post_quote_uses_manual_distance_when_provided():
     assert "€" in r.text
 
 
+def test_manual_distance_is_not_shared_through_route_cache():
+    origin, destination = f"Manual {uuid.uuid4().hex[:8]}", "Manual destino"
+    r = client.post(
+        "/quote", data={"origin": origin, "destination": destination, "distance_km": "999"}
+    )
+    assert r.status_code == 200
+
+    with SessionLocal() as session:
+        cached = RouteCacheRepository(session).get_recent(
+            origin, destination, max_age=timedelta(hours=1)
+        )
+    assert cached is None
+    assert main.route_memory.peek(route_key(origin, destination)) is None
+
+
 def test_post_quote_works_without_manual_distance():
     r = client.post(
         "/quote",
@@ -31,3 +65,282 @@ def test_post_quote_works_without_manual_distance():
     )
     assert r.status_code == 200
     assert "€" in r.text
+
+
+@respx.mock
+def test_post_quotes_batch_prices_every_cell():
+    coords = {"Hotel Um": ("1", "1"), "Hotel Dois": ("2", "2"), "Aeroporto de Faro": ("3", "3")}
+
+    def geocode(request):
+        lat, lon = coords[request.url.params["q"]]
+        return httpx.Response(200, json=[{"lat": lat, "lon": lon}])
+
+    respx.get("https://nominatim.openstreetmap.org/search").mock(side_effect=geocode)
+    table = respx.get(url__startswith="https://router.project-osrm.org/table/v1/driving/").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "code": "Ok",
+                "distances": [[10000.0], [20000.0]],
+                "durations": [[600.0], [1200.0]],
+            },
+        )
+    )
+
+    r = client.post(
+        "/quotes/batch",
+        json={
+            # "hotel um" repete "Hotel Um" depois de normalizado
+            "origins": ["Hotel Um", "Hotel Dois", "hotel um"],
+            "destinations": ["Aeroporto de Faro"],
+        },
+    )
+
+    assert r.status_code == 200
+    body = r.json()
+    assert table.call_count == 1
+    assert [q["origin"] for q in body["quotes"]] == ["Hotel Um", "Hotel Dois"]
+    assert [q["distance_km"] for q in body["quotes"]] == [10.0, 20.0]
+    assert [q["price"] for q in body["quotes"]] == [12.0, 21.0]
+
+
+def _mock_table(distance_m=10000.0):
+    def table(request):
+        rows = len(request.url.params["sources"].split(";"))
+        cols = len(request.url.params["destinations"].split(";"))
+        return httpx.Response(
+            200,
+            json={
+                "code": "Ok",
+                "distances": [[distance_m] * cols for _ in range(rows)],
+                "durations": [[600.0] * cols for _ in range(rows)],
+            },
+        )
+
+    return respx.get(url__startswith="https://router.project-osrm.org/table/v1/driving/").mock(
+        side_effect=table
+    )
+
+
+@respx.mock
+def test_post_quotes_batch_waits_for_the_nominatim_rate_limit(monkeypatch):
+    # Limitador real (1 req/s, rajada 1) sem esperar de facto: o 4.º endereço já passava
+    # da espera máxima de um /quote
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(
+        main.osrm, "nominatim_limiter", TokenBucket(1.0, 1, clock=lambda: 0.0, sleep=no_sleep)
+    )
+    suffix = uuid.uuid4().hex[:8]
+    geocode = respx.get("https://nominatim.openstreetmap.org/search").mock(
+        return_value=httpx.Response(200, json=[{"lat": "38.7", "lon": "-9.1"}])
+    )
+    table = _mock_table()
+
+    r = client.post(
+        "/quotes/batch",
+        json={
+            "origins": [f"Lote origem {i} {suffix}" for i in range(3)],
+            "destinations": [f"Lote destino {i} {suffix}" for i in range(3)],
+        },
+    )
+
+    assert r.status_code == 200
+    assert geocode.call_count == 6
+    assert table.call_count == 1
+    assert all(q["distance_source"] == "osrm" for q in r.json()["quotes"])
+
+
+@respx.mock
+def test_post_quotes_batch_leaves_only_unlocatable_cells_without_price(monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(
+        main.osrm, "nominatim_limiter", TokenBucket(1.0, 1, clock=lambda: 0.0, sleep=no_sleep)
+    )
+    # Só há vaga no limitador para 3 endereços: o 4.º fica sem coordenadas
+    monkeypatch.setattr(main.settings, "batch_quote_geocode_wait_s", 2.5)
+    suffix = uuid.uuid4().hex[:8]
+
+    def geocode(request):
+        if request.url.params["q"].startswith("Parte incerta"):
+            return httpx.Response(200, json=[])
+        return httpx.Response(200, json=[{"lat": "38.7", "lon": "-9.1"}])
+
+    respx.get("https://nominatim.openstreetmap.org/search").mock(side_effect=geocode)
+    _mock_table()
+
+    origins = [f"Lote A {suffix}", f"Parte incerta {suffix}"]
+    destinations = [f"Lote B {suffix}", f"Lote C {suffix}"]
+    r = client.post("/quotes/batch", json={"origins": origins, "destinations": destinations})
+
+    assert r.status_code == 200
+    sources = {(q["origin"], q["destination"]): q["distance_source"] for q in r.json()["quotes"]}
+    assert sources == {
+        (origins[0], destinations[0]): "osrm",
+        (origins[0], destinations[1]): "unavailable",
+        (origins[1], destinations[0]): "unavailable",
+        (origins[1], destinations[1]): "unavailable",
+    }
+
+
+def test_post_quotes_batch_rejects_empty_lists():
+    r = client.post("/quotes/batch", json={"origins": [], "destinations": ["B"]})
+    assert r.status_code == 422
+
+
+@respx.mock
+def test_post_quote_falls_back_to_local_estimate_when_osrm_fails():
+    coords = {"Estimativa Origem": ("38.7223", "-9.1393"), "Estimativa Destino": ("38.7742", "-9.1342")}
+
+    def geocode(request):
+        lat, lon = coords[request.url.params["q"]]
+        return httpx.Response(200, json=[{"lat": lat, "lon": lon}])
+
+    respx.get("https://nominatim.openstreetmap.org/search").mock(side_effect=geocode)
+    respx.get(url__startswith="https://router.project-osrm.org/route/v1/driving/").mock(
+        return_value=httpx.Response(503)
+    )
+
+    r = client.post(
+        "/quote",
+        data={"origin": "Estimativa Origem", "destination": "Estimativa Destino", "distance_km": ""},
+    )
+
+    assert r.status_code == 200
+    assert "Approximate distance" in r.text
+    assert "€" in r.text
+
+
+def _sse_events(text):
+    return [
+        json.loads(line[len("data: "):])
+        for line in text.splitlines()
+        if line.startswith("data: ")
+    ]
+
+
+@respx.mock
+def test_post_quote_stream_sends_provisional_then_final():
+    suffix = uuid.uuid4().hex[:8]
+    respx.get("https://nominatim.openstreetmap.org/search").mock(
+        return_value=httpx.Response(200, json=[{"lat": "38.7", "lon": "-9.1"}])
+    )
+    respx.get(url__startswith="https://router.project-osrm.org/route/v1/driving/").mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 12340.0, "duration": 900.0}]}
+        )
+    )
+
+    r = client.post(
+        "/quote/stream",
+        data={"origin": f"Stream A {suffix}", "destination": f"Stream B {suffix}", "distance_km": ""},
+    )
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(r.text)
+    assert [e["stage"] for e in events] == ["provisional", "final"]
+    assert "Provisional estimate" in events[0]["html"]
+    assert "12.34 km" in events[1]["html"]
+
+
+def test_post_quote_stream_manual_distance_is_final_at_once():
+    r = client.post(
+        "/quote/stream",
+        data={"origin": "A", "destination": "B", "distance_km": "10"},
+    )
+
+    events = _sse_events(r.text)
+    assert [e["stage"] for e in events] == ["final"]
+    assert "10" in events[0]["html"]
+
+
+@respx.mock
+def test_prefetched_address_is_suggested_only_after_a_completed_quote():
+    suffix = uuid.uuid4().hex[:10]
+    nominatim = respx.get("https://nominatim.openstreetmap.org/search").mock(
+        return_value=httpx.Response(200, json=[{"lat": "38.71", "lon": "-9.14"}])
+    )
+
+    r = client.post("/geocode/prefetch", data={"q": f"Rua Sugestao {suffix}"})
+    assert r.status_code == 200
+    assert r.json() == {"label": f"Rua Sugestao {suffix}", "lat": 38.71, "lon": -9.14}
+    assert nominatim.call_count == 1
+
+    # Só escrito pelo cliente: não aparece a outros
+    r = client.get("/geocode/suggest", params={"q": f"rua sugestão {suffix[:4]}"})
+    assert r.json() == []
+
+    # O /quote já encontra as coordenadas no geocode_cache
+    respx.get(url__startswith="https://router.project-osrm.org/route/v1/driving/").mock(
+        return_value=httpx.Response(
+            200, json={"code": "Ok", "routes": [{"distance": 5000.0, "duration": 600.0}]}
+        )
+    )
+    r = client.post(
+        "/quote",
+        data={"origin": f"Rua Sugestao {suffix}", "destination": f"Rua Sugestao {suffix}"},
+    )
+    assert r.status_code == 200
+    assert nominatim.call_count == 1
+
+    r = client.get("/geocode/suggest", params={"q": f"rua sugestão {suffix[:4]}"})
+    assert [s["label"] for s in r.json()] == [f"Rua Sugestao {suffix}"]
+
+
+@respx.mock
+def test_prefetch_is_rate_limited_per_client(monkeypatch):
+    monkeypatch.setattr(main.settings, "geocode_prefetch_rate_per_s", 0.001)
+    monkeypatch.setattr(main.settings, "geocode_prefetch_burst", 1)
+    main.prefetch_limits.clear()
+    respx.get("https://nominatim.openstreetmap.org/search").mock(
+        return_value=httpx.Response(200, json=[{"lat": "38.71", "lon": "-9.14"}])
+    )
+
+    assert client.post("/geocode/prefetch", data={"q": "Rua Limite 1"}).status_code == 200
+    assert client.post("/geocode/prefetch", data={"q": "Rua Limite 2"}).status_code == 429
+    main.prefetch_limits.clear()
+
+
+@respx.mock
+def test_prefetch_yields_the_nominatim_budget_to_quotes(monkeypatch):
+    nominatim = respx.get("https://nominatim.openstreetmap.org/search").mock(
+        return_value=httpx.Response(200, json=[{"lat": "38.71", "lon": "-9.14"}])
+    )
+    limiter = TokenBucket(rate=0.001)
+    asyncio.run(limiter.acquire())  # a vaga foi para um orçamento
+    monkeypatch.setattr(main.osrm, "nominatim_limiter", limiter)
+
+    r = client.post("/geocode/prefetch", data={"q": f"Rua Ocupada {uuid.uuid4().hex[:8]}"})
+
+    assert r.status_code == 503
+    assert nominatim.call_count == 0
+
+
+def test_geocode_suggest_ignores_short_prefixes():
+    r = client.get("/geocode/suggest", params={"q": "ru"})
+    assert r.status_code == 200
+    assert r.json() == []
+
+
+def test_streamed_result_works_without_inline_scripts():
+    r = client.post(
+        "/quote/stream",
+        data={"origin": "Injetado A", "destination": "Injetado B", "distance_km": "10"},
+    )
+    html = _sse_events(r.text)[0]["html"]
+    # O driver.html injeta só o <main> (innerHTML): scripts lá dentro não correriam
+    injected = html.split('<main class="container">', 1)[1].split("</main>", 1)[0]
+
+    assert "<script" not in injected
+    assert 'href="https://wa.me/+351930466538?text=' in injected
+    data = html.split("data-quote='", 1)[1].split("'", 1)[0]
+    quote_data = json.loads(data)
+    assert quote_data["wa_number"] == "+351930466538"
+    assert quote_data["distance"] == "10.0 km"
+    # Sem ids repetidos com os da página do motorista
+    assert 'id="est-datetime"' not in injected
+    assert 'id="wa-float-btn"' not in injected
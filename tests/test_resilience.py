@@ -0,0 +1,90 @@
+import pytest
+
+from tvde_qr.services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_circuit_breaker_opens_on_error_rate_and_recovers():
+    clock = FakeClock()
+    breaker = CircuitBreaker("osrm", failure_rate=0.5, window=10, min_calls=4, open_s=30, clock=clock)
+
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED  # ainda abaixo de min_calls
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+    clock.now = 30
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+    assert breaker.allow() is False  # só uma chamada de teste
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() is True
+
+
+def test_circuit_breaker_half_open_failure_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("osrm", min_calls=1, open_s=10, clock=clock)
+
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow() is True
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+
+
+def test_circuit_breaker_ignored_call_frees_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker("osrm", min_calls=1, open_s=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+
+    assert breaker.allow() is True
+    breaker.record_ignored()
+    assert breaker.allow() is True
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_requests():
+    clock = FakeClock()
+    waits: list[float] = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    bucket = TokenBucket(1.0, clock=clock, sleep=sleep)
+
+    assert await bucket.acquire() is True
+    assert await bucket.acquire() is True
+    assert await bucket.acquire(max_wait=1.5) is False  # a 3.ª teria de esperar 2 s
+
+    assert waits == [1.0]
+    assert bucket.throttled == 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_penalize_and_reward():
+    clock = FakeClock()
+    bucket = TokenBucket(1.0, clock=clock, sleep=lambda s: None)
+
+    bucket.penalize(retry_after=5)
+    assert bucket.rate == 0.5
+    assert await bucket.acquire(max_wait=1) is False  # Retry-After respeitado
+
+    for _ in range(20):
+        bucket.reward()
+    assert bucket.rate == 1.0
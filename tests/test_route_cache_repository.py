@@ -1,9 +1,13 @@
 from datetime import timedelta
 
 import pytest
+import pytest_asyncio
+from sqlalchemy import func, update
 
-from tvde_qr.db import SessionLocal
-from tvde_qr.repositories.route_cache import RouteCacheRepository
+from tvde_qr.db import AsyncSessionLocal, SessionLocal
+from tvde_qr.models import RouteCache
+from tvde_qr.repositories.route_cache import AsyncRouteCacheRepository, RouteCacheRepository
+from tvde_qr.services.address import route_key
 
 
 @pytest.fixture
@@ -36,3 +40,146 @@ def test_save_and_get_recent_route(db_session):
     assert cached is not None
     assert cached.distance_km == 12.3
     assert cached.source == "test"
+
+
+def test_get_recent_matches_normalized_addresses(db_session):
+    repo = RouteCacheRepository(db_session)
+
+    repo.save(
+        origin="Aeroporto de Lisboa",
+        destination="Av. da Liberdade",
+        distance_km=7.5,
+        duration_min=15.0,
+        source="test",
+    )
+
+    cached = repo.get_recent(
+        "aeroporto lisboa ",
+        "Avenida Liberdade",
+        max_age=timedelta(hours=1),
+    )
+
+    assert cached is not None
+    assert cached.distance_km == 7.5
+
+
+def test_save_upserts_one_row_per_normalized_pair(db_session):
+    repo = RouteCacheRepository(db_session)
+
+    first = repo.save(
+        origin="Rossio",
+        destination="Estação do Oriente",
+        distance_km=8.0,
+        duration_min=18.0,
+        source="test",
+    )
+    second = repo.save(
+        origin="rossio",
+        destination="Estacao Oriente",
+        distance_km=8.4,
+        duration_min=19.0,
+        source="osrm",
+    )
+
+    assert second.id == first.id
+    assert second.distance_km == 8.4
+    assert second.source == "osrm"
+
+
+def _backdate(db_session, origin, destination, age):
+    db_session.execute(
+        update(RouteCache)
+        .where(RouteCache.route_key == route_key(origin, destination))
+        .values(created_at=func.now() - age)
+    )
+    db_session.commit()
+
+
+def test_get_recent_ignores_expired_rows(db_session):
+    repo = RouteCacheRepository(db_session)
+    repo.save(origin="C", destination="D", distance_km=3.0, duration_min=None, source="test")
+
+    _backdate(db_session, "C", "D", timedelta(hours=2))
+
+    assert repo.get_recent("C", "D", max_age=timedelta(hours=1)) is None
+    assert repo.get_recent("C", "D", max_age=timedelta(hours=3)) is not None
+
+
+def test_delete_expired_removes_stale_rows_in_batches(db_session):
+    repo = RouteCacheRepository(db_session)
+    for i in range(3):
+        repo.save(origin=f"Old {i}", destination="E", distance_km=1.0, duration_min=None, source="test")
+        _backdate(db_session, f"Old {i}", "E", timedelta(days=30))
+    repo.save(origin="Fresh", destination="E", distance_km=1.0, duration_min=None, source="test")
+
+    removed = repo.delete_expired(max_age=timedelta(days=7), batch_size=2)
+
+    assert removed >= 3
+    assert repo.get_recent("Fresh", "E", max_age=timedelta(days=7)) is not None
+
+
+@pytest_asyncio.fixture
+async def async_db_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@pytest.mark.asyncio
+async def test_async_save_and_get_recent_route(async_db_session):
+    repo = AsyncRouteCacheRepository(async_db_session)
+
+    await repo.save(
+        origin="Async A",
+        destination="Async B",
+        distance_km=4.2,
+        duration_min=9.0,
+        source="test",
+    )
+
+    cached = await repo.get_recent("async a", "ASYNC B", max_age=timedelta(hours=1))
+
+    assert cached is not None
+    assert cached.distance_km == 4.2
+
+
+@pytest.mark.asyncio
+async def test_async_save_many_splits_past_the_bind_parameter_limit(async_db_session):
+    # 10 000 linhas x 7 colunas passam os 65535 parâmetros de um só INSERT
+    rows = [
+        {
+            "origin": f"Lote {i}",
+            "destination": "Lote destino",
+            "grid_key": None,
+            "distance_km": 1.0 + i,
+            "duration_min": 2.0,
+            "source": "test",
+        }
+        for i in range(10_000)
+    ]
+    repo = AsyncRouteCacheRepository(async_db_session)
+    try:
+        saved = await repo.save_many(rows)
+        assert len(saved) == len(rows)
+        assert saved[-1].distance_km == 10_000.0
+    finally:
+        await async_db_session.execute(
+            RouteCache.__table__.delete().where(RouteCache.destination == "Lote destino")
+        )
+        await async_db_session.commit()
+
+
+def test_geocoded_routes_joins_coordinates_and_skips_manual_km(db_session):
+    from tvde_qr.repositories.geocode_cache import GeocodeCacheRepository
+
+    geocodes = GeocodeCacheRepository(db_session)
+    geocodes.save("Amostra Origem", 37.0, -8.0, "test")
+    geocodes.save("Amostra Destino", 37.1, -8.1, "test")
+
+    repo = RouteCacheRepository(db_session)
+    repo.save("Amostra Origem", "Amostra Destino", 18.0, 20.0, "osrm")
+    repo.save("Amostra Destino", "Amostra Origem", 99.0, None, "manual_km")
+
+    samples = repo.geocoded_routes(limit=100_000)
+
+    assert ((37.0, -8.0), (37.1, -8.1), 18.0, 20.0) in samples
+    assert not any(km == 99.0 and origin == (37.1, -8.1) for origin, _, km, _ in samples)
@@ -0,0 +1,193 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from tvde_qr.services.distance import DistanceService
+from tvde_qr.services.google_maps import GoogleRoute
+from tvde_qr.services.osrm import OSRMError, OSRMRoute
+from tvde_qr.services.routing import LatencyTracker, RoutingError, RoutingService
+
+A = (38.7223, -9.1393)
+B = (38.7742, -9.1342)
+
+
+class FakeOSRM:
+    geocode_ttl = timedelta(days=30)
+
+    def __init__(self, *, geocode_delay=0.0, route_delay=0.0, fail=False) -> None:
+        self.geocode_delay = geocode_delay
+        self.route_delay = route_delay
+        self.fail = fail
+        self.cancelled = False
+
+    async def geocode_pair(self, origin, destination, *, geocode_cache=None):
+        await asyncio.sleep(self.geocode_delay)
+        return A, B
+
+    async def route_by_coords(self, origin, destination):
+        try:
+            await asyncio.sleep(self.route_delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise OSRMError("OSRM em baixo")
+        return OSRMRoute(distance_km=7.0, duration_min=12.0)
+
+
+class FakeGoogle:
+    api_key = "k"
+
+    def __init__(self, *, delay=0.0, fail=False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def route_by_addresses(self, origin, destination):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("quota")
+        return GoogleRoute(distance_km=7.5, duration_min=13.0)
+
+
+def make_routing(osrm, google=None, **kwargs):
+    kwargs.setdefault("budget_s", 1.0)
+    kwargs.setdefault("hedge_default_delay_s", 0.05)
+    return RoutingService(osrm, google=google, estimator=DistanceService(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_routing_primary_wins_without_hedge():
+    google = FakeGoogle()
+    routing = make_routing(FakeOSRM(), google)
+
+    answer = await routing.route("A", "B")
+
+    assert answer.source == "osrm"
+    assert answer.distance_km == 7.0
+    assert google.calls == 0
+    assert routing.stats.wins == {"osrm": 1}
+
+
+@pytest.mark.asyncio
+async def test_routing_hedges_to_google_and_cancels_slow_primary():
+    osrm = FakeOSRM(route_delay=5)
+    google = FakeGoogle(delay=0.01)
+    routing = make_routing(osrm, google)
+
+    answer = await asyncio.wait_for(routing.route("A", "B"), timeout=1)
+
+    assert answer.source == "google"
+    assert routing.stats.hedges == 1
+    assert osrm.cancelled
+
+
+@pytest.mark.asyncio
+async def test_routing_primary_failure_starts_hedge_immediately():
+    google = FakeGoogle()
+    routing = make_routing(FakeOSRM(fail=True), google, hedge_default_delay_s=10)
+
+    answer = await asyncio.wait_for(routing.route("A", "B"), timeout=1)
+
+    assert answer.source == "google"
+
+
+@pytest.mark.asyncio
+async def test_routing_budget_falls_back_to_local_estimate():
+    osrm = FakeOSRM(route_delay=5)
+    routing = make_routing(osrm, FakeGoogle(delay=5), budget_s=0.1)
+
+    answer = await asyncio.wait_for(routing.route("A", "B"), timeout=1)
+
+    # O geocoding chegou a terminar: a estimativa local usa essas coordenadas
+    assert answer.source == "local_estimate"
+    assert answer.distance_km > 0
+    assert routing.stats.budget_exhausted == 1
+    assert osrm.cancelled
+
+
+class FakeGeocodeCache:
+    def __init__(self, session) -> None:
+        self.session = session
+
+    async def get_many(self, addresses, *, max_age):
+        if self.session == "partilhada":
+            raise AssertionError("sessão partilhada usada depois de cancelar o provedor")
+        return {
+            "a": SimpleNamespace(lat=A[0], lon=A[1]),
+            "b": SimpleNamespace(lat=B[0], lon=B[1]),
+        }
+
+
+@pytest.mark.asyncio
+async def test_routing_fallback_reads_geocode_cache_in_own_session(monkeypatch):
+    monkeypatch.setattr("tvde_qr.services.routing.AsyncGeocodeCacheRepository", FakeGeocodeCache)
+    sessions = []
+
+    @asynccontextmanager
+    async def session_factory():
+        sessions.append("nova")
+        yield "nova"
+
+    # O geocoding não acaba dentro do orçamento: a tarefa é cancelada a meio
+    routing = make_routing(
+        FakeOSRM(geocode_delay=5), budget_s=0.05, session_factory=session_factory
+    )
+    answer = await routing.route("A", "B", geocode_cache=FakeGeocodeCache("partilhada"))
+
+    assert answer.source == "local_estimate"
+    assert sessions == ["nova"]
+
+
+@pytest.mark.asyncio
+async def test_routing_records_budget_expiry_as_censored_latency():
+    routing = make_routing(FakeOSRM(route_delay=5), budget_s=0.05)
+
+    await routing.route("A", "B")
+
+    [(seconds, censored)] = routing.latency._samples
+    assert censored and seconds >= 0.04
+
+
+@pytest.mark.asyncio
+async def test_routing_records_osrm_failure_as_censored_latency():
+    routing = make_routing(FakeOSRM(route_delay=0.02, fail=True))
+
+    await routing.route("A", "B")
+
+    [(seconds, censored)] = routing.latency._samples
+    assert censored and seconds >= 0.01
+
+
+@pytest.mark.asyncio
+async def test_routing_without_coordinates_raises():
+    routing = make_routing(FakeOSRM(geocode_delay=5), budget_s=0.05)
+
+    with pytest.raises(RoutingError):
+        await routing.route("A", "B")
+
+
+def test_latency_tracker_percentile_needs_samples():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    assert tracker.percentile(0.95) is None
+
+    for i in range(1, 101):
+        tracker.observe(i / 100)
+    assert tracker.percentile(0.95) == pytest.approx(0.96)
+    assert tracker.percentile(0.5) == pytest.approx(0.51)
+
+
+def test_latency_tracker_counts_censored_samples_as_slow():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for _ in range(80):
+        tracker.observe(0.1)
+    for _ in range(20):
+        tracker.observe(2.0, censored=True)  # cancelados no orçamento
+
+    # Só com as respostas o p95 seria 0.1 s; 20% nem chegou a responder em 2 s
+    assert tracker.percentile(0.95) == 2.0
+    assert tracker.percentile(0.5) == 0.1
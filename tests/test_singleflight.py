@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from tvde_qr.services.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_result_between_concurrent_callers():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+
+    assert results == [42] * 5
+    assert calls == 1
+    assert flight.stats.calls == 1
+    assert flight.stats.coalesced == 4
+    assert flight.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_singleflight_shares_errors_and_forgets_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+    # Depois de terminar, a chave é esquecida: nova chamada vai ao upstream
+    async def ok():
+        return 1
+
+    assert await flight.do("k", ok) == 1
+    assert flight.stats.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_singleflight_cancelling_one_caller_keeps_the_others():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    leader = asyncio.create_task(flight.do("k", slow))
+    await started.wait()
+    follower = asyncio.create_task(flight.do("k", slow))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    assert await follower == "ok"
+
+
+@pytest.mark.asyncio
+async def test_singleflight_cancels_call_when_all_callers_leave():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.create_task(flight.do("k", slow))
+    await asyncio.sleep(0)
+    caller.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert flight.inflight == 0
@@ -0,0 +1,45 @@
+import math
+
+from tvde_qr.services.suggest import PrefixIndex
+
+
+def test_prefix_index_matches_normalized_prefix_in_order():
+    index = PrefixIndex()
+    index.add("Aeroporto de Lisboa", 38.77, -9.13)
+    index.add("Aeroporto do Porto", 41.24, -8.68)
+    index.add("Av. da Liberdade 10", 38.72, -9.14)
+
+    assert [s.label for s in index.search("aeroporto")] == [
+        "Aeroporto de Lisboa",
+        "Aeroporto do Porto",
+    ]
+    assert [s.label for s in index.search("Aerop. Lis")] == ["Aeroporto de Lisboa"]
+    assert [s.label for s in index.search("avenida lib")] == ["Av. da Liberdade 10"]
+    assert index.search("aeroporto", limit=1)[0].lat == 38.77
+    assert index.search("") == []
+
+
+def test_prefix_index_updates_existing_and_evicts_least_recently_used():
+    index = PrefixIndex(maxsize=2)
+    index.add("Rua A", 1.0, 1.0)
+    index.add("rua a", 2.0, 2.0)
+    index.add("Rua B", 3.0, 3.0)
+    assert len(index) == 2
+    assert index.search("rua a")[0].lat == 2.0  # Rua A passa a ser a mais recente
+
+    index.add("Rua C", 4.0, 4.0)
+
+    assert len(index) == 2
+    assert [s.label for s in index.search("rua")] == ["rua a", "Rua C"]
+
+
+def test_prefix_index_entries_expire():
+    now = [0.0]
+    index = PrefixIndex(ttl=60, clock=lambda: now[0])
+    index.add("Rua Antiga", 1.0, 1.0)
+    index.add("Aeroporto de Faro", 37.01, -7.97, ttl=math.inf)
+
+    now[0] = 61
+    assert index.search("rua") == []
+    assert len(index) == 1
+    assert index.search("aeroporto")[0].label == "Aeroporto de Faro"
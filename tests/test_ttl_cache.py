@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tvde_qr.repositories.route_cache import CachedRouteCacheRepository
+from tvde_qr.services.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_cache_expires_entries():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+
+    clock.now = 61
+    assert cache.get("a") is None
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.expirations == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" passa a ser o menos usado
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.evictions == 1
+
+
+class FakeRow:
+    def __init__(self, distance_km: float) -> None:
+        self.distance_km = distance_km
+        self.duration_min = 10.0
+        self.source = "osrm"
+        self.created_at = datetime.utcnow()
+
+
+class FakeRouteCacheRepository:
+    def __init__(self) -> None:
+        self.rows: dict[tuple[str, str], FakeRow] = {}
+        self.reads = 0
+
+    async def get_recent(self, origin, destination, max_age):
+        self.reads += 1
+        return self.rows.get((origin, destination))
+
+    async def save(self, origin, destination, distance_km, duration_min, source, grid_key=None):
+        row = FakeRow(distance_km)
+        self.rows[(origin, destination)] = row
+        return row
+
+
+@pytest.mark.asyncio
+async def test_cached_repository_reads_through_once():
+    db = FakeRouteCacheRepository()
+    db.rows[("A", "B")] = FakeRow(12.0)
+    repo = CachedRouteCacheRepository(db, TTLCache(maxsize=10, ttl=60))
+
+    first = await repo.get_recent("A", "B", max_age=timedelta(hours=1))
+    second = await repo.get_recent("A", "B", max_age=timedelta(hours=1))
+
+    assert first.distance_km == second.distance_km == 12.0
+    assert db.reads == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_repository_writes_through_on_save():
+    db = FakeRouteCacheRepository()
+    repo = CachedRouteCacheRepository(db, TTLCache(maxsize=10, ttl=60))
+
+    await repo.save("A", "B", distance_km=5.0, duration_min=None, source="osrm")
+    cached = await repo.get_recent("A", "B", max_age=timedelta(hours=1))
+
+    assert cached.distance_km == 5.0
+    assert db.reads == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_repository_negative_cache_is_optional():
+    db = FakeRouteCacheRepository()
+
+    disabled = CachedRouteCacheRepository(db, TTLCache(maxsize=10, ttl=60))
+    disabled.mark_unavailable("A", "B")
+    assert not disabled.is_unavailable("A", "B")
+
+    enabled = CachedRouteCacheRepository(db, TTLCache(maxsize=10, ttl=60), negative_ttl=30)
+    enabled.mark_unavailable("A", "B")
+    assert enabled.is_unavailable("A", "B")
+    assert await enabled.get_recent("A", "B", max_age=timedelta(hours=1)) is None
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from tvde_qr.services.write_behind import WriteBehindQueue
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def make_queue(**kwargs):
+    batches: list[list[int]] = []
+
+    async def flush(session, rows):
+        batches.append(list(rows))
+
+    queue = WriteBehindQueue("test", FakeSession, flush, **kwargs)
+    return queue, batches
+
+
+@pytest.mark.asyncio
+async def test_write_behind_batches_and_drains_on_stop():
+    queue, batches = make_queue(batch_size=3)
+    queue.start()
+
+    assert queue.offer([1, 2, 3, 4, 5]) is True
+    await queue.stop()
+
+    assert batches == [[1, 2, 3], [4, 5]]
+    assert queue.stats.written == 5
+    assert queue.stats.batches == 2
+    assert queue.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_write_behind_offer_returns_false_when_not_running():
+    queue, batches = make_queue()
+
+    assert queue.offer([1]) is False
+    assert queue.stats.enqueued == 0
+    assert queue.stats.rejected == 1
+    assert batches == []
+
+
+@pytest.mark.asyncio
+async def test_write_behind_rejects_offers_while_stopping():
+    gate = asyncio.Event()
+    batches: list[list[int]] = []
+
+    async def flush(session, rows):
+        await gate.wait()
+        batches.append(list(rows))
+
+    queue = WriteBehindQueue("test", FakeSession, flush)
+    queue.start()
+    assert queue.offer([1]) is True
+    await asyncio.sleep(0)
+
+    stopping = asyncio.create_task(queue.stop())
+    await asyncio.sleep(0)
+    # Já depois do _STOP: ficaria na fila para sempre, por isso volta para o chamador
+    assert queue.offer([2, 3]) is False
+    assert queue.stats.rejected == 2
+
+    gate.set()
+    await stopping
+    assert batches == [[1]]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_drops_when_full():
+    queue, batches = make_queue(maxsize=2)
+    queue.start()
+
+    # Sem ceder o loop, a tarefa ainda não consumiu nada
+    queue.offer([1, 2, 3])
+    assert queue.stats.dropped == 1
+    assert queue.stats.high_watermark == 2
+
+    await queue.stop()
+    assert batches == [[1, 2]]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_counts_failures_and_keeps_running():
+    calls = 0
+
+    async def flush(session, rows):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("db em baixo")
+
+    queue = WriteBehindQueue("test", FakeSession, flush)
+    queue.start()
+
+    queue.offer([1])
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    queue.offer([2])
+    await queue.stop()
+
+    assert queue.stats.failed == 1
+    assert queue.stats.written == 1